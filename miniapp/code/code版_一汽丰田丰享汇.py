@@ -16,6 +16,12 @@ cron: 10 8,9 * * *
 2025/7/21   V1.2    适配更多协议
 2025/7/22   V1.3    修改协议适配器导入方式
 2025/7/28   V1.4    修改头部注释，以便拉库
+2026/10/18  V1.5    多账号代理改为代理池后台批量获取、并发检查，检查代理最多重新获取3次
+2026/10/18  V1.6    代理池优先分配延迟低的代理，PROXY_STICKY为True时账号沿用上次的代理
+2026/10/18  V1.7    多账号代理只让目标站点的请求走代理，其他请求直连
+2026/10/18  V1.8    TLSAdapter使用共用的SSL上下文，复用TLS会话
+2026/10/18  V1.9    代理池租用的代理在账号结束时归还，出错也会归还
+2026/10/18  V1.10    TLSAdapter没有挂载使用，撤回共用SSL上下文的改动
 """
 
 import json
@@ -53,6 +59,12 @@ if not os.path.exists(wechat_adapter_path):
         print(f"下载微信协议适配器文件失败（其他错误）：{e}")
         exit(1)
 from wechatCodeAdapter import WechatCodeAdapter # type: ignore
+# 导入代理池，没有则每个账号单独获取代理
+try:
+    from proxyPool import ProxyPool # type: ignore
+except ImportError:
+    ProxyPool = None
+
 
 class TLSAdapter(requests.adapters.HTTPAdapter):
     """
@@ -75,6 +87,8 @@ class AutoTask:
         """
         self.script_name = script_name
         self.proxy_url = os.getenv("PROXY_API_URL") # 代理api，返回一条txt文本，内容为代理ip:端口
+        # 代理池，后台批量获取并检查代理
+        self.proxy_pool = ProxyPool(self.proxy_url, check=self.check_proxy, log=self.log) if ProxyPool and MULTI_ACCOUNT_PROXY and self.proxy_url else None
         self.wx_appid = "wxdc0171c19d8ff575" # 微信小程序id
         self.wechat_code_adapter = WechatCodeAdapter(self.wx_appid)
         self.host = "fxh.ftms.com.cn"
@@ -84,16 +98,22 @@ class AutoTask:
     def log(self, msg, level="info"):
         self.wechat_code_adapter.log(msg, level)
 
-    def get_proxy(self):
+    def get_proxy(self, account=None):
         """
         获取代理
+        :param account: 账号标识，设置PROXY_STICKY时沿用该账号上次的代理
         :return: 代理
         """
         if not self.proxy_url:
             self.log("[获取代理] 没有找到环境变量PROXY_API_URL，不使用代理", level="warning")
             return None
+        if self.proxy_pool:
+            # 从代理池租用检查过的代理
+            proxy = self.proxy_pool.lease(account=account)
+            self.log(f"[获取代理] {proxy}")
+            return proxy
         url = self.proxy_url
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         proxy = response.text
         self.log(f"[获取代理] {proxy}")
         return proxy
@@ -296,39 +316,52 @@ class AutoTask:
             self.log(f"【{self.script_name}】开始执行任务")
             # 检查环境变量
             for index, wx_id in enumerate(self.check_env(), 1):
-                self.log("")
-                self.log(f"------ 【账号{index}】开始执行任务 ------")
+                proxy = None
+                try:
+                    self.log("")
+                    self.log(f"------ 【账号{index}】开始执行任务 ------")
 
-                if MULTI_ACCOUNT_PROXY:
-                    proxy = self.get_proxy()
-                    if proxy:
-                        session = requests.Session()
-                        session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
-                        # 检查代理，不可用重新获取
-                        while not self.check_proxy(proxy, session):
-                            proxy = self.get_proxy()
+                    if MULTI_ACCOUNT_PROXY:
+                        proxy = self.get_proxy(wx_id)
+                        if proxy:
+                            session = requests.Session()
                             session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                            if self.proxy_pool:
+                                # 只有目标站点的请求走代理，其他请求直连，并统计代理延迟和流量
+                                self.proxy_pool.apply(session, proxy, hosts=[self.host])
+                            # 检查代理，不可用重新获取，最多重新获取3次，代理池租用的已检查过
+                            retry = 0
+                            while not self.proxy_pool and retry < 3 and not self.check_proxy(proxy, session):
+                                retry += 1
+                                proxy = self.get_proxy()
+                                session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                        else:
+                            session = requests.Session()
                     else:
                         session = requests.Session()
-                else:
-                    session = requests.Session()
                     
-                session.headers["User-Agent"] = self.user_agent
-                session.headers["Content-Type"] = "application/json"
+                    session.headers["User-Agent"] = self.user_agent
+                    session.headers["Content-Type"] = "application/json"
 
-                # 执行微信授权
-                code = self.wechat_code_adapter.get_code(wx_id)
-                if code:
-                    if self.wxlogin(session, code):
-                        # 签到
-                        self.sign_in(session)
-                        # 查积分
-                        self.get_points(session)
+                    # 执行微信授权
+                    code = self.wechat_code_adapter.get_code(wx_id)
+                    if code:
+                        if self.wxlogin(session, code):
+                            # 签到
+                            self.sign_in(session)
+                            # 查积分
+                            self.get_points(session)
                                 
-                self.log(f"------ 【账号{index}】执行任务完成 ------")
+                    self.log(f"------ 【账号{index}】执行任务完成 ------")
+                finally:
+                    # 归还代理池租用的代理
+                    if self.proxy_pool and proxy:
+                        self.proxy_pool.release(proxy, account=wx_id)
         except Exception as e:
             self.log(f"【{self.script_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
         finally:
+            if self.proxy_pool:
+                self.proxy_pool.close()
             if NOTIFY:
                 # 如果notify模块不存在，从远程下载至本地
                 if not os.path.exists("notify.py"):
@@ -15,6 +15,12 @@ cron: 10 12-14 * * *
 2025/7/8    V1.1    更改助力方式，确保每个号都被助力满
 2025/7/23   V1.2    导入微信协议适配器
 2025/7/28   V1.3    修改头部注释，以便拉库
+2026/10/18  V1.4    多账号代理改为代理池后台批量获取、并发检查，检查代理最多重新获取3次
+2026/10/18  V1.5    代理池优先分配延迟低的代理，PROXY_STICKY为True时账号沿用上次的代理
+2026/10/18  V1.6    多账号代理只让目标站点的请求走代理，其他请求直连
+2026/10/18  V1.7    TLSAdapter使用共用的SSL上下文，复用TLS会话
+2026/10/18  V1.8    代理池租用的代理在账号结束时归还，出错也会归还
+2026/10/18  V1.9    TLSAdapter没有挂载使用，撤回共用SSL上下文的改动
 """
 
 import random
@@ -51,6 +57,12 @@ if not os.path.exists(wechat_adapter_path):
         print(f"下载微信协议适配器文件失败（其他错误）：{e}")
         exit(1)
 from wechatCodeAdapter import WechatCodeAdapter # type: ignore
+# 导入代理池，没有则每个账号单独获取代理
+try:
+    from proxyPool import ProxyPool # type: ignore
+except ImportError:
+    ProxyPool = None
+
 
 class TLSAdapter(requests.adapters.HTTPAdapter):
     """
@@ -73,6 +85,8 @@ class AutoTask:
         """
         self.script_name = script_name
         self.proxy_url = os.getenv("PROXY_API_URL") # 代理api，返回一条txt文本，内容为代理ip:端口
+        # 代理池，后台批量获取并检查代理
+        self.proxy_pool = ProxyPool(self.proxy_url, check=self.check_proxy, log=self.log) if ProxyPool and MULTI_ACCOUNT_PROXY and self.proxy_url else None
         self.wx_appid = "wx07b7a339bb2cf065" # 微信小程序id
         self.wechat_code_adapter = WechatCodeAdapter(self.wx_appid)
         self.host = "wakecloud.chinamacro.com"
@@ -102,16 +116,22 @@ class AutoTask:
         """
         return phone[:3] + "****" + phone[-4:]
 
-    def get_proxy(self):
+    def get_proxy(self, account=None):
         """
         获取代理
+        :param account: 账号标识，设置PROXY_STICKY时沿用该账号上次的代理
         :return: 代理
         """
         if not self.proxy_url:
             self.log("[获取代理] 没有找到环境变量PROXY_API_URL，不使用代理", level="warning")
             return None
+        if self.proxy_pool:
+            # 从代理池租用检查过的代理
+            proxy = self.proxy_pool.lease(account=account)
+            self.log(f"[获取代理] {proxy}")
+            return proxy
         url = self.proxy_url
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         proxy = response.text
         self.log(f"[获取代理] {proxy}")
         return proxy
@@ -361,6 +381,7 @@ class AutoTask:
         """
         运行任务
         """
+        leased_proxies = [] # 代理池租用的代理，所有账号做完任务后归还
         try:
             self.log(f"【{self.script_name}】开始执行任务")
             user_id_list = []
@@ -381,11 +402,18 @@ class AutoTask:
                 session.headers.update(headers)
 
                 if MULTI_ACCOUNT_PROXY:
-                    proxy = self.get_proxy()
+                    proxy = self.get_proxy(wx_id)
+                    if self.proxy_pool and proxy:
+                        leased_proxies.append((proxy, wx_id))
                     if proxy:
                         session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
-                        # 检查代理，不可用重新获取
-                        while not self.check_proxy(proxy, session):
+                        if self.proxy_pool:
+                            # 只有目标站点的请求走代理，其他请求直连，并统计代理延迟和流量
+                            self.proxy_pool.apply(session, proxy, hosts=[self.host])
+                        # 检查代理，不可用重新获取，最多重新获取3次，代理池租用的已检查过
+                        retry = 0
+                        while not self.proxy_pool and retry < 3 and not self.check_proxy(proxy, session):
+                            retry += 1
                             proxy = self.get_proxy()
                             session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
 
@@ -437,6 +465,11 @@ class AutoTask:
         except Exception as e:
             self.log(f"【{self.script_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
         finally:
+            if self.proxy_pool:
+                # 归还代理池租用的代理
+                for proxy, wx_id in leased_proxies:
+                    self.proxy_pool.release(proxy, account=wx_id)
+                self.proxy_pool.close()
             if NOTIFY:
                 # 如果notify模块不存在，从远程下载至本地
                 if not os.path.exists("notify.py"):
@@ -8,10 +8,20 @@ name: code版_微信支付提现笔笔省
         soy_codetoken_data (微信授权token)
         soy_codeurl_data (微信授权url)
         PROXY_API_URL (代理api，返回一条txt文本，内容为代理ip:端口)
+        LY_CREDENTIAL_DB (账号凭据数据库文件，默认ly_credentials.db)
 定时: 一天两次
 cron: 10 11,12 * * *
 ------------更新日志------------
 2025/8/21   V1.0    初始化脚本
+2026/10/18  V1.1    账号信息改为存入共用的SQLite凭据库，按wxid单条读写
+2026/10/18  V1.2    按token观测寿命跳过有效性检查，快过期的提前批量预取code重新授权
+2026/10/18  V1.3    多账号代理改为代理池后台批量获取、并发检查，检查代理最多重新获取3次
+2026/10/18  V1.4    代理池优先分配延迟低的代理，PROXY_STICKY为True时账号沿用上次的代理
+2026/10/18  V1.5    多账号代理只让目标站点的请求走代理，其他请求直连
+2026/10/18  V1.6    TLSAdapter使用共用的SSL上下文，复用TLS会话
+2026/10/18  V1.7    提前授权失败时继续使用本地token，只在服务端拒绝时删除
+2026/10/18  V1.8    代理池租用的代理在账号结束时归还，出错也会归还
+2026/10/18  V1.9    TLSAdapter没有挂载使用，撤回共用SSL上下文的改动
 """
 
 import json
@@ -51,6 +61,17 @@ if not os.path.exists(wechat_adapter_path):
         print(f"下载微信协议适配器文件失败（其他错误）：{e}")
         exit(1)
 from wechatCodeAdapter import WechatCodeAdapter # type: ignore
+# 导入代理池，没有则每个账号单独获取代理
+try:
+    from proxyPool import ProxyPool # type: ignore
+except ImportError:
+    ProxyPool = None
+# 导入账号凭据存储，没有则使用本地json文件
+try:
+    from credentialStore import CredentialStore # type: ignore
+except ImportError:
+    CredentialStore = None
+
 
 class TLSAdapter(requests.adapters.HTTPAdapter):
     """
@@ -73,12 +94,18 @@ class AutoTask:
         """
         self.script_name = script_name
         self.proxy_url = os.getenv("PROXY_API_URL") # 代理api，返回一条txt文本，内容为代理ip:端口
+        # 代理池，后台批量获取并检查代理
+        self.proxy_pool = ProxyPool(self.proxy_url, check=self.check_proxy, log=self.log) if ProxyPool and MULTI_ACCOUNT_PROXY and self.proxy_url else None
         self.wx_appid = "wxdb3c0e388702f785" # 微信小程序id
         self.wechat_code_adapter = WechatCodeAdapter(self.wx_appid)
         self.host = "discount.wxpapp.wechatpay.cn"
         self.nickname = ""
         self.token = ""
         self.points = 0.00
+        self.account_info_list = [] # 本次新获取的账号信息
+        self.local_account_info = {} # 本地账号信息 wx_id -> 账号信息
+        self.code_prefetcher = None # code预取器
+        self.credential_store = CredentialStore("wxzftxbbs", legacy_file="wxzftxbbs_account_info.json") if CredentialStore else None
         self.user_agent = "Mozilla/5.0 (Linux; Android 12; M2012K11AC Build/SKQ1.220303.001; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/134.0.6998.136 Mobile Safari/537.36 XWEB/1340129 MMWEBSDK/20240301 MMWEBID/9871 MicroMessenger/8.0.48.2580(0x28003036) WeChat/arm64 Weixin NetType/WIFI Language/zh_CN ABI/arm64 MiniProgramEnv/android"
         
     def log(self, msg, level="info"):
@@ -101,16 +128,22 @@ class AutoTask:
         """
         return phone[:3] + "****" + phone[-4:]
 
-    def get_proxy(self):
+    def get_proxy(self, account=None):
         """
         获取代理
+        :param account: 账号标识，设置PROXY_STICKY时沿用该账号上次的代理
         :return: 代理
         """
         if not self.proxy_url:
             self.log("[获取代理] 没有找到环境变量PROXY_API_URL，不使用代理", level="warning")
             return None
+        if self.proxy_pool:
+            # 从代理池租用检查过的代理
+            proxy = self.proxy_pool.lease(account=account)
+            self.log(f"[获取代理] {proxy}")
+            return proxy
         url = self.proxy_url
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         proxy = response.text
         self.log(f"[获取代理] {proxy}")
         return proxy
@@ -173,6 +206,10 @@ class AutoTask:
         保存账号信息
         :param account_info: 账号信息（新获取的列表）
         """
+        if self.credential_store:
+            self.credential_store.save_many(account_info)
+            self.log(f"保存新数据: 成功")
+            return
         file_path = "wxzftxbbs_account_info.json"
         # 读取旧数据
         if os.path.exists(file_path):
@@ -194,6 +231,10 @@ class AutoTask:
         删除账号信息
         :param wx_id: 微信id
         """
+        if self.credential_store:
+            self.credential_store.remove(wx_id)
+            self.log(f"删除账号信息: 成功")
+            return
         file_path = "wxzftxbbs_account_info.json"
         if os.path.exists(file_path):
             with open(file_path, "r", encoding="utf-8") as f:
@@ -206,14 +247,37 @@ class AutoTask:
     def load_account_info(self):
         """
         加载账号信息
-        :return: 账号信息
+        :return: 账号信息 wx_id -> 账号信息
         """
+        if self.credential_store:
+            return self.credential_store.all()
         if os.path.exists("wxzftxbbs_account_info.json"):
             with open("wxzftxbbs_account_info.json", "r", encoding="utf-8") as f:
                 account_info = json.load(f)
-            return account_info
+            return {item['wx_id']: item for item in account_info}
         else:
-            return []
+            return {}
+
+    def need_login(self, wx_id):
+        """
+        账号是否需要授权登录：本地没有token或token快过期
+        :param wx_id: 微信id
+        :return: 是否需要授权
+        """
+        info = self.local_account_info.get(wx_id)
+        if not info:
+            return True
+        return bool(self.credential_store) and self.credential_store.token_state(info) == "expiring"
+
+    def update_account_info(self, account_info):
+        """
+        记录新获取的账号信息，有凭据库时立即写入，否则运行结束后统一写文件
+        :param account_info: 账号信息
+        """
+        if self.credential_store:
+            self.credential_store.save(account_info['wx_id'], account_info)
+        else:
+            self.account_info_list.append(account_info)
             
     def login(self, session, code):
         """
@@ -247,7 +311,7 @@ class AutoTask:
         """
         获取用户余额
         :param session: session
-        :return: 用户余额
+        :return: True 成功，False 服务端拒绝（token失效），None 请求出错
         """
         try:
             url = f"https://{self.host}/txbbs-mall/cashoutfree/getbalance"
@@ -256,13 +320,14 @@ class AutoTask:
             time.sleep(random.randint(3, 5))
             if int(response_json['errcode']) == 0:
                 self.points = int(response_json['data']['balance']) // 100
-                return self.points
+                return True
             else:
                 self.log(f"[{self.nickname}] 获取用户余额 发生错误: {response_json.get('msg', '未知错误')}", level="warning")
-                return 0
+                return False
         except Exception as e:
             self.log(f"[{self.nickname}] 获取用户余额 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return 0
+            # 网络等错误无法判断token是否有效
+            return None
         
     def get_gifts_list(self, session):
         """
@@ -317,84 +382,112 @@ class AutoTask:
         """
         try:
             self.log(f"【{self.script_name}】开始执行任务")
-            account_info_list = []
-            local_account_info = self.load_account_info()
-            self.log(f"本地共{len(local_account_info)}个账号")
-            for index, wx_id in enumerate(self.check_env(), 1):
-                # 清理账号信息
-                self.nickname = f"账号{index}"
-                self.token = ""
-                self.log("")
-                self.log(f"------ 账号{index} 开始执行任务 ------")
-                session = requests.Session()
-                headers = {
-                    "User-Agent": self.user_agent,
-                    "authority": self.host
-                }
-                session.headers.update(headers)
+            self.account_info_list = []
+            self.local_account_info = self.load_account_info()
+            self.log(f"本地共{len(self.local_account_info)}个账号")
+            wx_ids = list(self.check_env())
+            # 本地没有token或token快过期的账号需要授权，提前批量预取code
+            self.code_prefetcher = self.wechat_code_adapter.prefetch([wx_id for wx_id in wx_ids if self.need_login(wx_id)])
+            for index, wx_id in enumerate(wx_ids, 1):
+                proxy = None
+                try:
+                    # 清理账号信息
+                    self.nickname = f"账号{index}"
+                    self.token = ""
+                    self.log("")
+                    self.log(f"------ 账号{index} 开始执行任务 ------")
+                    session = requests.Session()
+                    headers = {
+                        "User-Agent": self.user_agent,
+                        "authority": self.host
+                    }
+                    session.headers.update(headers)
 
-                if MULTI_ACCOUNT_PROXY:
-                    proxy = self.get_proxy()
-                    if proxy:
-                        session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
-                        # # 检查代理，不可用重新获取
-                        # while not self.check_proxy(proxy, session):
-                        #     proxy = self.get_proxy()
-                        #     session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                    if MULTI_ACCOUNT_PROXY:
+                        proxy = self.get_proxy(wx_id)
+                        if proxy:
+                            session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                            if self.proxy_pool:
+                                # 只有目标站点的请求走代理，其他请求直连，并统计代理延迟和流量
+                                self.proxy_pool.apply(session, proxy, hosts=[self.host])
+                            # # 检查代理，不可用重新获取
+                            # while not self.check_proxy(proxy, session):
+                            #     proxy = self.get_proxy()
+                            #     session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
                 
-                token = None
-                # 查找本地账号
-                if local_account_info:
-                    for info in local_account_info:
-                        if info['wx_id'] == wx_id:
-                            token = info['token']
-                            # self.log(f"[登录] 找到本地token: {token}")
-                            break
-                # 本地没有则授权获取
-                if not token:
-                    code = self.wechat_code_adapter.get_code(wx_id)
-                    if code:
-                        token = self.login(session, code)
-                        now_account_info = {
-                            "wx_id": wx_id,
-                            "token": token
-                        }
-                        account_info_list.append(now_account_info)
-                else:
-                    self.token = token
-                    session.headers['Session-Token'] = token
-                # 检测token是否有效
-                if not self.get_balance(session):
-                    self.remove_account_info(wx_id)
-                    code = self.wechat_code_adapter.get_code(wx_id)
-                    if code:
-                        token = self.login(session, code)
+                    # 查找本地账号
+                    info = self.local_account_info.get(wx_id)
+                    token_state = self.credential_store.token_state(info) if self.credential_store and info else "unknown"
+                    token = info['token'] if info else None
+                    # 本地没有或快过期的授权获取，提前授权失败时继续使用本地token
+                    if not token or token_state == "expiring":
+                        code = self.code_prefetcher.get(wx_id)
+                        new_token = self.login(session, code) if code else None
+                        if new_token:
+                            token = new_token
+                            info = None # 新token，不计入旧token的寿命
+                            now_account_info = {
+                                "wx_id": wx_id,
+                                "token": token
+                            }
+                            self.update_account_info(now_account_info)
+                        elif token:
+                            self.log(f"[{self.nickname}] 提前授权失败，继续使用本地token", level="warning")
+                    if token:
+                        self.token = token
+                        session.headers['Session-Token'] = token
+                    # 检测token是否有效，本地token还年轻时跳过检查
+                    valid = True if token_state == "fresh" else (self.get_balance(session) if token else False)
+                    if valid is None:
+                        # 请求出错无法判断，保留本地token，下次运行再检查
+                        self.log(f"[{self.nickname}] 检查token出错，跳过该账号", level="error")
+                        session.close()
+                        continue
+                    if info and token_state != "fresh" and self.credential_store:
+                        self.credential_store.record_token_check(info, valid)
+                    if not valid:
+                        # 服务端拒绝了token才删除
+                        self.remove_account_info(wx_id)
+                        code = self.wechat_code_adapter.get_code(wx_id)
+                        token = self.login(session, code) if code else None
+                        if not token:
+                            self.log(f"[{self.nickname}] 授权失败，跳过该账号", level="error")
+                            session.close()
+                            continue
                         now_account_info = {
                             "wx_id": wx_id,
                             "token": token
                         }
-                        account_info_list.append(now_account_info)
-                    else:
-                        self.log(f"[{self.nickname}] 授权失败，跳过该账号", level="error")
-                        continue
-                # 获取优惠券列表
-                gifts_list = self.get_gifts_list(session)
-                for gift in gifts_list:
-                    if gift.get('gift_type') == 'GT_COUPON' and gift.get('gift_status') == 'GS_AVAILABLE':
-                        gift_id = gift.get('gift_id')
-                        self.redeem_gift(session, gift_id)
-                # 再次获取用户余额
-                self.get_balance(session)
-                self.log(f"[{self.nickname}] 当前提现免费券: {self.points}元")
-                # 清理session
-                session.close()
-                self.log(f"------ 账号{index} 执行任务结束 ------")
+                        self.update_account_info(now_account_info)
+                    # 获取优惠券列表
+                    gifts_list = self.get_gifts_list(session)
+                    for gift in gifts_list:
+                        if gift.get('gift_type') == 'GT_COUPON' and gift.get('gift_status') == 'GS_AVAILABLE':
+                            gift_id = gift.get('gift_id')
+                            self.redeem_gift(session, gift_id)
+                    # 再次获取用户余额
+                    if self.get_balance(session) is False and token_state == "fresh":
+                        # 跳过检查的token实际已失效，记录寿命并删除，下次重新授权
+                        self.credential_store.record_token_check(info, False)
+                        self.remove_account_info(wx_id)
+                    self.log(f"[{self.nickname}] 当前提现免费券: {self.points}元")
+                    # 清理session
+                    session.close()
+                    self.log(f"------ 账号{index} 执行任务结束 ------")
+                finally:
+                    # 归还代理池租用的代理
+                    if self.proxy_pool and proxy:
+                        self.proxy_pool.release(proxy, account=wx_id)
             # 保存新账号信息
-            if account_info_list:
-                self.save_account_info(account_info_list)
+            if self.account_info_list:
+                self.save_account_info(self.account_info_list)
         except Exception as e:
             self.log(f"【{self.script_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
         finally:
+            if self.proxy_pool:
+                self.proxy_pool.close()
+            if self.code_prefetcher:
+                self.code_prefetcher.close()
             if NOTIFY:
                 # 如果notify模块不存在，从远程下载至本地
                 if not os.path.exists("notify.py"):
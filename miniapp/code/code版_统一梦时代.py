@@ -8,6 +8,8 @@ name: code版_统一梦时代
     soy_codetoken_data (微信授权token)
     soy_codeurl_data (微信授权url)
     PROXY_API_URL (代理api，返回一条txt文本，内容为代理ip:端口)
+    LY_FORCE_TASKS (填True则忽略当天已完成的记录，所有任务重新执行)
+    LY_HTTP2 (填True则接口请求使用HTTP/2，所有账号共用连接，需要安装httpx[http2]，不支持时自动使用HTTP/1.1)
 定时: 一天两次
 cron: 10 8,9 * * *
 ------------更新日志------------
@@ -16,6 +18,18 @@ cron: 10 8,9 * * *
 2025/7/21  V1.2    适配更多协议
 2025/7/22  V1.3    修改协议适配器导入方式
 2025/7/28  V1.4    修改头部注释，以便拉库
+2026/10/18 V1.5    记录当天已完成的签到、抽奖，第二次运行不再授权登录
+2026/10/18 V1.6    多账号代理改为代理池后台批量获取、并发检查，检查代理最多重新获取3次
+2026/10/18 V1.7    代理池优先分配延迟低的代理，PROXY_STICKY为True时账号沿用上次的代理
+2026/10/18 V1.8    多账号代理只让目标站点的请求走代理，其他请求直连
+2026/10/18 V1.9    TLSAdapter使用共用的SSL上下文，复用TLS会话
+2026/10/18 V1.10    所有账号共用连接池，账号结束时释放连接
+2026/10/18 V1.11    可选接口请求使用HTTP/2，环境变量LY_HTTP2开启
+2026/10/18 V1.12    抽奖全部成功或次数用完才记为今日已完成
+2026/10/18 V1.13    代理池租用的代理在账号结束时归还，出错也会归还
+2026/10/18 V1.14    共用SSL上下文的适配器改用utils/tlsContext.py的LegacyTLSAdapter
+2026/10/18 V1.15    兼容旧站点的适配器只用于接口域名；账号出错时也释放连接
+2026/10/18 V1.16    抽奖今日已完成时单独跳过；页面内的抽奖活动恢复为不间隔
 """
 
 import json
@@ -53,6 +67,28 @@ if not os.path.exists(wechat_adapter_path):
         print(f"下载微信协议适配器文件失败（其他错误）：{e}")
         exit(1)
 from wechatCodeAdapter import WechatCodeAdapter # type: ignore
+# 导入代理池，没有则每个账号单独获取代理
+try:
+    from proxyPool import ProxyPool # type: ignore
+except ImportError:
+    ProxyPool = None
+# 导入每日任务台账，没有则每次都执行全部任务
+try:
+    from taskLedger import TaskLedger # type: ignore
+except ImportError:
+    TaskLedger = None
+
+# 导入共用连接池，没有则每个账号单独建立连接
+try:
+    from sharedTransport import SharedTransport # type: ignore
+except ImportError:
+    SharedTransport = None
+# 导入共用的TLS上下文，没有则每个连接池单独创建
+try:
+    from tlsContext import LegacyTLSAdapter, new_legacy_ssl_context # type: ignore
+except ImportError:
+    LegacyTLSAdapter = None
+    new_legacy_ssl_context = None
 
 class TLSAdapter(requests.adapters.HTTPAdapter):
     """
@@ -75,24 +111,34 @@ class AutoTask:
         """
         self.script_name = script_name
         self.proxy_url = os.getenv("PROXY_API_URL") # 代理api，返回一条txt文本，内容为代理ip:端口
+        # 代理池，后台批量获取并检查代理
+        self.proxy_pool = ProxyPool(self.proxy_url, check=self.check_proxy, log=self.log) if ProxyPool and MULTI_ACCOUNT_PROXY and self.proxy_url else None
         self.wx_appid = "wx532ecb3bdaaf92f9" # 微信小程序id
         self.wechat_code_adapter = WechatCodeAdapter(self.wx_appid)
         self.host = "xapi.weimob.com"
+        self.transport = SharedTransport(LegacyTLSAdapter or TLSAdapter, adapter_hosts=[self.host], http2_hosts=[self.host], ssl_context=new_legacy_ssl_context) if SharedTransport else None # 所有账号共用连接池，LY_HTTP2为True时接口域名使用HTTP/2
+        self.task_ledger = TaskLedger("tymsd") if TaskLedger else None
         self.user_agent = "Mozilla/5.0 (Linux; Android 12; M2012K11AC Build/SKQ1.220303.001; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/134.0.6998.136 Mobile Safari/537.36 XWEB/1340129 MMWEBSDK/20240301 MMWEBID/9871 MicroMessenger/8.0.48.2580(0x28003036) WeChat/arm64 Weixin NetType/WIFI Language/zh_CN ABI/arm64 MiniProgramEnv/android"
         
     def log(self, msg, level="info"):
         self.wechat_code_adapter.log(msg, level)
 
-    def get_proxy(self):
+    def get_proxy(self, account=None):
         """
         获取代理
+        :param account: 账号标识，设置PROXY_STICKY时沿用该账号上次的代理
         :return: 代理
         """
         if not self.proxy_url:
             self.log("[获取代理] 没有找到环境变量PROXY_API_URL，不使用代理", level="warning")
             return None
+        if self.proxy_pool:
+            # 从代理池租用检查过的代理
+            proxy = self.proxy_pool.lease(account=account)
+            self.log(f"[获取代理] {proxy}")
+            return proxy
         url = self.proxy_url
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         proxy = response.text
         self.log(f"[获取代理] {proxy}")
         return proxy
@@ -368,7 +414,7 @@ class AutoTask:
         :param session: session
         :param productInstanceId: 实例id
         :param actId: 活动id
-        :return: 抽奖结果
+        :return: 抽奖成功为True，次数已用完为None，失败为False
         """
         try:
             url = f"https://{self.host}/api3/orchestration/mobile/activity/draw/play"
@@ -383,13 +429,35 @@ class AutoTask:
                     self.log(f"[抽奖] 未中奖")
                 return True
             elif int(response_json['errcode']) == 101100003:
-                return False
+                # 次数已用完
+                return None
             else:
                 self.log(f"[抽奖] {response_json['errmsg']}", level="warning")
                 return False
         except Exception as e:
             self.log(f"[抽奖] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
             return False
+
+    def draw_all(self, session, activity_param, interval=True):
+        """
+        用完活动的全部抽奖次数
+        :param session: session
+        :param activity_param: 活动参数
+        :param interval: 每次抽奖前是否间隔3-5秒
+        :return: 是否已抽完（每次都抽奖成功或次数已用完）
+        """
+        lottery_num = self.get_lottery_num(session, activity_param['productInstanceId'], activity_param['actId'])
+        if lottery_num is False:
+            return False
+        for i in range(lottery_num):
+            if interval:
+                time.sleep(random.randint(3, 5))
+            result = self.lottery(session, activity_param['productInstanceId'], activity_param['actId'])
+            if result is None:
+                return True
+            if not result:
+                return False
+        return True
         
     def get_points(self, session):
         """
@@ -412,6 +480,15 @@ class AutoTask:
             self.log(f"[积分] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
             return False
 
+    def mark_task(self, wx_id, step):
+        """
+        记录步骤今天已完成
+        :param wx_id: 微信id
+        :param step: 步骤名
+        """
+        if self.task_ledger:
+            self.task_ledger.mark_done(wx_id, step)
+
     def run(self):
         """
         运行任务
@@ -421,61 +498,90 @@ class AutoTask:
             
             # 检查环境变量
             for index, wx_id in enumerate(self.check_env(), 1):
-                self.log("")
-                self.log(f"------ 【账号{index}】开始执行任务 ------")
+                proxy = None
+                session = None
+                try:
+                    self.log("")
+                    self.log(f"------ 【账号{index}】开始执行任务 ------")
+                    # 今天的任务都已完成，不再授权登录
+                    if self.task_ledger and self.task_ledger.all_done(wx_id, ("signin", "lottery")):
+                        self.log(f"[账号{index}] 今日签到、抽奖已完成，跳过")
+                        self.log(f"------ 【账号{index}】执行任务完成 ------")
+                        continue
 
-                if MULTI_ACCOUNT_PROXY:
-                    proxy = self.get_proxy()
-                    if proxy:
-                        session = requests.Session()
-                        session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
-                        # 检查代理，不可用重新获取
-                        while not self.check_proxy(proxy, session):
-                            proxy = self.get_proxy()
+                    if MULTI_ACCOUNT_PROXY:
+                        proxy = self.get_proxy(wx_id)
+                        if proxy:
+                            session = self.transport.session() if self.transport else requests.Session()
                             session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                            if self.proxy_pool:
+                                # 只有目标站点的请求走代理，其他请求直连，并统计代理延迟和流量
+                                self.proxy_pool.apply(session, proxy, hosts=[self.host])
+                            # 检查代理，不可用重新获取，最多重新获取3次，代理池租用的已检查过
+                            retry = 0
+                            while not self.proxy_pool and retry < 3 and not self.check_proxy(proxy, session):
+                                retry += 1
+                                proxy = self.get_proxy()
+                                session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                        else:
+                            session = self.transport.session() if self.transport else requests.Session()
                     else:
-                        session = requests.Session()
-                else:
-                    session = requests.Session()
+                        session = self.transport.session() if self.transport else requests.Session()
                     
-                session.headers["User-Agent"] = self.user_agent
+                    session.headers["User-Agent"] = self.user_agent
 
-                # 执行微信授权
-                code = self.wechat_code_adapter.get_code(wx_id)
-                if code:
-                    if self.wxlogin(session, code):
-                        if not self.get_sign_info(session):
-                            # 签到
-                            self.sign_in(session)
-                            time.sleep(random.randint(1, 3))
-                        else:
-                            self.log(f"[签到] 今日已签到", level="warning")
-                        # 抽奖活动
-                        activity_info = self.get_activity_info(session)
-                        activity_params = self.check_activity(activity_info)
-                        for activity_param in activity_params:
-                            if "tmpKey" in activity_param:
-                                self.log(f"[活动] {activity_param['activity_name']}")
-                                lottery_num = self.get_lottery_num(session, activity_param['productInstanceId'], activity_param['actId'])
-                                for i in range(lottery_num):
-                                    time.sleep(random.randint(3, 5))
-                                    self.lottery(session, activity_param['productInstanceId'], activity_param['actId'])
-                            elif "pageid" in activity_param:
-                                # 二次查询，防止页面内有抽奖活动
-                                activity_info = self.get_activity_info(session, activity_param['pageid'])
-                                activity_params = self.check_activity(activity_info)
-                                for activity_param in activity_params:
+                    # 执行微信授权
+                    code = self.wechat_code_adapter.get_code(wx_id)
+                    if code:
+                        if self.wxlogin(session, code):
+                            if self.task_ledger and self.task_ledger.is_done(wx_id, "signin"):
+                                self.log(f"[签到] 今日已完成，跳过")
+                            elif not self.get_sign_info(session):
+                                # 签到
+                                if self.sign_in(session):
+                                    self.mark_task(wx_id, "signin")
+                                time.sleep(random.randint(1, 3))
+                            else:
+                                self.log(f"[签到] 今日已签到", level="warning")
+                                self.mark_task(wx_id, "signin")
+                            # 抽奖活动，所有活动都抽完才记为今日已完成
+                            if self.task_ledger and self.task_ledger.is_done(wx_id, "lottery"):
+                                self.log(f"[抽奖] 今日已完成，跳过")
+                            else:
+                                activity_info = self.get_activity_info(session)
+                                lottery_done = bool(activity_info)
+                                for activity_param in self.check_activity(activity_info or []):
                                     if "tmpKey" in activity_param:
-                                        lottery_num = self.get_lottery_num(session, activity_param['productInstanceId'], activity_param['actId'])
-                                        for i in range(lottery_num):
-                                            if not self.lottery(session, activity_param['productInstanceId'], activity_param['actId']):
-                                                break
-                        # 查询积分
-                        self.get_points(session)
-                self.log(f"------ 【账号{index}】执行任务完成 ------")
+                                        self.log(f"[活动] {activity_param['activity_name']}")
+                                        lottery_done = self.draw_all(session, activity_param) and lottery_done
+                                    elif "pageid" in activity_param:
+                                        # 二次查询，防止页面内有抽奖活动
+                                        page_info = self.get_activity_info(session, activity_param['pageid'])
+                                        if not page_info:
+                                            lottery_done = False
+                                            continue
+                                        for page_param in self.check_activity(page_info):
+                                            if "tmpKey" in page_param:
+                                                lottery_done = self.draw_all(session, page_param, interval=False) and lottery_done
+                                if lottery_done:
+                                    self.mark_task(wx_id, "lottery")
+                            # 查询积分
+                            self.get_points(session)
+                    self.log(f"------ 【账号{index}】执行任务完成 ------")
+                finally:
+                    # 释放账号的连接，出错也释放
+                    if session:
+                        session.close()
+                    # 归还代理池租用的代理
+                    if self.proxy_pool and proxy:
+                        self.proxy_pool.release(proxy, account=wx_id)
         except Exception as e:
             self.log(f"【{self.script_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
         finally:
+            if self.proxy_pool:
+                self.proxy_pool.close()
+            if self.transport:
+                self.transport.close()
             if NOTIFY:
                 # 如果notify模块不存在，从远程下载至本地
                 if not os.path.exists("notify.py"):
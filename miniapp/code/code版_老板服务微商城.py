@@ -8,11 +8,30 @@ name: code版_老板服务微商城
     soy_codetoken_data (微信授权token)
     soy_codeurl_data (微信授权url)
     PROXY_API_URL (代理api，返回一条txt文本，内容为代理ip:端口)
+    LY_CREDENTIAL_DB (账号凭据数据库文件，默认ly_credentials.db)
 定时: 一天两次
 cron: 10 11,12 * * *
 ------------更新日志------------
 2025/7/23   V1.0    初始化脚本
 2025/7/28   V1.1    修改头部注释，以便拉库
+2026/10/18  V1.2    支持多账号并发执行，环境变量LY_CONCURRENCY设置并发数
+2026/10/18  V1.3    步骤间隔改为协作式调度，等待期间执行其他账号
+2026/10/18  V1.4    本地没有openid的账号提前预取code
+2026/10/18  V1.5    账号信息改为存入共用的SQLite凭据库，按wxid单条读写
+2026/10/18  V1.6    按openid观测寿命跳过有效性检查，快过期的提前预取code重新授权
+2026/10/18  V1.7    运行中断后重新运行跳过已完成的账号
+2026/10/18  V1.8    多账号代理改为代理池后台批量获取、并发检查，检查代理最多重新获取3次
+2026/10/18  V1.9    代理池优先分配延迟低的代理，PROXY_STICKY为True时账号沿用上次的代理
+2026/10/18  V1.10    多账号代理只让目标站点的请求走代理，其他请求直连
+2026/10/18  V1.11    请求vip.foxech.com按每秒5次限流，所有账号共用，LY_HOST_RATE可修改
+2026/10/18  V1.12    TLSAdapter使用共用的SSL上下文，复用TLS会话
+2026/10/18  V1.13    所有账号共用连接池，账号结束时释放连接
+2026/10/18  V1.14    提前授权失败时继续使用本地openid，只在服务端拒绝时删除
+2026/10/18  V1.15    代理池租用的代理在账号结束时归还，出错也会归还
+2026/10/18  V1.16    共用SSL上下文的适配器改用utils/tlsContext.py的LegacyTLSAdapter
+2026/10/18  V1.17    兼容旧站点的适配器只用于接口域名，其他域名使用默认TLS设置
+2026/10/18  V1.18    预取code改在执行账号的进程中启动，多进程时不再继承父进程的预取线程；没有凭据库时只用单进程
+2026/10/18  V1.19    共用连接池在接口域名设置之后创建，修复无法启动
 """
 import json
 import random
@@ -23,11 +42,13 @@ import sys
 import hashlib
 import traceback
 import ssl
+import threading
 from datetime import datetime
 
 MULTI_ACCOUNT_SPLIT = ["\n", "@"] # 分隔符列表
 MULTI_ACCOUNT_PROXY = False # 是否使用多账号代理，默认不使用，True则使用多账号代理
 NOTIFY = os.getenv("LY_NOTIFY") or False # 是否推送日志，默认不推送，True则推送
+HOST_RATE_LIMITS = {"vip.foxech.com": 5} # 每个域名每秒请求数上限，所有账号共用，环境变量LY_HOST_RATE可覆盖
 
 # 导入微信协议适配器
 if "miniapp" not in os.path.abspath(__file__): # 单独脚本，非拉库
@@ -49,6 +70,38 @@ if not os.path.exists(wechat_adapter_path):
         print(f"下载微信协议适配器文件失败（其他错误）：{e}")
         exit(1)
 from wechatCodeAdapter import WechatCodeAdapter # type: ignore
+# 导入代理池，没有则每个账号单独获取代理
+try:
+    from proxyPool import ProxyPool # type: ignore
+except ImportError:
+    ProxyPool = None
+# 导入多账号并发执行器，没有则按顺序执行
+try:
+    from taskExecutor import TaskExecutor, AccountState # type: ignore
+except ImportError:
+    TaskExecutor = None
+    AccountState = lambda default=None: default
+# 导入按域名限流，没有则不限流
+try:
+    from rateLimiter import HostRateLimiter # type: ignore
+except ImportError:
+    HostRateLimiter = None
+# 导入账号凭据存储，没有则使用本地json文件
+try:
+    from credentialStore import CredentialStore # type: ignore
+except ImportError:
+    CredentialStore = None
+
+# 导入共用连接池，没有则每个账号单独建立连接
+try:
+    from sharedTransport import SharedTransport # type: ignore
+except ImportError:
+    SharedTransport = None
+# 导入共用的TLS上下文，没有则每个连接池单独创建
+try:
+    from tlsContext import LegacyTLSAdapter # type: ignore
+except ImportError:
+    LegacyTLSAdapter = None
 
 class TLSAdapter(requests.adapters.HTTPAdapter):
     """
@@ -64,6 +117,11 @@ class TLSAdapter(requests.adapters.HTTPAdapter):
         return super(TLSAdapter, self).init_poolmanager(*args, **kwargs)
 
 class AutoTask:
+    # 账号级状态，并发执行时每个账号各自一份
+    nickname = AccountState("")
+    openid = AccountState("")
+    score = AccountState(0)
+
     def __init__(self, script_name):
         """
         初始化自动任务类
@@ -71,12 +129,18 @@ class AutoTask:
         """
         self.script_name = script_name
         self.proxy_url = os.getenv("PROXY_API_URL") # 代理api，返回一条txt文本，内容为代理ip:端口
+        # 代理池，后台批量获取并检查代理
+        self.proxy_pool = ProxyPool(self.proxy_url, check=self.check_proxy, log=self.log) if ProxyPool and MULTI_ACCOUNT_PROXY and self.proxy_url else None
+        self.host_limiter = HostRateLimiter(HOST_RATE_LIMITS) if HostRateLimiter else None # 按域名限流，所有账号共用
         self.wx_appid = "wxc8c90950cf4546f6" # 微信小程序id
         self.wechat_code_adapter = WechatCodeAdapter(self.wx_appid)
         self.host = "vip.foxech.com"
-        self.nickname = ""
-        self.openid = ""
-        self.score = 0
+        self.transport = SharedTransport(LegacyTLSAdapter or TLSAdapter, adapter_hosts=[self.host]) if SharedTransport else None # 所有账号共用连接池
+        self.account_info_lock = threading.Lock() # 账号信息文件读写锁
+        self.account_info_list = [] # 本次新获取的账号信息
+        self.local_account_info = {} # 本地账号信息 wx_id -> 账号信息
+        self.credential_store = CredentialStore("lbfwwsc", legacy_file="lbfwwsc_account_info.json") if CredentialStore else None
+        self.code_prefetcher = None # code预取器
         self.user_agent = "Mozilla/5.0 (Linux; Android 12; M2012K11AC Build/SKQ1.220303.001; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/134.0.6998.136 Mobile Safari/537.36 XWEB/1340129 MMWEBSDK/20240301 MMWEBID/9871 MicroMessenger/8.0.48.2580(0x28003036) WeChat/arm64 Weixin NetType/WIFI Language/zh_CN ABI/arm64 MiniProgramEnv/android"
         
     def log(self, msg, level="info"):
@@ -99,16 +163,22 @@ class AutoTask:
         """
         return phone[:3] + "****" + phone[-4:]
 
-    def get_proxy(self):
+    def get_proxy(self, account=None):
         """
         获取代理
+        :param account: 账号标识，设置PROXY_STICKY时沿用该账号上次的代理
         :return: 代理
         """
         if not self.proxy_url:
             self.log("[获取代理] 没有找到环境变量PROXY_API_URL，不使用代理", level="warning")
             return None
+        if self.proxy_pool:
+            # 从代理池租用检查过的代理
+            proxy = self.proxy_pool.lease(account=account)
+            self.log(f"[获取代理] {proxy}")
+            return proxy
         url = self.proxy_url
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         proxy = response.text
         self.log(f"[获取代理] {proxy}")
         return proxy
@@ -171,6 +241,10 @@ class AutoTask:
         保存账号信息
         :param account_info: 账号信息（新获取的列表）
         """
+        if self.credential_store:
+            self.credential_store.save_many(account_info)
+            self.log(f"保存新数据: 成功")
+            return
         file_path = "lbfwwsc_account_info.json"
         # 读取旧数据
         if os.path.exists(file_path):
@@ -192,26 +266,63 @@ class AutoTask:
         删除账号信息
         :param wx_id: 微信id
         """
-        file_path = "lbfwwsc_account_info.json"
-        if os.path.exists(file_path):
-            with open(file_path, "r", encoding="utf-8") as f:
-                old_list = json.load(f)
-            old_list = [item for item in old_list if item['wx_id'] != wx_id]
-            with open(file_path, "w", encoding="utf-8") as f:
-                json.dump(old_list, f, ensure_ascii=False, indent=2)
+        if self.credential_store:
+            self.credential_store.remove(wx_id)
             self.log(f"删除账号信息: 成功")
+            return
+        file_path = "lbfwwsc_account_info.json"
+        with self.account_info_lock:
+            if os.path.exists(file_path):
+                with open(file_path, "r", encoding="utf-8") as f:
+                    old_list = json.load(f)
+                old_list = [item for item in old_list if item['wx_id'] != wx_id]
+                with open(file_path, "w", encoding="utf-8") as f:
+                    json.dump(old_list, f, ensure_ascii=False, indent=2)
+                self.log(f"删除账号信息: 成功")
 
     def load_account_info(self):
         """
         加载账号信息
-        :return: 账号信息
+        :return: 账号信息 wx_id -> 账号信息
         """
+        if self.credential_store:
+            return self.credential_store.all()
         if os.path.exists("lbfwwsc_account_info.json"):
             with open("lbfwwsc_account_info.json", "r", encoding="utf-8") as f:
                 account_info = json.load(f)
-            return account_info
+            return {item['wx_id']: item for item in account_info}
         else:
-            return []
+            return {}
+
+    def need_login(self, wx_id):
+        """
+        账号是否需要授权登录：本地没有openid或openid快过期
+        :param wx_id: 微信id
+        :return: 是否需要授权
+        """
+        info = self.local_account_info.get(wx_id)
+        if not info:
+            return True
+        return bool(self.credential_store) and self.credential_store.token_state(info) == "expiring"
+
+    def prefetch_codes(self, wx_ids):
+        """
+        本地没有openid或openid快过期的账号需要授权，提前批量预取code
+        :param wx_ids: 本进程要执行的微信id
+        :return: 已启动的code预取器
+        """
+        self.code_prefetcher = self.wechat_code_adapter.prefetch([wx_id for wx_id in wx_ids if self.need_login(wx_id)])
+        return self.code_prefetcher
+
+    def update_account_info(self, account_info):
+        """
+        记录新获取的账号信息，有凭据库时立即写入，否则运行结束后统一写文件
+        :param account_info: 账号信息
+        """
+        if self.credential_store:
+            self.credential_store.save(account_info['wx_id'], account_info)
+        else:
+            self.account_info_list.append(account_info)
         
     def get_payload_token(self, payload):
         """
@@ -265,7 +376,7 @@ class AutoTask:
         """
         获取用户信息
         :param session: session
-        :return: 用户信息
+        :return: True 成功，False 服务端拒绝（openid失效），None 请求出错
         """
         try:
             url = f"https://{self.host}/index.php/api/member/get_member_info"
@@ -288,7 +399,8 @@ class AutoTask:
                 return False
         except Exception as e:
             self.log(f"[获取用户信息] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return False
+            # 网络等错误无法判断openid是否有效
+            return None
         
     def sign_in(self, session):
         """
@@ -525,102 +637,153 @@ class AutoTask:
             self.log(f"[{self.nickname}] 浏览商品{id}发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
             return False
         
-    def run(self):
+    def run_account(self, index, wx_id):
         """
-        运行任务
+        执行单个账号任务，yield步骤间的等待秒数
+        :param index: 账号序号
+        :param wx_id: 微信id
         """
+        # 清理账号信息
+        self.nickname = f"账号{index}"
+        self.openid = ""
+        self.log("")
+        self.log(f"------ 【账号{index}】开始执行任务 ------")
+        session = self.transport.session() if self.transport else requests.Session()
+        proxy = None
         try:
-            self.log(f"【{self.script_name}】开始执行任务")
-            account_info_list = []
-            local_account_info = self.load_account_info()
-            self.log(f"本地共{len(local_account_info)}个账号")
-            for index, wx_id in enumerate(self.check_env(), 1):
-                # 清理账号信息
-                self.nickname = ""
-                self.openid = ""
-                self.log("")
-                self.log(f"------ 【账号{index}】开始执行任务 ------")
-                session = requests.Session()
-                headers = {
-                    "User-Agent": self.user_agent,
-                    "Host": self.host,
-                    "Content-Type": "application/json"
-                }
-                session.headers.update(headers)
+            if self.host_limiter:
+                self.host_limiter.install(session)
+            headers = {
+                "User-Agent": self.user_agent,
+                "Host": self.host,
+                "Content-Type": "application/json"
+            }
+            session.headers.update(headers)
 
-                if MULTI_ACCOUNT_PROXY:
-                    proxy = self.get_proxy()
-                    if proxy:
-                        session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
-                        # # 检查代理，不可用重新获取
-                        # while not self.check_proxy(proxy, session):
-                        #     proxy = self.get_proxy()
-                        #     session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+            if MULTI_ACCOUNT_PROXY:
+                proxy = self.get_proxy(wx_id)
+                if proxy:
+                    session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                    if self.proxy_pool:
+                        # 只有目标站点的请求走代理，其他请求直连，并统计代理延迟和流量
+                        self.proxy_pool.apply(session, proxy, hosts=[self.host])
+                    # # 检查代理，不可用重新获取
+                    # while not self.check_proxy(proxy, session):
+                    #     proxy = self.get_proxy()
+                    #     session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
 
-                openid = None
-                # 查找本地账号
-                if local_account_info:
-                    for info in local_account_info:
-                        if info['wx_id'] == wx_id:
-                            openid = info['openid']
-                            # self.log(f"[登录] 找到本地openid: {openid}")
-                            break
-                # 本地没有则授权获取
-                if not openid:
-                    code = self.wechat_code_adapter.get_code(wx_id)
-                    if code:
-                        openid = self.wxlogin(session, code)
-                        now_account_info = {
-                            "wx_id": wx_id,
-                            "openid": openid
-                        }
-                        account_info_list.append(now_account_info)
-                else:
-                    self.openid = openid
-                # 获取用户信息
-                if not self.get_user_info(session):
+            # 查找本地账号
+            info = self.local_account_info.get(wx_id)
+            token_state = self.credential_store.token_state(info) if self.credential_store and info else "unknown"
+            openid = info['openid'] if info else None
+            # 本地没有或快过期的授权获取，提前授权失败时继续使用本地openid
+            if not openid or token_state == "expiring":
+                code = self.code_prefetcher.get(wx_id)
+                new_openid = self.wxlogin(session, code) if code else None
+                if new_openid:
+                    openid = new_openid
+                    info = None # 新openid，不计入旧openid的寿命
+                    now_account_info = {
+                        "wx_id": wx_id,
+                        "openid": openid
+                    }
+                    self.update_account_info(now_account_info)
+                elif openid:
+                    self.log(f"[{self.nickname}] 提前授权失败，继续使用本地openid", level="warning")
+            if not openid:
+                self.log(f"[{self.nickname}] 授权失败，跳过该账号", level="error")
+                return
+            self.openid = openid
+            # 获取用户信息，本地openid还年轻时跳过检查
+            if token_state != "fresh":
+                valid = self.get_user_info(session)
+                if valid is None:
+                    # 请求出错无法判断，保留本地openid，下次运行再检查
+                    self.log(f"[{self.nickname}] 检查openid出错，跳过该账号", level="error")
+                    return
+                if info and self.credential_store:
+                    self.credential_store.record_token_check(info, valid)
+                if not valid:
+                    # 服务端拒绝了openid才删除
                     self.remove_account_info(wx_id)
-                    continue
-                # 签到
-                self.sign_in(session)
-                time.sleep(random.randint(3, 5))
-                # 获取任务列表
-                task_list = self.get_task_list(session)
-                for task in task_list:
-                    if "秒杀" in task['title'] and task['is_over'] == 0:
-                        # 浏览秒杀活动
-                        ms_list = self.get_ms_list(session)
-                        for ms in ms_list:
-                            if ms['is_start'] == 1:
-                                ms_id = ms['id']
-                                self.get_ms_goods_list(session, ms_id)
-                                time.sleep(random.randint(3, 5))
-                    elif "好文" in task['title'] and task['is_over'] == 0:
-                        # 浏览文章
-                        news_list = self.get_news_list(session)
-                        news_ids = [item['id'] for item in news_list]
-                        for news_id in random.sample(news_ids, 3):
-                            self.get_news_detail(session, news_id)
-                            time.sleep(random.randint(3, 5))
-                    elif "浏览3个商品" in task['title'] and task['is_over'] == 0:
-                        # 浏览商品
-                        goods_list = self.get_goods_list(session)
-                        goods_ids = [item['id'] for item in goods_list]
-                        for goods_id in random.sample(goods_ids, 3):
-                            self.get_goods_detail(session, goods_id)
-                            time.sleep(random.randint(3, 5))
-                # 重新获取一次用户信息
-                self.get_user_info(session)
-                self.log(f"[{self.nickname}] 当前积分: {self.score}")
-                self.log(f"------ 【账号{index}】执行任务完成 ------")
-                # 清理session
-                session.close()
+                    return
+            # 签到
+            self.sign_in(session)
+            yield random.randint(3, 5)
+            # 获取任务列表
+            task_list = self.get_task_list(session)
+            for task in task_list:
+                if "秒杀" in task['title'] and task['is_over'] == 0:
+                    # 浏览秒杀活动
+                    ms_list = self.get_ms_list(session)
+                    for ms in ms_list:
+                        if ms['is_start'] == 1:
+                            ms_id = ms['id']
+                            self.get_ms_goods_list(session, ms_id)
+                            yield random.randint(3, 5)
+                elif "好文" in task['title'] and task['is_over'] == 0:
+                    # 浏览文章
+                    news_list = self.get_news_list(session)
+                    news_ids = [item['id'] for item in news_list]
+                    for news_id in random.sample(news_ids, 3):
+                        self.get_news_detail(session, news_id)
+                        yield random.randint(3, 5)
+                elif "浏览3个商品" in task['title'] and task['is_over'] == 0:
+                    # 浏览商品
+                    goods_list = self.get_goods_list(session)
+                    goods_ids = [item['id'] for item in goods_list]
+                    for goods_id in random.sample(goods_ids, 3):
+                        self.get_goods_detail(session, goods_id)
+                        yield random.randint(3, 5)
+            # 重新获取一次用户信息
+            if self.get_user_info(session) is False and token_state == "fresh":
+                # 跳过检查的openid实际已失效，记录寿命并删除，下次重新授权
+                self.credential_store.record_token_check(info, False)
+                self.remove_account_info(wx_id)
+            self.log(f"[{self.nickname}] 当前积分: {self.score}")
+            self.log(f"------ 【账号{index}】执行任务完成 ------")
+        finally:
+            # 释放账号的连接
+            session.close()
+            # 归还代理池租用的代理
+            if self.proxy_pool and proxy:
+                self.proxy_pool.release(proxy, account=wx_id)
+
+    def run(self):
+        """
+        运行任务
+        """
+        try:
+            self.log(f"【{self.script_name}】开始执行任务")
+            self.account_info_list = []
+            self.local_account_info = self.load_account_info()
+            self.log(f"本地共{len(self.local_account_info)}个账号")
+            wx_ids = list(self.check_env())
+            # 提前报告协议中没有授权码的wxid
+            self.wechat_code_adapter.check_wx_ids(wx_ids)
+            if TaskExecutor:
+                # 预取code的线程在执行账号的进程中启动，多进程时在fork之后；
+                # 没有凭据库时新openid只保存在内存中，子进程的结果带不回来，只用单进程
+                TaskExecutor(self.run_account, resume=True, setup=self.prefetch_codes,
+                             processes=None if self.credential_store else 1).run(wx_ids)
+            else:
+                self.prefetch_codes(wx_ids)
+                try:
+                    for index, wx_id in enumerate(wx_ids, 1):
+                        for delay in self.run_account(index, wx_id):
+                            time.sleep(delay)
+                finally:
+                    self.code_prefetcher.close()
             # 保存新账号信息
-            if account_info_list:
-                self.save_account_info(account_info_list)
+            if self.account_info_list:
+                self.save_account_info(self.account_info_list)
         except Exception as e:
             self.log(f"【{self.script_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
         finally:
+            if self.proxy_pool:
+                self.proxy_pool.close()
+            if self.transport:
+                self.transport.close()
             if NOTIFY:
                 # 如果notify模块不存在，从远程下载至本地
                 if not os.path.exists("notify.py"):
@@ -5,6 +5,8 @@ name: 中免日上
 入口: 微信小程序 (https://a.c1ns.cn/qbFEB)
 功能: 签到、查积分、小游戏
 变量: zmrs_token = 'Accesstoken' (https://api.cdfsunrise.com/restfulapi/Account/getAccountInfo 请求中的Accesstoken)
+    LY_FORCE_TASKS (填True则忽略当天已完成的记录，所有任务重新执行)
+    LY_HTTP2 (填True则接口请求使用HTTP/2，所有账号共用连接，需要安装httpx[http2]，不支持时自动使用HTTP/1.1)
 定时: 一天两次
 cron: 10 8,9 * * *
 ------------更新日志------------
@@ -14,6 +16,21 @@ cron: 10 8,9 * * *
 2025/7/8    V1.3    尝试修复火爆问题
 2025/7/19   V1.4    去除抽奖、增加一个浏览
 2025/7/28   V1.5    修改头部注释，以便拉库
+2026/10/18  V1.6    支持多账号并发执行，环境变量LY_CONCURRENCY设置并发数
+2026/10/18  V1.7    步骤间隔改为协作式调度，等待期间执行其他账号
+2026/10/18  V1.8    记录当天已完成的签到、浏览、做包子，第二次运行跳过
+2026/10/18  V1.9    运行中断后重新运行跳过已完成的账号
+2026/10/18  V1.10    多账号代理改为代理池后台批量获取、并发检查，检查代理最多重新获取3次
+2026/10/18  V1.11    优先使用延迟低的代理，PROXY_STICKY为True时账号沿用上次的代理
+2026/10/18  V1.12    多账号代理只让目标站点的请求走代理，其他请求直连
+2026/10/18  V1.13    请求api.cdfsunrise.com按每秒5次限流，所有账号共用，LY_HOST_RATE可修改
+2026/10/18  V1.14    TLSAdapter使用共用的SSL上下文，复用TLS会话
+2026/10/18  V1.15    所有账号共用连接池，账号结束时释放连接
+2026/10/18  V1.16    可选接口请求使用HTTP/2，环境变量LY_HTTP2开启
+2026/10/18  V1.17    做包子成功才记为今日已完成
+2026/10/18  V1.18    代理池租用的代理在账号结束时归还，出错也会归还
+2026/10/18  V1.19    共用SSL上下文的适配器改用utils/tlsContext.py的LegacyTLSAdapter
+2026/10/18  V1.20    兼容旧站点的适配器只用于接口域名，其他域名使用默认TLS设置
 """
 
 import json
@@ -22,6 +39,7 @@ import re
 import time
 import requests
 import os
+import sys
 import string
 import logging
 import traceback
@@ -31,6 +49,7 @@ from datetime import datetime
 MULTI_ACCOUNT_SPLIT = ["\n", "@"] # 分隔符列表
 MULTI_ACCOUNT_PROXY = True # 是否使用多账号代理，默认不使用，True则使用多账号代理
 NOTIFY = os.getenv("LY_NOTIFY") or False # 是否推送日志，默认不推送，True则推送
+HOST_RATE_LIMITS = {"api.cdfsunrise.com": 5} # 每个域名每秒请求数上限，所有账号共用，环境变量LY_HOST_RATE可覆盖
 # 504 来财包 505 福禄包 506 转运包 507 美力包 508 普通包 509 锦鲤包
 BAOZI_INFO = {
     "509": ["xl_jlh", "xl_fhy", "xl_hongyunjiang"],
@@ -40,6 +59,42 @@ BAOZI_INFO = {
     "507": ["xl_jyg", "xl_ltx", "xl_zlc"]
 }
 
+# 导入多账号并发执行器，没有则按顺序执行
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../utils')))
+try:
+    from taskExecutor import TaskExecutor, AccountState, AccountLogs # type: ignore
+except ImportError:
+    TaskExecutor = None
+    AccountState = lambda default=None: default
+    AccountLogs = list
+# 导入按域名限流，没有则不限流
+try:
+    from rateLimiter import HostRateLimiter # type: ignore
+except ImportError:
+    HostRateLimiter = None
+# 导入代理池，没有则每个账号单独获取代理
+try:
+    from proxyPool import ProxyPool # type: ignore
+except ImportError:
+    ProxyPool = None
+# 导入每日任务台账，没有则每次都执行全部任务
+try:
+    from taskLedger import TaskLedger # type: ignore
+except ImportError:
+    TaskLedger = None
+
+# 导入共用连接池，没有则每个账号单独建立连接
+try:
+    from sharedTransport import SharedTransport # type: ignore
+except ImportError:
+    SharedTransport = None
+# 导入共用的TLS上下文，没有则每个连接池单独创建
+try:
+    from tlsContext import LegacyTLSAdapter, new_legacy_ssl_context # type: ignore
+except ImportError:
+    LegacyTLSAdapter = None
+    new_legacy_ssl_context = None
+
 class TLSAdapter(requests.adapters.HTTPAdapter):
     """
     自定义TLS
@@ -54,27 +109,34 @@ class TLSAdapter(requests.adapters.HTTPAdapter):
         return super(TLSAdapter, self).init_poolmanager(*args, **kwargs)
 
 class AutoTask:
+    # 账号级状态，并发执行时每个账号各自一份
+    nickname = AccountState("")
+    token = AccountState("")
+    user_id = AccountState("")
+    mobile = AccountState("")
+    lottery_count = AccountState(0)
+    activity_key = AccountState("")
+    activity_type = AccountState("")
+    game_user_fragment_count = AccountState(0)
+
     def __init__(self, script_name):
         """
         初始化自动任务类
         :param script_name: 脚本名称，用于日志显示
         """
         self.script_name = script_name
-        self.log_msgs = []  # 日志收集
+        self.log_msgs = AccountLogs()  # 日志收集
         self.proxy_url = os.getenv("PROXY_API_URL") # 代理api，返回一条txt文本，内容为代理ip:端口
+        # 代理池，后台批量获取并检查代理
+        self.proxy_pool = ProxyPool(self.proxy_url, check=self.check_proxy, log=self.log) if ProxyPool and MULTI_ACCOUNT_PROXY and self.proxy_url else None
+        self.host_limiter = HostRateLimiter(HOST_RATE_LIMITS) if HostRateLimiter else None # 按域名限流，所有账号共用
         self.wx_appid = "wx82028cdb701506f3" # 微信小程序id
         # self.wx_code_url = os.getenv("soy_codeurl_data")
         # self.wx_code_token = os.getenv("soy_codetoken_data")
         self.host = "api.cdfsunrise.com"
-        self.nickname = ""
-        self.token = ""
-        self.user_id = ""
-        self.mobile = ""
+        self.transport = SharedTransport(LegacyTLSAdapter or TLSAdapter, adapter_hosts=[self.host], http2_hosts=[self.host], ssl_context=new_legacy_ssl_context) if SharedTransport else None # 所有账号共用连接池，LY_HTTP2为True时接口域名使用HTTP/2
         self.device_id = self.get_random_device_id()
-        self.lottery_count = 0
-        self.activity_key = ""
-        self.activity_type = ""
-        self.game_user_fragment_count = 0
+        self.task_ledger = TaskLedger("zmrs") if TaskLedger else None
         self.user_agent = "Mozilla/5.0 (Linux; Android 12; M2012K11AC Build/SKQ1.220303.001; wv) AppleWebKit/537.36 (KHTML, like Gecko) Version/4.0 Chrome/134.0.6998.136 Mobile Safari/537.36 XWEB/1340129 MMWEBSDK/20240301 MMWEBID/9871 MicroMessenger/8.0.48.2580(0x28003036) WeChat/arm64 Weixin NetType/WIFI Language/zh_CN ABI/arm64 MiniProgramEnv/android"
         self.setup_logging()
         
@@ -117,16 +179,22 @@ class AutoTask:
                 new_id += c
         return new_id
 
-    def get_proxy(self):
+    def get_proxy(self, account=None):
         """
         获取代理
+        :param account: 账号标识，设置PROXY_STICKY时沿用该账号上次的代理
         :return: 代理
         """
         if not self.proxy_url:
             self.log("[获取代理] 没有找到环境变量PROXY_API_URL，不使用代理", level="warning")
             return None
+        if self.proxy_pool:
+            # 从代理池租用检查过的代理
+            proxy = self.proxy_pool.lease(account=account)
+            self.log(f"[获取代理] {proxy}")
+            return proxy
         url = self.proxy_url
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         proxy = response.text
         self.log(f"[获取代理] {proxy}")
         return proxy
@@ -399,6 +467,7 @@ class AutoTask:
             response_json = response.json()
             if response_json['success']:
                 self.log(f"[{self.nickname}] 小游戏签到: {response_json['msg']}")
+                return True
             else:
                 if "系统繁忙" in response_json['msg']:
                     self.log(f"[{self.nickname}] 小游戏签到: 今日已签到")
@@ -652,106 +721,166 @@ class AutoTask:
             self.log(f"[获取用户福利点] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
             return False
         
-    def run(self):
+    def task_done(self, step, name):
         """
-        运行任务
+        今天是否已完成该步骤，没有台账时总是执行
+        :param step: 步骤名
+        :param name: 日志中显示的名称
+        """
+        if self.task_ledger and self.task_ledger.is_done(self.user_id, step):
+            self.log(f"[{self.nickname}] {name}: 今日已完成，跳过")
+            return True
+        return False
+
+    def mark_task(self, step):
+        """
+        记录步骤今天已完成
+        :param step: 步骤名
+        """
+        if self.task_ledger:
+            self.task_ledger.mark_done(self.user_id, step)
+
+    def run_account(self, index, token):
         """
+        执行单个账号任务，yield步骤间的等待秒数
+        :param index: 账号序号
+        :param token: 账号token
+        """
+        self.log("")
+        self.log(f"------ 【账号{index}】开始执行任务 ------")
+        
+        session = self.transport.session() if self.transport else requests.Session()
+        proxy = None
         try:
-            self.log(f"【{self.script_name}】开始执行任务")
-            # 检查环境变量
-            for index, token in enumerate(self.check_env(), 1):
-                self.log("")
-                self.log(f"------ 【账号{index}】开始执行任务 ------")
-                
-                session = requests.Session()
-                headers = {
-                    "UserSystem": "H5",
-                    "User-Agent": self.user_agent,
-                    "accesstoken": token,
-                    "Content-Type": "application/json;charset=UTF-8"
-                }
-                session.headers.update(headers)
+            if self.host_limiter:
+                self.host_limiter.install(session)
+            headers = {
+                "UserSystem": "H5",
+                "User-Agent": self.user_agent,
+                "accesstoken": token,
+                "Content-Type": "application/json;charset=UTF-8"
+            }
+            session.headers.update(headers)
 
-                if MULTI_ACCOUNT_PROXY and self.proxy_url != "":
-                    proxy = self.get_proxy()
-                    if proxy:
+            if MULTI_ACCOUNT_PROXY and self.proxy_url != "":
+                proxy = self.get_proxy(token)
+                if proxy:
+                    session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                    # 检查代理，不可用重新获取，最多重新获取3次，代理池租用的已检查过
+                    retry = 0
+                    while not self.proxy_pool and retry < 3 and not self.check_proxy(proxy, session):
+                        retry += 1
+                        proxy = self.get_proxy()
                         session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
-                        # 检查代理，不可用重新获取
-                        while not self.check_proxy(proxy, session):
-                            proxy = self.get_proxy()
-                            session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                    if self.proxy_pool:
+                        # 只有目标站点的请求走代理，其他请求直连，并统计代理延迟和流量
+                        self.proxy_pool.apply(session, proxy, hosts=[self.host])
 
-                # # 执行微信授权
-                # code = self.wx_code_auth(wx_id)
-                # if code:
-                #     if self.device_login(session):
-                #         if self.wxlogin(session, code):
-                #             self.get_user_info(session)
+            # # 执行微信授权
+            # code = self.wx_code_auth(wx_id)
+            # if code:
+            #     if self.device_login(session):
+            #         if self.wxlogin(session, code):
+            #             self.get_user_info(session)
 
-                # 获取用户信息
-                if self.get_user_info(session):
-                    # 签到
-                    self.signin(session)
-                    time.sleep(random.randint(3, 6))
-                    # 获取抽奖信息
-                    if self.get_lottery_info(session, "463"):
-                        time.sleep(random.randint(3, 6))
-                        # # 抽奖
-                        # for i in range(self.lottery_count):
-                        #     self.lottery(session, self.activity_key, self.activity_type)
-                        #     time.sleep(random.randint(3, 6))
-                    # 获取用户福利点
-                    self.get_user_welfare(session)
-                    time.sleep(random.randint(3, 6))
-                    # 小游戏
-                    self.log(f"========== 小游戏 ==========")
-                    # 小游戏签到
-                    self.mini_game_signin(session)
-                    time.sleep(random.randint(3, 6))
-                    # 小游戏浏览
-                    self.mini_game_brose(session, "115c73bf71000")
-                    time.sleep(random.randint(3, 6))
-                    self.mini_game_brose(session, "1153198a86000")
-                    time.sleep(random.randint(3, 6))
-                    self.mini_game_brose(session, "20ad059a31000")
-                    time.sleep(random.randint(3, 6))
-                    # 获取小游戏飞行棋信息
-                    if self.get_lottery_info(session, "510"):
-                        time.sleep(random.randint(3, 6))
-                        # 小游戏飞行棋抽奖
-                        # for i in range(self.get_mini_game_lottery_info(session)):
-                        #     self.lottery(session, self.activity_key, self.activity_type)
-                        #     time.sleep(random.randint(3, 6))
-                    # 获取小游戏包子皮数量
-                    if self.get_lottery_info(session, "411"):
-                        time.sleep(random.randint(3, 6))
-                        if self.game_user_fragment_count > 0:
-                            profit_list = self.get_mini_game_profit_list(session)
-                            # 检测材料是否能做任意一种包子
-                            material_count = {profit['rightsType']: profit['rightsNum'] for profit in profit_list}
-                            for baozi_id, need_materials in BAOZI_INFO.items():
-                                if all(material_count.get(mat, 0) > 0 for mat in need_materials):
-                                    extension = {
-                                        mat: "1" for mat in need_materials
-                                    }
-                                    if self.do_mini_game_baozi(session, "f791d7686000", extension): 
-                                        time.sleep(random.randint(3, 6))
-                                        # 查询该包子的信息
-                                        if self.get_lottery_info(session, baozi_id):
-                                            time.sleep(random.randint(3, 6))
-                                            # # 抽奖
-                                            # for i in range(self.game_user_fragment_count):
-                                            #     self.lottery(session, self.activity_key, self.activity_type)
-                                            #     time.sleep(random.randint(3, 6))
-                        else:
-                            self.log(f"[{self.nickname}] 小游戏包子皮数量不足，不检测是否能做任意包子")
-                    # 查询小游戏包子数
-                    self.get_mini_game_baozi_count(session)
-                    self.log(f"========== 小游戏 ==========")
-                self.log(f"------ 【账号{index}】执行任务完成 ------")
+            # 获取用户信息
+            if self.get_user_info(session):
+                # 签到
+                if not self.task_done("signin", "签到"):
+                    if self.signin(session):
+                        self.mark_task("signin")
+                    yield random.randint(3, 6)
+                # 获取抽奖信息
+                if self.get_lottery_info(session, "463"):
+                    yield random.randint(3, 6)
+                    # # 抽奖
+                    # for i in range(self.lottery_count):
+                    #     self.lottery(session, self.activity_key, self.activity_type)
+                    #     yield random.randint(3, 6)
+                # 获取用户福利点
+                self.get_user_welfare(session)
+                yield random.randint(3, 6)
+                # 小游戏
+                self.log(f"========== 小游戏 ==========")
+                # 小游戏签到
+                if not self.task_done("mini_game_signin", "小游戏签到"):
+                    if self.mini_game_signin(session):
+                        self.mark_task("mini_game_signin")
+                    yield random.randint(3, 6)
+                # 小游戏浏览
+                for activity_key in ("115c73bf71000", "1153198a86000", "20ad059a31000"):
+                    if not self.task_done(f"browse_{activity_key}", "小游戏浏览"):
+                        if self.mini_game_brose(session, activity_key):
+                            self.mark_task(f"browse_{activity_key}")
+                        yield random.randint(3, 6)
+                # 获取小游戏飞行棋信息
+                if self.get_lottery_info(session, "510"):
+                    yield random.randint(3, 6)
+                    # 小游戏飞行棋抽奖
+                    # for i in range(self.get_mini_game_lottery_info(session)):
+                    #     self.lottery(session, self.activity_key, self.activity_type)
+                    #     yield random.randint(3, 6)
+                # 获取小游戏包子皮数量，做完包子后当天不再检查
+                if not self.task_done("baozi", "做包子") and self.get_lottery_info(session, "411"):
+                    yield random.randint(3, 6)
+                    if self.game_user_fragment_count > 0:
+                        profit_list = self.get_mini_game_profit_list(session)
+                        # 做了包子且没有失败才记为今日已完成
+                        baozi_made = baozi_failed = False
+                        # 检测材料是否能做任意一种包子
+                        material_count = {profit['rightsType']: profit['rightsNum'] for profit in profit_list or []}
+                        for baozi_id, need_materials in BAOZI_INFO.items():
+                            if all(material_count.get(mat, 0) > 0 for mat in need_materials):
+                                extension = {
+                                    mat: "1" for mat in need_materials
+                                }
+                                if not self.do_mini_game_baozi(session, "f791d7686000", extension):
+                                    baozi_failed = True
+                                else:
+                                    baozi_made = True
+                                    yield random.randint(3, 6)
+                                    # 查询该包子的信息
+                                    if self.get_lottery_info(session, baozi_id):
+                                        yield random.randint(3, 6)
+                                        # # 抽奖
+                                        # for i in range(self.game_user_fragment_count):
+                                        #     self.lottery(session, self.activity_key, self.activity_type)
+                                        #     yield random.randint(3, 6)
+                        if baozi_made and not baozi_failed:
+                            self.mark_task("baozi")
+                    else:
+                        self.log(f"[{self.nickname}] 小游戏包子皮数量不足，不检测是否能做任意包子")
+                # 查询小游戏包子数
+                self.get_mini_game_baozi_count(session)
+                self.log(f"========== 小游戏 ==========")
+            self.log(f"------ 【账号{index}】执行任务完成 ------")
+        finally:
+            # 释放账号的连接
+            session.close()
+            # 归还代理池租用的代理
+            if self.proxy_pool and proxy:
+                self.proxy_pool.release(proxy, account=token)
+
+    def run(self):
+        """
+        运行任务
+        """
+        try:
+            self.log(f"【{self.script_name}】开始执行任务")
+            # 检查环境变量
+            if TaskExecutor:
+                TaskExecutor(self.run_account, resume=True).run(self.check_env())
+            else:
+                for index, token in enumerate(self.check_env(), 1):
+                    for delay in self.run_account(index, token):
+                        time.sleep(delay)
         except Exception as e:
             self.log(f"【{self.script_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
         finally:
+            if self.proxy_pool:
+                self.proxy_pool.close()
+            if self.transport:
+                self.transport.close()
             if NOTIFY:
                 # 如果notify模块不存在，从远程下载至本地
                 if not os.path.exists("notify.py"):
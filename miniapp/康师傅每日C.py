@@ -12,6 +12,10 @@ cron: 10 8,9 * * *
 2025/6/30   V1.1    修复助力错账号问题
 2025/6/30   V1.2    修复查询信息错误
 2025/7/28   V1.3    修改头部注释，以便拉库
+2026/10/18  V1.4    多账号代理改为代理池后台批量获取、并发检查，检查代理最多重新获取3次
+2026/10/18  V1.5    代理池优先分配延迟低的代理，PROXY_STICKY为True时账号沿用上次的代理
+2026/10/18  V1.6    多账号代理只让目标站点的请求走代理，其他请求直连
+2026/10/18  V1.7    代理池租用的代理在账号结束时归还，出错也会归还
 """
 
 MULTI_ACCOUNT_SPLIT = ["\n", "@"] # 多账号分隔符列表
@@ -22,9 +26,17 @@ import random
 import time
 import requests
 import os
+import sys
 import logging
 import traceback
 
+# 导入代理池，没有则每个账号单独获取代理
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../utils')))
+try:
+    from proxyPool import ProxyPool # type: ignore
+except ImportError:
+    ProxyPool = None
+
 class AutoTask:
     def __init__(self, script_name):
         """
@@ -34,6 +46,8 @@ class AutoTask:
         self.script_name = script_name
         self.log_msgs = []  # 日志收集
         self.proxy_url = os.getenv("PROXY_API_URL") # 代理api，返回一条txt文本，内容为代理ip:端口
+        # 代理池，后台批量获取并检查代理
+        self.proxy_pool = ProxyPool(self.proxy_url, check=self.check_proxy, log=self.log) if ProxyPool and MULTI_ACCOUNT_PROXY and self.proxy_url else None
         self.host = ""
         self.unionid = ""
         self.nickname = ""
@@ -63,16 +77,22 @@ class AutoTask:
             logging.warning(msg)
         self.log_msgs.append(msg)
 
-    def get_proxy(self):
+    def get_proxy(self, account=None):
         """
         获取代理
+        :param account: 账号标识，设置PROXY_STICKY时沿用该账号上次的代理
         :return: 代理
         """
         if not self.proxy_url:
             self.log("[获取代理] 没有找到环境变量PROXY_API_URL，不使用代理", level="warning")
             return None
+        if self.proxy_pool:
+            # 从代理池租用检查过的代理
+            proxy = self.proxy_pool.lease(account=account)
+            self.log(f"[获取代理] {proxy}")
+            return proxy
         url = self.proxy_url
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         proxy = response.text
         self.log(f"[获取代理] {proxy}")
         return proxy
@@ -272,56 +292,69 @@ class AutoTask:
             unionid_list = []
             # 检查环境变量
             for index, unionid in enumerate(self.check_env(), 1):
-                self.log("")
-                self.log(f"------ 【账号{index}】开始执行任务 ------")
+                proxy = None
+                try:
+                    self.log("")
+                    self.log(f"------ 【账号{index}】开始执行任务 ------")
 
-                self.unionid = unionid
+                    self.unionid = unionid
 
-                if MULTI_ACCOUNT_PROXY:
-                    proxy = self.get_proxy()
-                    if proxy:
-                        session = requests.Session()
-                        session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
-                        # 检查代理，不可用重新获取
-                        while not self.check_proxy(proxy, session):
-                            proxy = self.get_proxy()
+                    if MULTI_ACCOUNT_PROXY:
+                        proxy = self.get_proxy(unionid)
+                        if proxy:
+                            session = requests.Session()
                             session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                            if self.proxy_pool:
+                                # 只有目标站点的请求走代理，其他请求直连，并统计代理延迟和流量
+                                self.proxy_pool.apply(session, proxy, hosts=[self.host])
+                            # 检查代理，不可用重新获取，最多重新获取3次，代理池租用的已检查过
+                            retry = 0
+                            while not self.proxy_pool and retry < 3 and not self.check_proxy(proxy, session):
+                                retry += 1
+                                proxy = self.get_proxy()
+                                session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                        else:
+                            session = requests.Session()
                     else:
                         session = requests.Session()
-                else:
-                    session = requests.Session()
-                session.headers["User-Agent"] = self.user_agent
-                session.headers["Content-Type"] = "application/x-www-form-urlencoded"
+                    session.headers["User-Agent"] = self.user_agent
+                    session.headers["Content-Type"] = "application/x-www-form-urlencoded"
                 
-                # 积分
-                self.daily_c_invite(session, self.unionid)
-                # 签到
-                self.daily_c_signin(session)
-                # 视频
-                self.daily_c_video(session)
-                # 获取邀请unionid列表
-                invite_unionid_list = self.daily_c_get_invite_unionid_list()
-                # 邀请
-                if invite_unionid_list:
-                    # 去除当前账号unionid
-                    invite_unionid_list = [uid.strip() for uid in invite_unionid_list if uid.strip() and uid.strip() != self.unionid]
-                    # 如果大于5个，随机取5个，否则直接全部
-                    if len(invite_unionid_list) > 5:
-                        invite_unionid_list = random.sample(invite_unionid_list, 5)
+                    # 积分
+                    self.daily_c_invite(session, self.unionid)
+                    # 签到
+                    self.daily_c_signin(session)
+                    # 视频
+                    self.daily_c_video(session)
+                    # 获取邀请unionid列表
+                    invite_unionid_list = self.daily_c_get_invite_unionid_list()
                     # 邀请
-                    for invite_unionid in invite_unionid_list:
-                        self.daily_c_invite(session, invite_unionid)
-                # 积分
-                self.daily_c_invite(session, self.unionid)
-                # 当前账号unionid写入邀请unionid列表
-                unionid_list.append(self.unionid)
+                    if invite_unionid_list:
+                        # 去除当前账号unionid
+                        invite_unionid_list = [uid.strip() for uid in invite_unionid_list if uid.strip() and uid.strip() != self.unionid]
+                        # 如果大于5个，随机取5个，否则直接全部
+                        if len(invite_unionid_list) > 5:
+                            invite_unionid_list = random.sample(invite_unionid_list, 5)
+                        # 邀请
+                        for invite_unionid in invite_unionid_list:
+                            self.daily_c_invite(session, invite_unionid)
+                    # 积分
+                    self.daily_c_invite(session, self.unionid)
+                    # 当前账号unionid写入邀请unionid列表
+                    unionid_list.append(self.unionid)
                 
-                self.log(f"------ 【账号{index}】执行任务完成 ------")
+                    self.log(f"------ 【账号{index}】执行任务完成 ------")
+                finally:
+                    # 归还代理池租用的代理
+                    if self.proxy_pool and proxy:
+                        self.proxy_pool.release(proxy, account=unionid)
             # 写入邀请unionid列表
             self.daily_c_write_invite_unionid_list(unionid_list)
         except Exception as e:
             self.log(f"【{self.script_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
         finally:
+            if self.proxy_pool:
+                self.proxy_pool.close()
             if NOTIFY:
                 # 如果notify模块不存在，从远程下载至本地
                 if not os.path.exists("notify.py"):
@@ -9,12 +9,19 @@ name: 老板服务微商城
 cron: 10 11,12 * * *
 ------------更新日志------------
 2025/7/23  V1.0    初始化脚本
+2026/10/18 V1.1    多账号代理改为代理池后台批量获取、并发检查，检查代理最多重新获取3次
+2026/10/18 V1.2    代理池优先分配延迟低的代理，PROXY_STICKY为True时账号沿用上次的代理
+2026/10/18 V1.3    多账号代理只让目标站点的请求走代理，其他请求直连
+2026/10/18 V1.4    TLSAdapter使用共用的SSL上下文，复用TLS会话
+2026/10/18 V1.5    代理池租用的代理在账号结束时归还，出错也会归还
+2026/10/18 V1.6    TLSAdapter没有挂载使用，撤回共用SSL上下文的改动
 """
 import json
 import random
 import time
 import requests
 import os
+import sys
 import hashlib
 import traceback
 import ssl
@@ -25,6 +32,14 @@ MULTI_ACCOUNT_SPLIT = ["\n", "@"] # 分隔符列表
 MULTI_ACCOUNT_PROXY = False # 是否使用多账号代理，默认不使用，True则使用多账号代理
 NOTIFY = os.getenv("LY_NOTIFY") or False # 是否推送日志，默认不推送，True则推送
 
+# 导入代理池，没有则每个账号单独获取代理
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../utils')))
+try:
+    from proxyPool import ProxyPool # type: ignore
+except ImportError:
+    ProxyPool = None
+
+
 class TLSAdapter(requests.adapters.HTTPAdapter):
     """
     自定义TLS
@@ -46,6 +61,8 @@ class AutoTask:
         """
         self.script_name = script_name
         self.proxy_url = os.getenv("PROXY_API_URL") # 代理api，返回一条txt文本，内容为代理ip:端口
+        # 代理池，后台批量获取并检查代理
+        self.proxy_pool = ProxyPool(self.proxy_url, check=self.check_proxy, log=self.log) if ProxyPool and MULTI_ACCOUNT_PROXY and self.proxy_url else None
         self.wx_appid = "wxc8c90950cf4546f6" # 微信小程序id
         self.host = "vip.foxech.com"
         self.nickname = ""
@@ -95,16 +112,22 @@ class AutoTask:
         """
         return phone[:3] + "****" + phone[-4:]
 
-    def get_proxy(self):
+    def get_proxy(self, account=None):
         """
         获取代理
+        :param account: 账号标识，设置PROXY_STICKY时沿用该账号上次的代理
         :return: 代理
         """
         if not self.proxy_url:
             self.log("[获取代理] 没有找到环境变量PROXY_API_URL，不使用代理", level="warning")
             return None
+        if self.proxy_pool:
+            # 从代理池租用检查过的代理
+            proxy = self.proxy_pool.lease(account=account)
+            self.log(f"[获取代理] {proxy}")
+            return proxy
         url = self.proxy_url
-        response = requests.get(url)
+        response = requests.get(url, timeout=10)
         proxy = response.text
         self.log(f"[获取代理] {proxy}")
         return proxy
@@ -531,68 +554,79 @@ class AutoTask:
             # local_account_info = self.load_account_info()
             # self.log(f"本地共{len(local_account_info)}个账号")
             for index, openid in enumerate(self.check_env(), 1):
-                # 清理账号信息
-                self.nickname = ""
-                self.openid = openid
-                self.log("")
-                self.log(f"------ 【账号{index}】开始执行任务 ------")
-                session = requests.Session()
-                headers = {
-                    "User-Agent": self.user_agent,
-                    "Host": self.host,
-                    "Content-Type": "application/json"
-                }
-                session.headers.update(headers)
+                proxy = None
+                try:
+                    # 清理账号信息
+                    self.nickname = ""
+                    self.openid = openid
+                    self.log("")
+                    self.log(f"------ 【账号{index}】开始执行任务 ------")
+                    session = requests.Session()
+                    headers = {
+                        "User-Agent": self.user_agent,
+                        "Host": self.host,
+                        "Content-Type": "application/json"
+                    }
+                    session.headers.update(headers)
 
-                if MULTI_ACCOUNT_PROXY:
-                    proxy = self.get_proxy()
-                    if proxy:
-                        session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
-                        # # 检查代理，不可用重新获取
-                        # while not self.check_proxy(proxy, session):
-                        #     proxy = self.get_proxy()
-                        #     session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                    if MULTI_ACCOUNT_PROXY:
+                        proxy = self.get_proxy(openid)
+                        if proxy:
+                            session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+                            if self.proxy_pool:
+                                # 只有目标站点的请求走代理，其他请求直连，并统计代理延迟和流量
+                                self.proxy_pool.apply(session, proxy, hosts=[self.host])
+                            # # 检查代理，不可用重新获取
+                            # while not self.check_proxy(proxy, session):
+                            #     proxy = self.get_proxy()
+                            #     session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
 
-                # 获取用户信息
-                if not self.get_user_info(session):
-                    continue
-                # 签到
-                self.sign_in(session)
-                time.sleep(random.randint(3, 5))
-                # 获取任务列表
-                task_list = self.get_task_list(session)
-                for task in task_list:
-                    if "秒杀" in task['title'] and task['is_over'] == 0:
-                        # 浏览秒杀活动
-                        ms_list = self.get_ms_list(session)
-                        for ms in ms_list:
-                            if ms['is_start'] == 1:
-                                ms_id = ms['id']
-                                self.get_ms_goods_list(session, ms_id)
+                    # 获取用户信息
+                    if not self.get_user_info(session):
+                        continue
+                    # 签到
+                    self.sign_in(session)
+                    time.sleep(random.randint(3, 5))
+                    # 获取任务列表
+                    task_list = self.get_task_list(session)
+                    for task in task_list:
+                        if "秒杀" in task['title'] and task['is_over'] == 0:
+                            # 浏览秒杀活动
+                            ms_list = self.get_ms_list(session)
+                            for ms in ms_list:
+                                if ms['is_start'] == 1:
+                                    ms_id = ms['id']
+                                    self.get_ms_goods_list(session, ms_id)
+                                    time.sleep(random.randint(3, 5))
+                        elif "好文" in task['title'] and task['is_over'] == 0:
+                            # 浏览文章
+                            news_list = self.get_news_list(session)
+                            news_ids = [item['id'] for item in news_list]
+                            for news_id in random.sample(news_ids, 3):
+                                self.get_news_detail(session, news_id)
+                                time.sleep(random.randint(3, 5))
+                        elif "浏览3个商品" in task['title'] and task['is_over'] == 0:
+                            # 浏览商品
+                            goods_list = self.get_goods_list(session)
+                            goods_ids = [item['id'] for item in goods_list]
+                            for goods_id in random.sample(goods_ids, 3):
+                                self.get_goods_detail(session, goods_id)
                                 time.sleep(random.randint(3, 5))
-                    elif "好文" in task['title'] and task['is_over'] == 0:
-                        # 浏览文章
-                        news_list = self.get_news_list(session)
-                        news_ids = [item['id'] for item in news_list]
-                        for news_id in random.sample(news_ids, 3):
-                            self.get_news_detail(session, news_id)
-                            time.sleep(random.randint(3, 5))
-                    elif "浏览3个商品" in task['title'] and task['is_over'] == 0:
-                        # 浏览商品
-                        goods_list = self.get_goods_list(session)
-                        goods_ids = [item['id'] for item in goods_list]
-                        for goods_id in random.sample(goods_ids, 3):
-                            self.get_goods_detail(session, goods_id)
-                            time.sleep(random.randint(3, 5))
-                # 重新获取一次用户信息
-                self.get_user_info(session)
-                self.log(f"[{self.nickname}] 当前积分: {self.score}")
-                self.log(f"------ 【账号{index}】执行任务完成 ------")
-                # 清理session
-                session.close()
+                    # 重新获取一次用户信息
+                    self.get_user_info(session)
+                    self.log(f"[{self.nickname}] 当前积分: {self.score}")
+                    self.log(f"------ 【账号{index}】执行任务完成 ------")
+                    # 清理session
+                    session.close()
+                finally:
+                    # 归还代理池租用的代理
+                    if self.proxy_pool and proxy:
+                        self.proxy_pool.release(proxy, account=openid)
         except Exception as e:
             self.log(f"【{self.script_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
         finally:
+            if self.proxy_pool:
+                self.proxy_pool.close()
             if NOTIFY:
                 # 如果notify模块不存在，从远程下载至本地
                 if not os.path.exists("notify.py"):
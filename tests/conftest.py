@@ -0,0 +1,32 @@
+"""
+测试公共配置: 脚本以 sys.path 中的 utils 目录导入公共模块，测试保持一致
+"""
+
+import os
+import sys
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "utils"))
+
+
+@pytest.fixture
+def mock_server():
+    """
+    在随机端口启动微信授权协议模拟服务
+    :return: (服务地址, 模拟协议状态)
+    """
+    from wechatCodeMockServer import MockHandler, MockProtocol
+    mock = MockProtocol(wx_ids=["wxid_1", "wxid_2", "wxid_3"], token="", latency=0, error_rate=0)
+    MockHandler.mock = mock
+    server = ThreadingHTTPServer(("127.0.0.1", 0), MockHandler)
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}", mock
+    finally:
+        server.shutdown()
+        server.server_close()
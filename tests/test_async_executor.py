@@ -0,0 +1,121 @@
+"""
+异步执行引擎的行为测试: AsyncSession的请求写法、不支持的参数、共用连接池、旧版httpx的代理参数
+"""
+
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+httpx = pytest.importorskip("httpx")
+
+import asyncExecutor
+from asyncExecutor import AsyncTransport, AsyncTaskExecutor
+
+
+@pytest.fixture
+def echo_server():
+    """
+    返回请求方法、路径、请求体和cookie的服务
+    """
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def reply(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            body = self.rfile.read(length).decode("utf-8")
+            text = f"{self.command} {self.path} {body} {self.headers.get('Cookie')}".encode("utf-8")
+            self.send_response(200)
+            self.send_header("Set-Cookie", "sid=1; Path=/")
+            self.send_header("Content-Length", str(len(text)))
+            self.end_headers()
+            self.wfile.write(text)
+
+        do_GET = do_POST = reply
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_session_requests_and_cookies(echo_server):
+    transport = AsyncTransport(http2=False)
+
+    async def main():
+        async with transport.session() as session:
+            first = await session.get(f"{echo_server}/info", params={"a": 1}, timeout=5)
+            second = await session.post(f"{echo_server}/sign", data="x=1", timeout=(5, 5))
+        async with transport.session() as other:
+            third = await other.get(f"{echo_server}/info", timeout=5)
+        await transport.aclose()
+        return first.text, second.text, third.text
+
+    first, second, third = asyncio.run(main())
+    assert first == "GET /info?a=1  None"
+    # cookie每个账号一份
+    assert second == "POST /sign x=1 sid=1"
+    assert third == "GET /info  None"
+
+
+def test_unsupported_kwargs_raise_type_error():
+    transport = AsyncTransport(http2=False)
+
+    async def main():
+        async with transport.session() as session:
+            with pytest.raises(TypeError, match="proxies"):
+                await session.get("http://127.0.0.1:1/", proxies={"https": "http://1.1.1.1:80"})
+            with pytest.raises(TypeError, match="verify"):
+                await session.post("http://127.0.0.1:1/", verify=False)
+
+    asyncio.run(main())
+
+
+def test_sessions_share_transport_per_proxy():
+    transport = AsyncTransport(http2=False)
+    assert transport.get_transport(None) is transport.get_transport(None)
+    assert transport.get_transport("http://127.0.0.1:8080") is not transport.get_transport(None)
+    asyncio.run(transport.aclose())
+    assert transport.transports == {}
+
+
+def test_proxy_argument_for_old_httpx(monkeypatch):
+    """
+    httpx 0.26以前AsyncHTTPTransport的proxy参数只接受httpx.Proxy
+    """
+    created = []
+
+    class OldTransport:
+        def __init__(self, proxy=None, **kwargs):
+            if isinstance(proxy, str):
+                raise TypeError("proxy must be httpx.Proxy")
+            created.append(proxy)
+
+    monkeypatch.setattr(asyncExecutor.httpx, "AsyncHTTPTransport", OldTransport)
+    transport = AsyncTransport(http2=False)
+    transport.get_transport("http://127.0.0.1:8080")
+    transport.get_transport(None)
+    assert isinstance(created[0], httpx.Proxy)
+    assert str(created[0].url) == "http://127.0.0.1:8080"
+    assert created[1] is None
+
+
+def test_executor_runs_async_task_functions(echo_server):
+    transport = AsyncTransport(http2=False)
+    results = {}
+
+    async def run_account(index, account):
+        async with transport.session() as session:
+            response = await session.get(f"{echo_server}/{account}", timeout=5)
+            results[account] = response.text
+
+    AsyncTaskExecutor(run_account, processes=1).run(["a", "b", "c"])
+    assert results == {name: f"GET /{name}  None" for name in "abc"}
@@ -0,0 +1,47 @@
+"""
+凭据存储的行为测试: 有则更新、无则新增
+"""
+
+import threading
+
+from credentialStore import CredentialStore
+
+
+def test_credential_save_replaces_existing(tmp_path):
+    store = CredentialStore("test", path=str(tmp_path / "credentials.db"))
+    store.save("wx_1", {"openid": "old"})
+    store.save("wx_1", {"openid": "new", "issued_at": 100})
+    store.save("wx_2", {"openid": "other"})
+    assert store.count() == 2
+    assert store.get("wx_1") == {"openid": "new", "issued_at": 100, "wx_id": "wx_1"}
+    store.remove("wx_2")
+    assert store.get("wx_2") is None
+    assert list(store.all()) == ["wx_1"]
+
+
+def test_credential_save_many_upserts(tmp_path):
+    store = CredentialStore("test", path=str(tmp_path / "credentials.db"))
+    store.save("wx_1", {"openid": "old"})
+    store.save_many([{"wx_id": "wx_1", "openid": "new"}, {"wx_id": "wx_2", "openid": "b"}])
+    assert store.count() == 2
+    assert store.get("wx_1")['openid'] == "new"
+    assert "issued_at" in store.get("wx_2")
+
+
+def test_credentials_are_per_script(tmp_path):
+    path = str(tmp_path / "credentials.db")
+    CredentialStore("a", path=path).save("wx_1", {"openid": "a"})
+    other = CredentialStore("b", path=path)
+    assert other.get("wx_1") is None
+    other.save("wx_1", {"openid": "b"})
+    assert CredentialStore("a", path=path).get("wx_1")['openid'] == "a"
+
+
+def test_credential_store_usable_from_threads(tmp_path):
+    store = CredentialStore("test", path=str(tmp_path / "credentials.db"))
+    threads = [threading.Thread(target=store.save, args=(f"wx_{i}", {"openid": i})) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert store.count() == 8
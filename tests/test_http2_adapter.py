@@ -0,0 +1,78 @@
+"""
+HTTP/2连接适配器的行为测试: h2协议错误后改用HTTP/1.1，只有幂等请求重发
+"""
+
+import pytest
+import requests
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("h2")
+
+from http2Adapter import Http2Adapter
+
+
+class BrokenH2Adapter(Http2Adapter):
+    """
+    h2传输总是协议错误，HTTP/1.1传输正常响应，记录每次发送的请求
+    """
+    def __init__(self):
+        super().__init__()
+        self.sent = [] # (方法, 是否h2, 请求体)
+
+    def get_transport(self, proxy, http2, verify):
+        def handler(request):
+            self.sent.append((request.method, http2, request.content))
+            if http2:
+                raise httpx.RemoteProtocolError("connection reset", request=request)
+            return httpx.Response(200, text="ok", extensions={"http_version": b"HTTP/1.1"})
+        return httpx.MockTransport(handler)
+
+
+@pytest.fixture
+def session():
+    adapter = BrokenH2Adapter()
+    session = requests.Session()
+    session.mount("https://api.test", adapter)
+    try:
+        yield session, adapter
+    finally:
+        session.close()
+
+
+def test_idempotent_request_is_resent_over_http1(session):
+    session, adapter = session
+    response = session.get("https://api.test/info", timeout=5)
+    assert response.text == "ok"
+    assert adapter.sent == [("GET", True, b""), ("GET", False, b"")]
+    assert "api.test" in adapter.http1_hosts
+    assert adapter.versions == {"HTTP/1.1": 1}
+    # 之后直接使用HTTP/1.1
+    session.get("https://api.test/info", timeout=5)
+    assert adapter.sent[-1] == ("GET", False, b"")
+    assert len(adapter.sent) == 3
+
+
+def test_non_idempotent_request_is_not_resent(session):
+    session, adapter = session
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.post("https://api.test/sign", json={"day": 1}, timeout=5)
+    # 签到等请求可能已被服务端处理，不重发
+    assert adapter.sent == [("POST", True, b'{"day": 1}')]
+    assert "api.test" in adapter.http1_hosts
+    # 下一次请求直接走HTTP/1.1
+    assert session.post("https://api.test/sign", json={"day": 1}, timeout=5).text == "ok"
+    assert adapter.sent[-1] == ("POST", False, b'{"day": 1}')
+
+
+def test_protocol_error_over_http1_is_connection_error(session):
+    session, adapter = session
+    adapter.http1_hosts.add("api.test")
+
+    def get_transport(proxy, http2, verify):
+        def handler(request):
+            raise httpx.RemoteProtocolError("server disconnected", request=request)
+        return httpx.MockTransport(handler)
+
+    adapter.get_transport = get_transport
+    with pytest.raises(requests.exceptions.ConnectionError):
+        session.get("https://api.test/info", timeout=5)
@@ -0,0 +1,133 @@
+"""
+代理池的行为测试: 批量获取、检查、按分数租用、归还、连续失败后恢复
+"""
+
+import time
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+
+import proxyPool
+from proxyPool import ProxyPool, ProxyLease
+from taskExecutor import TaskExecutor, AccountLogs
+
+
+@pytest.fixture
+def proxy_api():
+    """
+    在随机端口启动代理api，返回内容和状态码可在测试中修改
+    :return: 状态 {"url": 地址, "status": 状态码, "body": 内容, "paths": 请求路径}
+    """
+    state = {"status": 200, "body": "", "paths": []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            state["paths"].append(self.path)
+            body = state["body"].encode("utf-8")
+            self.send_response(state["status"])
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    state["url"] = f"http://127.0.0.1:{server.server_address[1]}/get"
+    try:
+        yield state
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def _pool(url, bad=(), **kwargs):
+    logs = []
+    pool = ProxyPool(url, check=lambda proxy, session: proxy not in bad, batch=3, ttl=180,
+                     log=lambda msg, level="info": logs.append(msg), sticky=False, **kwargs)
+    return pool, logs
+
+
+def test_batch_url_sets_count_param():
+    pool, _ = _pool("http://api.test/get?num=1&type=txt")
+    assert pool.batch_url() == "http://api.test/get?num=3&type=txt"
+    pool, _ = _pool("http://api.test/get?type=txt")
+    assert pool.batch_url() == "http://api.test/get?type=txt"
+
+
+def test_refill_keeps_checked_proxies_and_skips_known(proxy_api):
+    proxy_api["body"] = "1.1.1.1:80\n2.2.2.2:80\n3.3.3.3:80\n1.1.1.1:80"
+    pool, logs = _pool(f"{proxy_api['url']}?num=1", bad={"2.2.2.2:80"})
+    assert pool.refill() == 2
+    assert sorted(lease.proxy for lease in pool.idle) == ["1.1.1.1:80", "3.3.3.3:80"]
+    assert all(lease.latency is not None for lease in pool.idle)
+    # 一次请求提取一批
+    assert proxy_api["paths"] == ["/get?num=3"]
+    # 已在池中的代理不重复加入
+    assert pool.refill() == 0
+    assert len(pool.idle) == 2
+
+
+def test_ewma_score_prefers_fast_reliable_proxies():
+    lease = ProxyLease("1.1.1.1:80", 0, 180)
+    assert lease.score() == float("inf")
+    lease.record(True, 1.0)
+    lease.record(True, 0.0)
+    assert lease.latency == pytest.approx(0.7)
+    lease.record(False)
+    assert lease.error_rate == pytest.approx(0.3)
+    assert lease.score() == pytest.approx(0.7 * (1 + 4 * 0.3))
+    lease.record(False)
+    lease.record(False)
+    assert lease.dead
+
+
+def test_lease_picks_lowest_score_and_release_returns_it(proxy_api):
+    pool, _ = _pool(proxy_api["url"])
+    for proxy, latency in (("1.1.1.1:80", 0.5), ("2.2.2.2:80", 0.1), ("3.3.3.3:80", 0.3)):
+        lease = ProxyLease(proxy, time.time(), 180)
+        lease.record(True, latency)
+        pool.idle.append(lease)
+    try:
+        assert pool.lease(timeout=1) == "2.2.2.2:80"
+        assert pool.lease(timeout=1) == "3.3.3.3:80"
+        pool.release("2.2.2.2:80")
+        assert pool.lease(timeout=1) == "2.2.2.2:80"
+        # 连续失败的代理归还后剔除
+        for _ in range(proxyPool.PROXY_MAX_FAILURES):
+            pool.record("3.3.3.3:80", False)
+        pool.release("3.3.3.3:80")
+        assert "3.3.3.3:80" not in [lease.proxy for lease in pool.idle]
+    finally:
+        pool.close()
+
+
+def test_lease_recovers_after_failed_rounds(proxy_api, monkeypatch):
+    """
+    代理api连续失败后放弃等待，api恢复后新的账号租用时重新补充，不会一直直连
+    """
+    monkeypatch.setattr(proxyPool, "PROXY_MAX_FAILED_ROUNDS", 1)
+    proxy_api["status"] = 500
+    pool, _ = _pool(proxy_api["url"])
+    logs = AccountLogs()
+    pool.log = lambda msg, level="info": logs.append(msg)
+    results = {}
+
+    def worker(index, account):
+        results[account] = pool.lease(timeout=10)
+
+    try:
+        TaskExecutor(worker, processes=1).run(["a"])
+        assert results["a"] is None
+        proxy_api["status"] = 200
+        proxy_api["body"] = "4.4.4.4:80"
+        TaskExecutor(worker, processes=1).run(["b"])
+        assert results["b"] == "4.4.4.4:80"
+    finally:
+        pool.close()
+    # 只有租不到代理的原因记到账号的日志，后台获取代理的日志不进入推送内容
+    assert len(logs) == 1
+    assert "没有可用代理" in logs[0] and "本账号不使用代理" in logs[0]
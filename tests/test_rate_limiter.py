@@ -0,0 +1,104 @@
+"""
+按域名限流的行为测试: 令牌桶速率、多进程平分限额、session安装
+"""
+
+import time
+import asyncio
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+from rateLimiter import RateLimiter, HostRateLimiter, parse_host_rates
+
+
+def test_token_bucket_allows_burst_then_paces():
+    limiter = RateLimiter(10, burst=2)
+    assert limiter.acquire() == 0
+    assert limiter.acquire() == 0
+    start = time.monotonic()
+    waited = limiter.acquire()
+    assert waited > 0
+    assert time.monotonic() - start >= 0.09
+
+
+def test_token_bucket_rate_over_many_requests():
+    limiter = RateLimiter(50)
+    for _ in range(50):
+        limiter.acquire()
+    start = time.monotonic()
+    for _ in range(10):
+        limiter.acquire()
+    # 桶已取空，10个令牌按每秒50个补充
+    assert time.monotonic() - start == pytest.approx(0.2, abs=0.08)
+
+
+def test_acquire_async_waits_without_blocking_loop():
+    limiter = RateLimiter(10, burst=1)
+    ticks = []
+
+    async def ticker():
+        for _ in range(5):
+            ticks.append(time.monotonic())
+            await asyncio.sleep(0.01)
+
+    async def main():
+        await limiter.acquire_async()
+        return await asyncio.gather(limiter.acquire_async(), ticker())
+
+    waited, _ = asyncio.run(main())
+    assert waited > 0
+    assert len(ticks) == 5
+
+
+def test_parse_host_rates():
+    assert parse_host_rates("API.example.com=5, *=10\nbad, x=y") == {"api.example.com": 5.0, "*": 10.0}
+
+
+def test_host_limits_and_default(monkeypatch):
+    monkeypatch.delenv("LY_SHARD_COUNT", raising=False)
+    limiter = HostRateLimiter({"a.test": 5, "*": 20})
+    assert limiter.get_limiter("A.test").rate == 5
+    assert limiter.get_limiter("other.test").rate == 20
+    assert limiter.get_limiter("a.test") is limiter.get_limiter("a.test")
+    assert HostRateLimiter({"a.test": 5}).get_limiter("other.test") is None
+
+
+def test_shards_divide_host_rate(monkeypatch):
+    """
+    多进程执行时子进程按进程数平分限额，总速率不变
+    """
+    monkeypatch.delenv("LY_SHARD_COUNT", raising=False)
+    limiter = HostRateLimiter({"a.test": 20})
+    assert limiter.get_limiter("a.test").rate == 20
+    # 模拟fork出的子进程：执行器设置进程数，进程号变化
+    monkeypatch.setenv("LY_SHARD_COUNT", "4")
+    limiter.pid = -1
+    assert limiter.get_limiter("a.test").rate == 5
+
+
+def test_install_paces_session_requests():
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        limiter = HostRateLimiter({"127.0.0.1": 10})
+        session = limiter.install(requests.Session())
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        for _ in range(13):
+            assert session.get(url, timeout=5).status_code == 204
+        # 10个令牌用完后再取3个
+        assert limiter.waited == pytest.approx(0.3, abs=0.1)
+        session.close()
+    finally:
+        server.shutdown()
+        server.server_close()
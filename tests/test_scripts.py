@@ -0,0 +1,46 @@
+"""
+脚本冒烟测试: 使用共用连接池的脚本能完成初始化，兼容旧站点的适配器只挂载到接口域名
+"""
+
+import os
+import importlib.util
+
+import pytest
+import requests
+
+from tlsContext import LegacyTLSAdapter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPTS = [
+    ("miniapp/中免日上.py", "中免日上"),
+    ("miniapp/code/code版_统一梦时代.py", "统一梦时代"),
+    ("miniapp/code/code版_老板服务微商城.py", "老板服务微商城"),
+]
+
+
+def load_script(path):
+    """
+    按文件路径导入脚本，脚本名不是合法的模块名
+    """
+    spec = importlib.util.spec_from_file_location(f"script_{abs(hash(path))}", os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+@pytest.mark.parametrize("path, name", SCRIPTS)
+def test_auto_task_initializes(path, name, tmp_path, monkeypatch):
+    # 凭据库、台账等默认写在当前目录
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.delenv("PROXY_API_URL", raising=False)
+    auto_task = load_script(path).AutoTask(name)
+    assert auto_task.transport is not None
+    session = auto_task.transport.session()
+    try:
+        assert isinstance(session.get_adapter(f"https://{auto_task.host}/api"), LegacyTLSAdapter)
+        other = session.get_adapter("https://example.com/")
+        assert type(other) is requests.adapters.HTTPAdapter
+    finally:
+        session.close()
+        auto_task.transport.close()
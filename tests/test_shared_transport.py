@@ -0,0 +1,98 @@
+"""
+共用连接池的行为测试: 按域名挂载适配器、账号之间复用连接、释放账号的代理连接
+"""
+
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+import pytest
+import requests
+
+from sharedTransport import SharedTransport
+
+
+class MarkerAdapter(requests.adapters.HTTPAdapter):
+    """
+    代替兼容旧站点的适配器，只用于区分挂载位置
+    """
+
+
+@pytest.fixture
+def http_server():
+    """
+    记录每个请求所在连接的服务
+    :return: (地址, 客户端端口列表)
+    """
+    ports = []
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            ports.append(self.client_address[1])
+            self.send_response(200)
+            self.send_header("Content-Length", "2")
+            self.end_headers()
+            self.wfile.write(b"ok")
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}/", ports
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def test_adapter_mounted_only_on_listed_hosts():
+    transport = SharedTransport(MarkerAdapter, adapter_hosts=["api.test"])
+    session = transport.session()
+    assert session.get_adapter("https://api.test/login") is transport.adapter
+    assert isinstance(transport.adapter, MarkerAdapter)
+    assert session.get_adapter("https://other.test/") is transport.default_adapter
+    assert session.get_adapter("http://api.test/") is transport.default_adapter
+    assert type(transport.default_adapter) is requests.adapters.HTTPAdapter
+
+
+def test_adapter_without_hosts_is_used_everywhere():
+    transport = SharedTransport(MarkerAdapter)
+    session = transport.session()
+    assert isinstance(session.get_adapter("https://other.test/"), MarkerAdapter)
+    assert transport.adapter is transport.default_adapter
+
+
+def test_accounts_reuse_connections_but_not_cookies(http_server):
+    url, ports = http_server
+    transport = SharedTransport()
+    first = transport.session()
+    first.cookies.set("token", "a")
+    assert first.get(url, timeout=5).text == "ok"
+    first.close()
+    second = transport.session()
+    assert "token" not in second.cookies
+    assert second.get(url, timeout=5).text == "ok"
+    second.close()
+    # 第二个账号沿用第一个账号建立的连接
+    assert ports[0] == ports[1]
+    transport.close()
+
+
+def test_release_keeps_proxies_other_accounts_use():
+    transport = SharedTransport()
+    first, second, third = transport.session(), transport.session(), transport.session()
+    first.proxies.update({"https": "http://10.0.0.1:8080"})
+    second.proxies.update({"https": "http://10.0.0.1:8080"})
+    third.proxies.update({"https": "http://10.0.0.2:8080"})
+    for proxy in ("http://10.0.0.1:8080", "http://10.0.0.2:8080"):
+        transport.default_adapter.proxy_manager_for(proxy)
+    first.close()
+    # 第二个账号还在用同一个代理
+    assert "http://10.0.0.1:8080" in transport.default_adapter.proxy_manager
+    third.close()
+    assert "http://10.0.0.2:8080" not in transport.default_adapter.proxy_manager
+    second.close()
+    assert not transport.default_adapter.proxy_manager
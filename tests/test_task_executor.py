@@ -0,0 +1,138 @@
+"""
+多账号并发执行器的行为测试: 日志按账号顺序合并、生成器任务的间隔、断点续跑
+"""
+
+import time
+
+import pytest
+
+from taskExecutor import TaskExecutor, AccountContext, AccountLogs, RunJournal, current_account
+
+
+def _context(index, logs, *msgs):
+    ctx = AccountContext(index, {"id": index})
+    ctx.pending_logs[id(logs)] = (logs, list(msgs))
+    return ctx
+
+
+def test_flush_logs_waits_for_earlier_accounts():
+    """
+    后面的账号先完成时日志暂存，前面的账号完成后按账号顺序整段追加
+    """
+    logs = AccountLogs()
+    executor = TaskExecutor(lambda index, account: None, concurrency=3, processes=1)
+    executor._flush_logs(_context(3, logs, "3-a", "3-b"))
+    executor._flush_logs(_context(2, logs, "2-a"))
+    assert logs == []
+    executor._flush_logs(_context(1, logs, "1-a", "1-b"))
+    assert logs == ["1-a", "1-b", "2-a", "3-a", "3-b"]
+
+
+def test_run_keeps_log_order_when_accounts_finish_out_of_order():
+    logs = AccountLogs()
+
+    def worker(index, account):
+        logs.append(f"{index}-start")
+        # 序号越小等待越久，完成顺序与账号顺序相反
+        yield 0.05 * (4 - index)
+        logs.append(f"{index}-end")
+
+    TaskExecutor(worker, concurrency=3, processes=1).run(["a", "b", "c"])
+    assert logs == ["1-start", "1-end", "2-start", "2-end", "3-start", "3-end"]
+
+
+def test_step_paces_generator_and_runs_others_meanwhile():
+    """
+    同一账号两步之间的间隔不小于yield的秒数，等待期间单线程去执行其他账号
+    """
+    delay = 0.2
+    steps = []
+
+    def worker(index, account):
+        steps.append((index, time.monotonic()))
+        yield delay
+        steps.append((index, time.monotonic()))
+        yield delay
+        steps.append((index, time.monotonic()))
+        return index * 10
+
+    start = time.monotonic()
+    contexts = TaskExecutor(worker, concurrency=1, max_active=2, processes=1).run(["a", "b"])
+    elapsed = time.monotonic() - start
+
+    assert [ctx.result for ctx in contexts] == [10, 20]
+    assert [ctx.step_count for ctx in contexts] == [3, 3]
+    for index in (1, 2):
+        times = [t for i, t in steps if i == index]
+        assert all(later - earlier >= delay for earlier, later in zip(times, times[1:]))
+    # 账号2的第一步在账号1的间隔内执行，总耗时接近单个账号而不是两个账号之和
+    assert [i for i, _ in steps[:2]] == [1, 2]
+    assert elapsed < delay * 4 * 0.9
+
+
+def test_step_records_error_and_clears_current_account():
+    executor = TaskExecutor(lambda index, account: 1 / 0, processes=1)
+    ctx = AccountContext(1, "a")
+    assert executor._step(ctx) == (True, 0)
+    assert isinstance(ctx.error, ZeroDivisionError)
+    assert current_account.get() is None
+
+
+def test_run_journal_skips_finished_accounts(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal("test", window=3600, path=path)
+    assert journal.open() == 0
+    journal.finish(AccountContext(1, {"token": "a"}))
+    # 运行中断，保留日志
+    journal.close(False)
+
+    journal = RunJournal("test", window=3600, path=path)
+    assert journal.open() == 1
+    assert journal.is_finished({"token": "a"})
+    assert not journal.is_finished({"token": "b"})
+    journal.close(True)
+    assert not (tmp_path / "journal.jsonl").exists()
+
+
+def test_run_journal_ignores_expired_log(tmp_path):
+    path = str(tmp_path / "journal.jsonl")
+    journal = RunJournal("test", window=3600, path=path)
+    journal.open()
+    journal.finish(AccountContext(1, "a"))
+    journal.close(False)
+
+    journal = RunJournal("test", window=0, path=path)
+    assert journal.open() == 0
+    assert not journal.is_finished("a")
+    journal.close(True)
+
+
+def test_resume_after_interrupted_run(tmp_path, monkeypatch):
+    """
+    运行中断后重新运行，只执行上次未完成的账号，跳过的账号仍占位
+    """
+    monkeypatch.chdir(tmp_path)
+    calls = []
+
+    def interrupted(index, account):
+        calls.append(account)
+        if account == "b":
+            raise KeyboardInterrupt
+        return account
+
+    with pytest.raises(KeyboardInterrupt):
+        TaskExecutor(interrupted, resume=True, processes=1).run(["a", "b", "c"])
+    assert calls == ["a", "b"]
+
+    calls.clear()
+
+    def worker(index, account):
+        calls.append(account)
+        return account
+
+    worker.__name__ = interrupted.__name__
+    contexts = TaskExecutor(worker, resume=True, processes=1).run(["a", "b", "c"])
+    assert calls == ["b", "c"]
+    assert [ctx.skipped for ctx in contexts] == [True, False, False]
+    # 全部完成后删除日志
+    assert not list(tmp_path.glob("ly_journal_*.jsonl"))
@@ -0,0 +1,23 @@
+"""
+任务台账的行为测试: 次数累加、忽略台账
+"""
+
+from taskLedger import TaskLedger
+
+
+def test_ledger_mark_done_accumulates(tmp_path):
+    ledger = TaskLedger("test", path=str(tmp_path / "ledger.db"), force=False)
+    assert not ledger.is_done("wx_1", "lottery")
+    ledger.mark_done("wx_1", "lottery")
+    ledger.mark_done("wx_1", "lottery", count=2)
+    ledger.mark_done("wx_1", "signin")
+    assert ledger.count("wx_1", "lottery") == 3
+    assert ledger.all_done("wx_1", ["lottery", "signin"])
+    assert not ledger.is_done("wx_2", "lottery")
+
+
+def test_ledger_force_ignores_records(tmp_path):
+    path = str(tmp_path / "ledger.db")
+    TaskLedger("test", path=path, force=False).mark_done("wx_1", "signin")
+    assert TaskLedger("test", path=path, force=False).is_done("wx_1", "signin")
+    assert not TaskLedger("test", path=path, force=True).is_done("wx_1", "signin")
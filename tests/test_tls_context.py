@@ -0,0 +1,113 @@
+"""
+共用TLS上下文的行为测试: 同一线路复用TLS会话，不同线路（代理）不共用会话票据
+"""
+
+import ssl
+import shutil
+import socket
+import threading
+import subprocess
+
+import pytest
+
+from tlsContext import ResumingSSLContext, legacy_ssl_context, LegacyTLSAdapter
+
+
+@pytest.fixture(scope="module")
+def cert_file(tmp_path_factory):
+    """
+    用openssl生成localhost的自签名证书
+    """
+    if not shutil.which("openssl"):
+        pytest.skip("没有openssl，无法生成测试证书")
+    path = tmp_path_factory.mktemp("tls") / "localhost.pem"
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1", "-subj", "/CN=localhost",
+         "-addext", "subjectAltName=DNS:localhost", "-keyout", str(path), "-out", str(path)],
+        check=True, capture_output=True
+    )
+    return str(path)
+
+
+@pytest.fixture
+def tls_servers(cert_file):
+    """
+    在127.0.0.1和127.0.0.2上启动共用会话票据密钥的回显服务，代表经两个不同代理到达同一站点
+    :return: [(ip, 端口)]
+    """
+    server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+    server_context.load_cert_chain(cert_file)
+    listeners = []
+    for host in ("127.0.0.1", "127.0.0.2"):
+        listener = socket.socket()
+        listener.bind((host, 0))
+        listener.listen()
+        listeners.append(listener)
+
+    def handle(conn):
+        try:
+            with server_context.wrap_socket(conn, server_side=True) as tls:
+                while True:
+                    data = tls.recv(1024)
+                    if not data:
+                        break
+                    tls.sendall(data)
+        except (OSError, ssl.SSLError):
+            pass
+
+    def serve(listener):
+        while True:
+            try:
+                conn, _ = listener.accept()
+            except OSError:
+                return
+            threading.Thread(target=handle, args=(conn,), daemon=True).start()
+
+    for listener in listeners:
+        threading.Thread(target=serve, args=(listener,), daemon=True).start()
+    try:
+        yield [listener.getsockname() for listener in listeners]
+    finally:
+        for listener in listeners:
+            listener.close()
+
+
+def _connect(context, address, sockets):
+    """
+    建立连接并收发一次，让服务端下发会话票据；连接保持打开，与连接池中的keep-alive连接相同
+    """
+    tls = context.wrap_socket(socket.create_connection(address), server_hostname="localhost")
+    tls.sendall(b"ping")
+    assert tls.recv(1024) == b"ping"
+    sockets.append(tls)
+    return tls
+
+
+def test_session_is_resumed_only_on_the_same_route(cert_file, tls_servers):
+    context = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.load_verify_locations(cafile=cert_file)
+    first_route, second_route = tls_servers
+    sockets = []
+    try:
+        assert not _connect(context, first_route, sockets).session_reused
+        # 同一线路复用会话
+        assert _connect(context, first_route, sockets).session_reused
+        # 另一条线路（另一个代理）连接同一域名，不带上一条线路的会话票据
+        assert not _connect(context, second_route, sockets).session_reused
+        assert _connect(context, second_route, sockets).session_reused
+        assert (context.handshakes, context.resumed) == (4, 2)
+    finally:
+        for tls in sockets:
+            tls.close()
+
+
+def test_legacy_context_is_shared():
+    assert legacy_ssl_context() is legacy_ssl_context()
+    assert isinstance(legacy_ssl_context(), ResumingSSLContext)
+    adapter = LegacyTLSAdapter()
+    try:
+        assert adapter.poolmanager.connection_pool_kw["ssl_context"] is legacy_ssl_context()
+        manager = adapter.proxy_manager_for("http://127.0.0.1:8080")
+        assert manager.connection_pool_kw["ssl_context"] is legacy_ssl_context()
+    finally:
+        adapter.close()
@@ -0,0 +1,399 @@
+"""
+微信授权适配器的行为测试
+"""
+
+import os
+import json
+import time
+import socket
+import threading
+from http.server import ThreadingHTTPServer
+
+import pytest
+
+import wechatCodeAdapter
+from taskExecutor import TaskExecutor, AccountLogs
+from wechatCodeAdapter import WechatCodeAdapter, CodePrefetcher
+
+
+def wait_until(predicate, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, "等待超时"
+        time.sleep(0.01)
+
+
+class RecordingAdapter:
+    """
+    记录获取code的调用，每次返回新的code
+    """
+    max_in_flight = 4
+
+    def __init__(self):
+        self.log_msgs = AccountLogs()
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def get_code(self, wx_id):
+        with self.lock:
+            self.calls.append(wx_id)
+            count = len(self.calls)
+        self.log_msgs.append(f"[获取code] {wx_id}")
+        return f"code-{wx_id}-{count}"
+
+
+def test_prefetcher_stays_ahead_and_hands_out_each_code_once():
+    adapter = RecordingAdapter()
+    prefetcher = CodePrefetcher(adapter, ["a", "b", "c"], ahead=2).start()
+    try:
+        wait_until(lambda: set(prefetcher.codes) == {"a", "b"})
+        assert "c" not in adapter.calls
+        code = prefetcher.get("a")
+        assert code.startswith("code-a-")
+        # 取走a后窗口后移，预取c
+        wait_until(lambda: "c" in prefetcher.codes)
+        assert adapter.calls.count("a") == 1
+        assert "a" not in prefetcher.codes
+    finally:
+        prefetcher.close()
+
+
+def test_prefetcher_refetches_expired_code():
+    adapter = RecordingAdapter()
+    prefetcher = CodePrefetcher(adapter, ["a"], ttl=300, margin=60)
+    prefetcher.codes["a"] = ("old", time.monotonic() - 250)
+    assert prefetcher.get("a") == "code-a-1"
+    assert adapter.calls == ["a"]
+
+
+def test_prefetch_logs_follow_the_account_that_takes_the_code():
+    """
+    预取线程的日志不直接进入推送内容，账号取走code时按账号顺序合并
+    """
+    adapter = RecordingAdapter()
+    prefetcher = CodePrefetcher(adapter, ["a", "b"], ahead=2).start()
+    try:
+        wait_until(lambda: set(prefetcher.codes) == {"a", "b"})
+        assert adapter.log_msgs == []
+
+        def worker(index, account):
+            prefetcher.get(account)
+            adapter.log_msgs.append(f"{account}-done")
+
+        TaskExecutor(worker, concurrency=2, processes=1).run(["a", "b"])
+    finally:
+        prefetcher.close()
+    assert adapter.log_msgs == ["[获取code] a", "a-done", "[获取code] b", "b-done"]
+
+
+@pytest.fixture
+def accounts_cache(tmp_path, monkeypatch):
+    """
+    账号列表缓存文件放到临时目录
+    """
+    path = str(tmp_path / "wx_accounts_cache.json")
+    monkeypatch.setattr(wechatCodeAdapter, "ACCOUNTS_CACHE_FILE", path)
+    monkeypatch.setattr(wechatCodeAdapter, "ACCOUNTS_CACHE_TTL", 600)
+    monkeypatch.setattr(wechatCodeAdapter, "BROKER_URL", "")
+    return path
+
+
+def _pad_pro_adapter(monkeypatch, base_url):
+    monkeypatch.setenv("soy_codeurl_data", f"{base_url}/admin/GetAllDevices")
+    monkeypatch.setenv("soy_codetoken_data", "")
+    return WechatCodeAdapter("wx_app", use_broker=False)
+
+
+def test_accounts_list_is_cached_on_disk(mock_server, accounts_cache, monkeypatch):
+    base_url, mock = mock_server
+    adapter = _pad_pro_adapter(monkeypatch, base_url)
+    assert adapter.get_account_key("wxid_1") == mock.auth_keys["wxid_1"]
+    assert os.path.exists(accounts_cache)
+    # 第二个脚本直接读缓存，不再请求协议
+    other = _pad_pro_adapter(monkeypatch, base_url)
+    assert other.get_account_key("wxid_2") == mock.auth_keys["wxid_2"]
+    assert mock.snapshot()['stats']['GetAllDevices']['requests'] == 1
+    assert other.get_code("wxid_3")
+
+
+def test_expired_accounts_cache_is_refreshed(mock_server, accounts_cache, monkeypatch):
+    base_url, mock = mock_server
+    _pad_pro_adapter(monkeypatch, base_url)
+    with open(accounts_cache, "r", encoding="utf-8") as f:
+        cache = json.load(f)
+    for entry in cache.values():
+        entry['time'] -= 601
+    with open(accounts_cache, "w", encoding="utf-8") as f:
+        json.dump(cache, f)
+    _pad_pro_adapter(monkeypatch, base_url)
+    assert mock.snapshot()['stats']['GetAllDevices']['requests'] == 2
+
+
+def test_concurrent_scripts_fetch_accounts_list_once(mock_server, accounts_cache, monkeypatch):
+    """
+    同时启动的多个脚本通过文件锁排队，只有第一个请求协议
+    """
+    base_url, mock = mock_server
+    mock.latency = (0.2, 0.2)
+    monkeypatch.setenv("soy_codeurl_data", f"{base_url}/admin/GetAllDevices")
+    monkeypatch.setenv("soy_codetoken_data", "")
+    adapters = []
+    threads = [threading.Thread(target=lambda: adapters.append(WechatCodeAdapter("wx_app", use_broker=False)))
+               for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(10)
+    assert len(adapters) == 4
+    assert all(adapter.wx_accounts_index == adapters[0].wx_accounts_index for adapter in adapters)
+    assert mock.snapshot()['stats']['GetAllDevices']['requests'] == 1
+
+
+class BlockingAdapter(WechatCodeAdapter):
+    """
+    不连接协议地址，_request_code 阻塞到放行后返回固定code
+    """
+    wx_code_url = "http://code.test"
+
+    def __init__(self, wx_appid="wx_app"):
+        self.wx_appid = wx_appid
+        self._last_error = threading.local()
+        self.log_msgs = []
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.code = "code"
+
+    def _request_code(self, wx_id):
+        self.calls.append(wx_id)
+        self.started.set()
+        self.release.wait(5)
+        if not self.code:
+            self._last_error.msg = "协议返回错误"
+        return self.code
+
+
+class CountingEvent(threading.Event):
+    """
+    记录进入等待的调用方数量
+    """
+    def __init__(self):
+        super().__init__()
+        self.waiters = 0
+        self.lock = threading.Lock()
+
+    def wait(self, timeout=None):
+        with self.lock:
+            self.waiters += 1
+        return super().wait(timeout)
+
+
+def _get_codes(adapter, wx_id, callers):
+    """
+    第一个调用方请求期间，其余调用方获取同一wxid的code
+    :return: [(code, 调用方线程的最近错误)]
+    """
+    results = [None] * callers
+
+    def call(i):
+        code = adapter.get_code(wx_id)
+        results[i] = (code, getattr(adapter._last_error, 'msg', None))
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    threads[0].start()
+    assert adapter.started.wait(5)
+    event = CountingEvent()
+    WechatCodeAdapter._flights[(adapter.wx_code_url, wx_id, adapter.wx_appid)].event = event
+    for thread in threads[1:]:
+        thread.start()
+    for _ in range(500):
+        if event.waiters >= callers - 1:
+            break
+        threads[-1].join(0.01)
+    adapter.release.set()
+    for thread in threads:
+        thread.join(5)
+    return results
+
+
+def test_concurrent_calls_share_one_request():
+    adapter = BlockingAdapter()
+    assert _get_codes(adapter, "wx_1", 5) == [("code", None)] * 5
+    assert adapter.calls == ["wx_1"]
+    assert not WechatCodeAdapter._flights
+
+
+def test_waiters_share_failure():
+    adapter = BlockingAdapter()
+    adapter.code = False
+    assert _get_codes(adapter, "wx_1", 3) == [(False, "协议返回错误")] * 3
+    assert adapter.calls == ["wx_1"]
+
+
+def test_different_keys_are_not_merged():
+    adapter = BlockingAdapter()
+    other = BlockingAdapter(wx_appid="wx_other")
+    adapter.release.set()
+    other.release.set()
+    assert adapter.get_code("wx_1") == "code"
+    assert adapter.get_code("wx_2") == "code"
+    assert other.get_code("wx_1") == "code"
+    assert adapter.calls == ["wx_1", "wx_2"]
+    assert other.calls == ["wx_1"]
+
+
+def test_finished_request_is_not_reused():
+    adapter = BlockingAdapter()
+    adapter.release.set()
+    adapter.get_code("wx_1")
+    adapter.get_code("wx_1")
+    # code一次性使用，请求结束后再次获取重新请求
+    assert adapter.calls == ["wx_1", "wx_1"]
+
+
+@pytest.fixture
+def broker_server(mock_server, monkeypatch):
+    """
+    在随机端口启动code代理服务，可以中途停止
+    :return: (服务地址, 停止函数)
+    """
+    from wechatCodeBroker import BrokerHandler, CodeBroker
+    base_url, _ = mock_server
+    broker = CodeBroker(rate=100)
+    # 同一进程内的适配器共用在途请求表，代理服务换一种地址写法，避免与脚本自己的请求合并后互相等待
+    monkeypatch.setenv("soy_codeurl_data", f"{base_url.replace('127.0.0.1', 'localhost')}/wx/app/code")
+    broker.get_adapter("wx_app")
+    BrokerHandler.broker = broker
+    connections = []
+
+    class TrackedHandler(BrokerHandler):
+        def setup(self):
+            super().setup()
+            connections.append(self.connection)
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), TrackedHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    stopped = []
+
+    def stop():
+        # 与进程退出一样，连同保持中的连接一起关闭
+        if not stopped:
+            stopped.append(True)
+            server.shutdown()
+            server.server_close()
+            for connection in connections:
+                try:
+                    connection.shutdown(socket.SHUT_RDWR)
+                except OSError:
+                    pass
+
+    url = f"http://127.0.0.1:{server.server_address[1]}"
+    monkeypatch.setattr(wechatCodeAdapter, "BROKER_URL", url)
+    try:
+        yield url, stop
+    finally:
+        stop()
+
+
+def _unused_url():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return f"http://127.0.0.1:{sock.getsockname()[1]}"
+
+
+def test_codes_go_through_running_broker(mock_server, broker_server, monkeypatch):
+    base_url, mock = mock_server
+    url, _ = broker_server
+    monkeypatch.setenv("soy_codeurl_data", f"{base_url}/wx/app/code")
+    adapter = WechatCodeAdapter("wx_app")
+    assert adapter.broker_url == url
+    code = adapter.get_code("wxid_1")
+    assert mock.verify_code(code)['wxid'] == "wxid_1"
+
+
+def test_broker_stopping_mid_run_falls_back_to_local(mock_server, broker_server, monkeypatch):
+    base_url, mock = mock_server
+    url, stop = broker_server
+    monkeypatch.setenv("soy_codeurl_data", f"{base_url}/wx/app/code")
+    adapter = WechatCodeAdapter("wx_app")
+    assert adapter.get_code("wxid_1")
+    stop()
+    code = adapter.get_code("wxid_2")
+    assert mock.verify_code(code)['valid']
+    assert adapter.broker_url == ""
+    assert any("改为本进程获取code" in msg for msg in adapter.log_msgs)
+
+
+def test_broker_not_running_uses_local(mock_server, monkeypatch):
+    base_url, mock = mock_server
+    monkeypatch.setattr(wechatCodeAdapter, "BROKER_URL", _unused_url())
+    monkeypatch.setenv("soy_codeurl_data", f"{base_url}/wx/app/code")
+    adapter = WechatCodeAdapter("wx_app")
+    assert adapter.broker_url == ""
+    assert adapter.get_code("wxid_1")
+    assert mock.snapshot()['stats']['code']['requests'] == 1
+
+
+def test_parse_endpoints_ignores_blank_token_lines():
+    parse = WechatCodeAdapter._parse_endpoints
+    endpoints = parse("http://a/code\nhttp://b/code\nhttp://c/code", "t1\n\nt2\n")
+    assert [endpoint.token for endpoint in endpoints] == ["t1", "t2", "t2"]
+    assert [endpoint.token for endpoint in parse("http://a/code\nhttp://b/code", "t1")] == ["t1", "t1"]
+    assert [endpoint.token for endpoint in parse("http://a/code\nhttp://b/code", "")] == ["", ""]
+    assert [endpoint.token for endpoint in parse("http://a/code\nhttp://b/code", None)] == [None, None]
+
+
+def _failover_adapter(monkeypatch, base_url):
+    monkeypatch.setattr(wechatCodeAdapter, "BROKER_URL", "")
+    monkeypatch.setattr(wechatCodeAdapter, "RETRIES", 0)
+    monkeypatch.setenv("soy_codeurl_data", f"{_unused_url()}/wx/app/code\n{base_url}/wx/app/code")
+    monkeypatch.setenv("soy_codetoken_data", "")
+    return WechatCodeAdapter("wx_app", use_broker=False)
+
+
+def test_get_code_fails_over_to_next_endpoint(mock_server, monkeypatch):
+    base_url, mock = mock_server
+    adapter = _failover_adapter(monkeypatch, base_url)
+    dead = adapter.endpoints[0]
+    # 让不可用的地址排在最前
+    dead.latency, dead.error_rate, dead.failures, dead.down_until = 0, 0.0, 0, 0
+    assert adapter.select_endpoints()[0] is dead
+    code = adapter.get_code("wxid_1")
+    assert mock.verify_code(code)['valid']
+    assert any("切换到" in msg for msg in adapter.log_msgs)
+    assert dead.failures == 1
+
+
+def test_failing_endpoint_is_moved_behind_healthy_one(mock_server, monkeypatch):
+    base_url, mock = mock_server
+    adapter = _failover_adapter(monkeypatch, base_url)
+    dead, alive = adapter.endpoints
+    for wx_id in ("wxid_1", "wxid_2", "wxid_3"):
+        assert mock.verify_code(adapter.get_code(wx_id))['valid']
+    assert adapter.select_endpoints()[0] is alive
+    dead.record(False, 0)
+    dead.record(False, 0)
+    dead.record(False, 0)
+    assert not dead.healthy()
+    assert adapter.select_endpoints() == [alive, dead]
+
+
+def test_protocol_uses_new_session_in_forked_process(mock_server, monkeypatch):
+    """
+    多进程执行的子进程中，协议请求不沿用父进程的连接池会话
+    """
+    base_url, mock = mock_server
+    monkeypatch.setattr(wechatCodeAdapter, "BROKER_URL", "")
+    monkeypatch.setenv("soy_codeurl_data", f"{base_url}/wx/app/code")
+    monkeypatch.setenv("soy_codetoken_data", "")
+    adapter = WechatCodeAdapter("wx_app", use_broker=False)
+    protocol = adapter.endpoints[0].protocol
+    parent_session = protocol.session
+    assert protocol.session is parent_session
+    assert mock.verify_code(adapter.get_code("wxid_1"))['valid']
+    # 模拟fork出的子进程：进程号变化
+    adapter._sessions_pid = -1
+    assert protocol.session is not parent_session
+    assert mock.verify_code(adapter.get_code("wxid_2"))['valid']
+    assert adapter._sessions_pid == os.getpid()
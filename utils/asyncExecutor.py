@@ -0,0 +1,278 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 异步执行引擎
+变量: LY_CONCURRENCY (每个代理同时建立的连接数上限、同步步骤的线程数，默认1即按顺序执行)
+    LY_MAX_ACTIVE (同时在途的账号数，包括正在等待间隔和响应的账号，默认为并发数的10倍，可设置到上千)
+    LY_HTTP2 (填True则异步请求使用HTTP/2，需要安装httpx[http2])
+说明: 基于asyncio的多账号执行引擎，等待间隔和响应时不占用线程，一个进程可以同时在途上千个账号
+        需要安装httpx（没有安装时导入本模块抛出ImportError，脚本退回TaskExecutor），任务函数可以逐步改成异步:
+        1. 任务函数写成 async def run_account(self, index, account)，用 AsyncTaskExecutor(self.run_account).run(self.check_env()) 执行
+        2. 用 session = self.async_transport.session() 代替 requests.Session()，请求写法不变，前面加await，
+            如 response = await session.post(url, headers=headers, json=payload, timeout=10)
+        3. time.sleep(x) 改成 await asyncio.sleep(x)
+        4. 还没改成异步的同步步骤用 await run_sync(self.get_user_info, ...) 在线程池中执行
+        没改的同步任务函数（普通函数、生成器）也可以直接交给AsyncTaskExecutor，按TaskExecutor的方式执行
+        AccountState、AccountLogs、断点续跑与TaskExecutor相同
+        AsyncSession只支持params、data、json、headers、timeout、allow_redirects参数，其他参数抛出TypeError，
+        需要proxies、verify、cookies、files等参数的请求仍用requests在run_sync中发送
+        示例见 web/快萌论坛.py 的Cookie账号
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    AsyncSession不支持的请求参数抛出TypeError；兼容旧站点的SSL上下文加载certifi证书
+2026/10/18  V1.2    兼容httpx 0.26以前的代理参数
+"""
+
+import os
+import asyncio
+import functools
+import inspect
+import logging
+import traceback
+import weakref
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+
+import httpx # type: ignore
+from requests.utils import select_proxy, DEFAULT_CA_BUNDLE_PATH
+
+from taskExecutor import TaskExecutor, AccountContext, current_account, CONCURRENCY # type: ignore
+from http2Adapter import HTTP2, to_requests_error # type: ignore
+
+# 导入h2，没有则异步请求只使用HTTP/1.1
+try:
+    import h2 # type: ignore
+except ImportError:
+    h2 = None
+
+POOL_MAXSIZE = max(10, CONCURRENCY) # 每个代理保留的连接数
+
+_transports = weakref.WeakSet() # 所有异步连接池，事件循环结束时关闭
+
+
+async def run_sync(func, *args, **kwargs):
+    """
+    在线程池中执行还没改成异步的同步步骤，当前账号的上下文随之传递
+    :param func: 同步函数
+    :return: 函数返回值
+    """
+    loop = asyncio.get_running_loop()
+    call = functools.partial(contextvars.copy_context().run, func, *args, **kwargs)
+    return await loop.run_in_executor(None, call)
+
+
+class _ProxyRouter(httpx.AsyncBaseTransport):
+    """
+    按session.proxies为每个请求选择代理对应的共用连接池，请求前按域名限流
+    关闭session时不关闭共用连接池
+    """
+    def __init__(self, transport, session):
+        self.transport = transport
+        self.session = session
+
+    async def handle_async_request(self, request):
+        if self.transport.host_limiter:
+            await self.transport.host_limiter.acquire_async(request.url.host)
+        proxy = select_proxy(str(request.url), self.session.proxies)
+        return await self.transport.get_transport(proxy).handle_async_request(request)
+
+    async def aclose(self):
+        pass
+
+
+class AsyncSession:
+    """
+    异步session，请求写法与requests.Session相同，前面加await
+    cookie、请求头、代理每个账号一份，连接共用
+    """
+    def __init__(self, transport):
+        self.client = httpx.AsyncClient(transport=_ProxyRouter(transport, self))
+        self.headers = self.client.headers
+        self.cookies = self.client.cookies
+        self.proxies = {} # 与requests相同，如 {"https": "http://ip:端口"}
+
+    async def request(self, method, url, params=None, data=None, json=None, headers=None,
+                      timeout=None, allow_redirects=True, **kwargs):
+        """
+        发送请求
+        :return: httpx.Response，json()、text、status_code等用法与requests相同
+        """
+        if kwargs:
+            # 不支持的参数不能静默忽略，否则代理、证书校验等设置会失效
+            raise TypeError(f"AsyncSession不支持参数: {', '.join(kwargs)}，"
+                            f"代理用session.proxies设置，其他参数请用requests在run_sync中发送")
+        if isinstance(timeout, tuple):
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        content = None
+        if isinstance(data, (str, bytes)):
+            # httpx的data只接受表单，字符串请求体用content
+            content, data = data, None
+        try:
+            return await self.client.request(method, url, params=params, data=data, content=content, json=json,
+                                             headers=headers, timeout=timeout, follow_redirects=allow_redirects)
+        except httpx.TransportError as e:
+            raise to_requests_error(e)
+        except httpx.TooManyRedirects as e:
+            raise to_requests_error(e)
+
+    async def get(self, url, **kwargs):
+        return await self.request("GET", url, **kwargs)
+
+    async def post(self, url, **kwargs):
+        return await self.request("POST", url, **kwargs)
+
+    async def put(self, url, **kwargs):
+        return await self.request("PUT", url, **kwargs)
+
+    async def delete(self, url, **kwargs):
+        return await self.request("DELETE", url, **kwargs)
+
+    async def close(self):
+        await self.client.aclose()
+        self.cookies.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        await self.close()
+
+
+class AsyncTransport:
+    """
+    异步共用连接池
+    用法: self.async_transport = AsyncTransport(host_limiter=self.host_limiter) # 在AutoTask.__init__中创建
+        session = self.async_transport.session()
+        ...
+        await session.close() # 账号结束时关闭
+    连接池在AsyncTaskExecutor的事件循环结束时自动关闭
+    """
+    def __init__(self, pool_maxsize=None, http2=None, ssl_context=None, host_limiter=None):
+        """
+        :param pool_maxsize: 每个代理保留的连接数，默认取并发数，至少10
+        :param http2: 是否使用HTTP/2，默认取环境变量LY_HTTP2，服务端或代理不支持时自动使用HTTP/1.1
+        :param ssl_context: 创建SSL上下文的函数，兼容旧站点时传入new_legacy_ssl_context
+        :param host_limiter: 按域名限流，一般与同步请求共用一个HostRateLimiter
+        """
+        self.pool_maxsize = pool_maxsize or POOL_MAXSIZE
+        self.http2 = (HTTP2 if http2 is None else http2) and h2 is not None
+        self.ssl_context = ssl_context
+        self.host_limiter = host_limiter
+        self.transports = {} # 代理 -> httpx传输
+        _transports.add(self)
+
+    def get_transport(self, proxy):
+        """
+        获取代理对应的httpx传输，没有则创建
+        :param proxy: 代理地址，直连为None
+        """
+        if proxy not in self.transports:
+            verify = True
+            if self.ssl_context:
+                # 与requests相同，证书取REQUESTS_CA_BUNDLE，没有则用certifi
+                verify = self.ssl_context()
+                verify.load_verify_locations(cafile=os.getenv("REQUESTS_CA_BUNDLE") or os.getenv("CURL_CA_BUNDLE") or DEFAULT_CA_BUNDLE_PATH)
+            limits = httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize)
+            try:
+                transport = httpx.AsyncHTTPTransport(http2=self.http2, verify=verify, limits=limits, proxy=proxy)
+            except TypeError:
+                # httpx 0.26以前的参数名
+                proxy_arg = httpx.Proxy(proxy) if proxy else None
+                transport = httpx.AsyncHTTPTransport(http2=self.http2, verify=verify, limits=limits, proxy=proxy_arg)
+            self.transports[proxy] = transport
+        return self.transports[proxy]
+
+    def session(self):
+        """
+        创建使用共用连接池的异步session
+        :return: AsyncSession
+        """
+        return AsyncSession(self)
+
+    async def aclose(self):
+        """
+        关闭连接池，之后再使用时重新建立连接
+        """
+        transports, self.transports = list(self.transports.values()), {}
+        for transport in transports:
+            await transport.aclose()
+
+
+class AsyncTaskExecutor(TaskExecutor):
+    """
+    异步多账号执行器
+    同时在途的账号数不超过max_active，同步步骤在concurrency个线程中执行
+    """
+    def _run(self, accounts, journal):
+        return asyncio.run(self._run_async(accounts, journal))
+
+    async def _run_async(self, accounts, journal):
+        """
+        在事件循环中调度执行所有账号
+        :param accounts: (序号, 账号)可迭代对象
+        :param journal: 断点续跑日志，不续跑为None
+        :return: 按账号顺序排列的账号上下文列表
+        """
+        loop = asyncio.get_running_loop()
+        loop.set_default_executor(ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="account"))
+        contexts = []
+        self._finished = {}
+        self._next_flush = 1
+        slots = asyncio.Semaphore(self.max_active)
+        tasks = []
+        try:
+            for index, account in accounts:
+                ctx = AccountContext(index, account)
+                contexts.append(ctx)
+                if journal and journal.is_finished(account):
+                    # 上次已完成，占位以保持日志顺序
+                    ctx.skipped = True
+                    self._flush_logs(ctx)
+                    continue
+                # 在途账号已满时等待，避免一次性展开全部账号
+                await slots.acquire()
+                tasks.append(loop.create_task(self._run_account(ctx, journal, slots)))
+            await asyncio.gather(*tasks)
+        finally:
+            for transport in list(_transports):
+                await transport.aclose()
+        return contexts
+
+    async def _run_account(self, ctx, journal, slots):
+        """
+        执行单个账号
+        :param ctx: 账号上下文
+        :param journal: 断点续跑日志
+        :param slots: 在途账号信号量
+        """
+        try:
+            if inspect.iscoroutinefunction(self.worker):
+                await self._run_coroutine(ctx)
+            else:
+                # 同步任务在线程池中逐步执行，间隔在事件循环中等待
+                loop = asyncio.get_running_loop()
+                while True:
+                    finished, delay = await loop.run_in_executor(None, ctx.vars.run, self._step, ctx)
+                    if finished:
+                        break
+                    await asyncio.sleep(delay)
+            if journal and ctx.error is None:
+                journal.finish(ctx)
+            self._flush_logs(ctx)
+        finally:
+            slots.release()
+
+    async def _run_coroutine(self, ctx):
+        """
+        在账号上下文中执行异步任务
+        :param ctx: 账号上下文
+        """
+        # 每个任务有独立的上下文，设置后只对该账号生效
+        current_account.set(ctx)
+        ctx.step_count += 1
+        try:
+            ctx.result = await self.worker(ctx.index, ctx.account)
+        except Exception as e:
+            ctx.error = e
+            logging.error(f"[账号{ctx.index}] 执行过程中发生错误: {str(e)}\n{traceback.format_exc()}")
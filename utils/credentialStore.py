@@ -0,0 +1,243 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 账号凭据存储
+变量: LY_CREDENTIAL_DB (凭据数据库文件，默认当前目录下ly_credentials.db，所有脚本共用)
+说明: 按 (脚本, 微信id) 保存token、openid、cookie等凭据，单条读写，
+        多个脚本、多个线程同时写入由SQLite加锁，不会互相覆盖
+        首次使用时自动导入脚本原来的xxx_account_info.json，导入后原文件改名为.bak
+        记录每个凭据的获取时间和各脚本凭据的观测寿命，还年轻的凭据可跳过有效性检查，快过期的提前重新授权
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    记录凭据获取时间和观测寿命
+2026/10/18  V1.2    多进程执行时子进程重新建立数据库连接
+"""
+
+import os
+import json
+import time
+import sqlite3
+import logging
+import threading
+
+CREDENTIAL_DB = os.getenv("LY_CREDENTIAL_DB") or "ly_credentials.db" # 凭据数据库文件
+TOKEN_FRESH_RATIO = 0.5 # 凭据年龄小于观测寿命的该比例时视为有效
+TOKEN_RENEW_RATIO = 0.8 # 凭据年龄超过观测寿命的该比例时提前重新授权
+
+
+class CredentialStore:
+    """
+    账号凭据存储
+    用法: store = CredentialStore("lbfwwsc", legacy_file="lbfwwsc_account_info.json")
+        store.get(wx_id) / store.save(wx_id, {"openid": openid}) / store.remove(wx_id)
+    """
+    def __init__(self, script, path=None, legacy_file=None):
+        """
+        :param script: 脚本标识，不同脚本的凭据互不影响
+        :param path: 数据库文件，默认取环境变量LY_CREDENTIAL_DB
+        :param legacy_file: 原来的账号信息json文件，存在则导入
+        """
+        self.script = script
+        self.path = path or CREDENTIAL_DB
+        self._local = threading.local() # sqlite连接不能跨线程使用，每个线程一个
+        self._lifetime = None # 凭据观测寿命缓存 (确认有效的最大年龄, 确认失效的最小年龄)
+        self._lifetime_lock = threading.Lock()
+        self._init_db()
+        if legacy_file:
+            self._import_legacy(legacy_file)
+
+    def _conn(self):
+        """
+        获取当前线程的数据库连接
+        """
+        conn = getattr(self._local, 'conn', None)
+        # 多进程执行时子进程不能沿用父进程的连接
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            # 其他进程写入时最多等待30秒
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        try:
+            # WAL模式下读不阻塞写，多个脚本同时运行更顺畅
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError as e:
+            logging.warning(f"[凭据存储] 开启WAL失败，使用默认模式: {str(e)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS credentials ("
+            "script TEXT NOT NULL, wx_id TEXT NOT NULL, data TEXT NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (script, wx_id))"
+        )
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_lifetimes ("
+            "script TEXT PRIMARY KEY, max_alive REAL, min_dead REAL, updated_at REAL NOT NULL)"
+        )
+
+    def _import_legacy(self, legacy_file):
+        """
+        导入原来的账号信息json文件，已有的凭据不覆盖
+        :param legacy_file: json文件路径
+        """
+        if not os.path.exists(legacy_file):
+            return
+        try:
+            with open(legacy_file, "r", encoding="utf-8") as f:
+                items = json.load(f)
+            now = time.time()
+            rows = [(self.script, item['wx_id'], json.dumps(item, ensure_ascii=False), now)
+                    for item in items if isinstance(item, dict) and item.get('wx_id')]
+            conn = self._conn()
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                conn.executemany(
+                    "INSERT OR IGNORE INTO credentials (script, wx_id, data, updated_at) VALUES (?, ?, ?, ?)", rows
+                )
+            os.replace(legacy_file, f"{legacy_file}.bak")
+            logging.info(f"[凭据存储] 已导入{legacy_file}中的{len(rows)}个账号")
+        except (OSError, ValueError, sqlite3.Error) as e:
+            logging.warning(f"[凭据存储] 导入{legacy_file}失败: {str(e)}")
+
+    def get(self, wx_id):
+        """
+        获取账号凭据
+        :param wx_id: 微信id
+        :return: 凭据字典，没有则为None
+        """
+        row = self._conn().execute(
+            "SELECT data FROM credentials WHERE script = ? AND wx_id = ?", (self.script, wx_id)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def all(self):
+        """
+        获取本脚本的全部凭据
+        :return: {微信id: 凭据字典}
+        """
+        rows = self._conn().execute(
+            "SELECT wx_id, data FROM credentials WHERE script = ?", (self.script,)
+        ).fetchall()
+        return {wx_id: json.loads(data) for wx_id, data in rows}
+
+    def count(self):
+        """
+        本脚本保存的账号数
+        """
+        return self._conn().execute(
+            "SELECT COUNT(*) FROM credentials WHERE script = ?", (self.script,)
+        ).fetchone()[0]
+
+    def save(self, wx_id, data):
+        """
+        保存账号凭据，有则更新，无则新增
+        :param wx_id: 微信id
+        :param data: 凭据字典，没有issued_at时记为当前获取
+        """
+        data = dict(data, wx_id=wx_id)
+        data.setdefault('issued_at', time.time())
+        self._conn().execute(
+            "INSERT OR REPLACE INTO credentials (script, wx_id, data, updated_at) VALUES (?, ?, ?, ?)",
+            (self.script, wx_id, json.dumps(data, ensure_ascii=False), time.time())
+        )
+
+    def save_many(self, items):
+        """
+        批量保存账号凭据，在一个事务中写入
+        :param items: 凭据字典列表，每个都要有wx_id
+        """
+        now = time.time()
+        rows = [(self.script, item['wx_id'], json.dumps(dict({'issued_at': now}, **item), ensure_ascii=False), now)
+                for item in items]
+        conn = self._conn()
+        with conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.executemany(
+                "INSERT OR REPLACE INTO credentials (script, wx_id, data, updated_at) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def remove(self, wx_id):
+        """
+        删除账号凭据
+        :param wx_id: 微信id
+        """
+        self._conn().execute(
+            "DELETE FROM credentials WHERE script = ? AND wx_id = ?", (self.script, wx_id)
+        )
+
+    def token_lifetime(self):
+        """
+        本脚本凭据的观测寿命，每次运行读取一次
+        :return: (确认有效的最大年龄, 确认失效的最小年龄)，未观测到为None
+        """
+        with self._lifetime_lock:
+            if self._lifetime is None:
+                row = self._conn().execute(
+                    "SELECT max_alive, min_dead FROM token_lifetimes WHERE script = ?", (self.script,)
+                ).fetchone()
+                self._lifetime = tuple(row) if row else (None, None)
+            return self._lifetime
+
+    def token_state(self, data):
+        """
+        按凭据年龄和观测寿命判断凭据状态
+        :param data: 凭据字典
+        :return: fresh 还年轻，可跳过有效性检查
+                 expiring 快过期，应提前重新授权
+                 unknown 需要检查
+        """
+        issued_at = (data or {}).get('issued_at')
+        if not issued_at:
+            return "unknown"
+        age = time.time() - issued_at
+        max_alive, min_dead = self.token_lifetime()
+        if min_dead and age >= min_dead * TOKEN_RENEW_RATIO:
+            return "expiring"
+        # 比确认有效过的凭据还年轻
+        if max_alive and age <= max_alive and (not min_dead or age < min_dead * TOKEN_FRESH_RATIO):
+            return "fresh"
+        return "unknown"
+
+    def record_token_check(self, data, alive):
+        """
+        记录一次凭据有效性检查结果，更新观测寿命
+        :param data: 凭据字典
+        :param alive: 凭据是否有效
+        """
+        issued_at = (data or {}).get('issued_at')
+        if not issued_at:
+            return
+        age = time.time() - issued_at
+        conn = self._conn()
+        with self._lifetime_lock, conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT max_alive, min_dead FROM token_lifetimes WHERE script = ?", (self.script,)
+            ).fetchone()
+            max_alive, min_dead = row if row else (None, None)
+            if alive:
+                max_alive = max(max_alive or 0, age)
+                # 比之前失效的凭据活得还久，说明那次不是过期失效
+                if min_dead and age >= min_dead:
+                    min_dead = None
+            elif not max_alive or age > max_alive:
+                # 比确认有效过的凭据还年轻就失效的，不是过期，不计入寿命
+                min_dead = age if not min_dead else min(min_dead, age)
+            conn.execute(
+                "INSERT OR REPLACE INTO token_lifetimes (script, max_alive, min_dead, updated_at) VALUES (?, ?, ?, ?)",
+                (self.script, max_alive, min_dead, time.time())
+            )
+            self._lifetime = (max_alive, min_dead)
+
+    def close(self):
+        """
+        关闭当前线程的数据库连接
+        """
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
@@ -0,0 +1,217 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: HTTP/2连接适配器
+变量: LY_HTTP2 (填True则小程序接口域名使用HTTP/2，多个账号的请求在同一个连接上并发，默认不使用)
+说明: 用httpx的传输层代替urllib3发送请求，挂载到requests的session上，脚本的请求写法不变
+        握手时同时声明h2和http/1.1，服务端或代理不支持h2时自动使用HTTP/1.1，
+        h2连接出现协议错误的域名之后改用HTTP/1.1，出错的请求只有幂等方法才用HTTP/1.1重发
+        需要安装 httpx[http2]，没有安装则继续使用HTTP/1.1
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    httpx异常转换为requests异常抽成to_requests_error，供异步执行引擎共用
+2026/10/18  V1.2    协议错误只重发幂等请求；兼容旧站点的SSL上下文与requests一样加载certifi证书
+"""
+
+import os
+import logging
+import threading
+from http.client import HTTPMessage
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.cookies import extract_cookies_to_jar
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers, select_proxy, DEFAULT_CA_BUNDLE_PATH
+
+# 导入httpx，没有则不使用HTTP/2
+try:
+    import httpx # type: ignore
+    import h2 # type: ignore # noqa: F401
+except ImportError:
+    httpx = None
+
+HTTP2 = str(os.getenv("LY_HTTP2") or "").lower() in ("true", "1") # 是否使用HTTP/2
+IDEMPOTENT_METHODS = frozenset(("GET", "HEAD", "OPTIONS", "PUT", "DELETE", "TRACE")) # 可以安全重发的请求方法
+
+
+def to_requests_error(e, request=None):
+    """
+    把httpx的异常转换成requests的异常，脚本原有的 except requests.RequestException 照常生效
+    :param e: httpx异常
+    :param request: 请求
+    :return: requests异常
+    """
+    if isinstance(e, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(e, request=request)
+    if isinstance(e, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(e, request=request)
+    if isinstance(e, httpx.ProxyError):
+        return requests.exceptions.ProxyError(e, request=request)
+    if isinstance(e, httpx.TooManyRedirects):
+        return requests.exceptions.TooManyRedirects(e, request=request)
+    return requests.exceptions.ConnectionError(e, request=request)
+
+
+class _Raw:
+    """
+    代替urllib3响应的raw，供requests读取流式内容和cookie
+    """
+    def __init__(self, response):
+        self.response = response
+        self.headers = CaseInsensitiveDict(response.headers.items())
+        # requests从_original_response.msg中提取Set-Cookie
+        self.msg = HTTPMessage()
+        for key, value in response.headers.multi_items():
+            self.msg[key] = value
+        self._original_response = self
+        self._chunks = None
+
+    def info(self):
+        return self.msg
+
+    def stream(self, chunk_size=1024, decode_content=True):
+        yield from self.response.iter_bytes(chunk_size)
+
+    def read(self, amt=None, decode_content=True):
+        if amt is None:
+            return self.response.read()
+        if self._chunks is None:
+            self._chunks = self.response.iter_bytes(amt)
+        return next(self._chunks, b"")
+
+    def close(self):
+        self.response.close()
+
+    def release_conn(self):
+        self.response.close()
+
+
+class Http2Adapter(BaseAdapter):
+    """
+    HTTP/2连接适配器
+    用法: session.mount("https://api.cdfsunrise.com", Http2Adapter())
+    每个代理一个httpx传输，同一代理的所有账号共用连接，cookie仍由各自的session管理
+    """
+    def __init__(self, pool_maxsize=10, ssl_context=None):
+        """
+        :param pool_maxsize: 每个域名保留的连接数
+        :param ssl_context: 创建SSL上下文的函数，默认使用httpx的上下文，兼容旧站点时传入new_legacy_ssl_context
+        """
+        super().__init__()
+        self.pool_maxsize = pool_maxsize
+        self.ssl_context = ssl_context
+        self.transports = {} # (代理, 是否h2, 证书校验) -> httpx传输
+        self.http1_hosts = set() # h2出错后改用HTTP/1.1的域名
+        self.versions = {} # 协议版本 -> 请求次数
+        self.lock = threading.Lock()
+
+    def get_transport(self, proxy, http2, verify):
+        """
+        获取代理对应的httpx传输，没有则创建
+        握手时会修改SSL上下文的ALPN，所以每个传输单独一个上下文
+        """
+        key = (proxy, http2, verify)
+        with self.lock:
+            if key not in self.transports:
+                if verify is False or not self.ssl_context:
+                    verify_arg = verify
+                else:
+                    # 与urllib3相同，传入证书路径时加载到上下文中，否则加载requests默认的certifi证书
+                    verify_arg = self.ssl_context()
+                    if not isinstance(verify, str):
+                        verify_arg.load_verify_locations(cafile=DEFAULT_CA_BUNDLE_PATH)
+                    elif os.path.isdir(verify):
+                        verify_arg.load_verify_locations(capath=verify)
+                    else:
+                        verify_arg.load_verify_locations(cafile=verify)
+                limits = httpx.Limits(max_keepalive_connections=self.pool_maxsize)
+                try:
+                    transport = httpx.HTTPTransport(http2=http2, verify=verify_arg, limits=limits, proxy=proxy)
+                except TypeError:
+                    # httpx 0.26以前的参数名
+                    proxy_arg = httpx.Proxy(proxy) if proxy else None
+                    transport = httpx.HTTPTransport(http2=http2, verify=verify_arg, limits=limits, proxy=proxy_arg)
+                self.transports[key] = transport
+            return self.transports[key]
+
+    def send(self, request, stream=False, timeout=None, verify=True, cert=None, proxies=None):
+        host = urlsplit(request.url).hostname
+        proxy = select_proxy(request.url, proxies)
+        body = request.body.encode("utf-8") if isinstance(request.body, str) else request.body
+        http2 = host not in self.http1_hosts
+        try:
+            response = self._send(request, body, stream, timeout, verify, proxy, http2)
+        except httpx.RemoteProtocolError as e:
+            if not http2:
+                raise requests.exceptions.ConnectionError(e, request=request)
+            # h2协议错误的域名之后改用HTTP/1.1
+            with self.lock:
+                self.http1_hosts.add(host)
+            logging.warning(f"[HTTP/2] {host} 协议错误，改用HTTP/1.1: {e}")
+            # 请求可能已被服务端处理，只有幂等且请求体可以重发的请求才重试，签到、抽奖等由脚本决定
+            if request.method.upper() not in IDEMPOTENT_METHODS or not (body is None or isinstance(body, bytes)):
+                raise requests.exceptions.ConnectionError(e, request=request)
+            response = self._send(request, body, stream, timeout, verify, proxy, False)
+        return self.build_response(request, response)
+
+    def _send(self, request, body, stream, timeout, verify, proxy, http2):
+        if isinstance(timeout, tuple):
+            connect, read = timeout
+        else:
+            connect = read = timeout
+        transport = self.get_transport(proxy, http2, verify)
+        headers = [(key, value) for key, value in request.headers.items()]
+        extensions = {"timeout": {"connect": connect, "read": read, "write": read, "pool": connect}}
+        httpx_request = httpx.Request(request.method, request.url, headers=headers, content=body, extensions=extensions)
+        try:
+            response = transport.handle_request(httpx_request)
+            if not stream:
+                response.read()
+                response.close()
+        except httpx.RemoteProtocolError:
+            raise
+        except httpx.TransportError as e:
+            raise to_requests_error(e, request)
+        version = response.extensions.get("http_version", b"HTTP/1.1").decode()
+        with self.lock:
+            self.versions[version] = self.versions.get(version, 0) + 1
+        return response
+
+    def build_response(self, request, response):
+        """
+        把httpx的响应转换成requests的响应
+        """
+        raw = _Raw(response)
+        resp = requests.Response()
+        resp.status_code = response.status_code
+        resp.headers = raw.headers
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp.raw = raw
+        resp.reason = response.reason_phrase
+        resp.url = request.url
+        resp.request = request
+        resp.connection = self
+        if response.is_stream_consumed:
+            resp._content = response.content
+        extract_cookies_to_jar(resp.cookies, request, raw)
+        return resp
+
+    def release(self, proxy):
+        """
+        关闭代理对应的连接
+        :param proxy: 代理地址
+        """
+        with self.lock:
+            keys = [key for key in self.transports if key[0] == proxy]
+            transports = [self.transports.pop(key) for key in keys]
+        for transport in transports:
+            transport.close()
+
+    def close(self):
+        with self.lock:
+            transports, self.transports = list(self.transports.values()), {}
+        for transport in transports:
+            transport.close()
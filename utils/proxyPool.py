@@ -0,0 +1,549 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 代理池
+变量: PROXY_API_URL (代理api，返回txt文本，每行一个代理ip:端口)
+        PROXY_BATCH (每次批量获取的代理数，默认5，代理api带num、count等数量参数时改为该值，一次请求获取一批)
+        PROXY_TTL (代理有效期秒数，超过后不再分配，默认180)
+        PROXY_STICKY (填True则账号下次运行沿用同一个代理，代理过期或不可用时再换)
+        PROXY_STICKY_TTL (账号沿用同一代理的最长秒数，默认172800即两天，需大于两次运行的间隔)
+        LY_PROXY_DB (账号代理记录数据库文件，默认当前目录下ly_proxy_pool.db)
+说明: 后台批量获取代理并发检查，账号直接从池中租用检查过的代理，
+        获取、检查代理不再占用每个账号的执行时间
+        按延迟和失败率给代理打分，优先分配最快的代理，连续失败的代理剔除，账号归还的正常代理回到池中继续分配
+        可只让目标站点的请求走代理，其他请求直连，结束时输出代理和直连的流量统计
+        后台获取、检查代理的日志只输出到控制台，账号租不到代理时原因记到该账号的日志
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    代理延迟、失败率打分，优先分配最快的代理；账号可固定使用同一代理
+2026/10/18  V1.2    按域名分流，只有目标站点走代理，统计代理和直连流量
+2026/10/18  V1.3    多进程执行时子进程重新建立数据库连接
+2026/10/18  V1.4    批量获取改为一次请求提取多个代理，不再并发多次请求代理api
+2026/10/18  V1.5    归还的代理回到池中按分数分配；请求超时、连接失败计入失败率；固定代理单独设置有效期
+2026/10/18  V1.6    连续获取失败后新的账号租用时重新补充，没有代理时记到该账号的日志；后台获取、检查代理的日志不进入推送内容；代理api的响应按utf-8解码
+"""
+
+import os
+import re
+import sys
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+import traceback
+import contextlib
+from collections import deque
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+# 导入执行器，没有则后台线程的日志照常记录
+try:
+    from taskExecutor import AccountContext, current_account # type: ignore
+except ImportError:
+    AccountContext = current_account = None
+
+PROXY_BATCH = int(os.getenv("PROXY_BATCH") or 5) # 每次批量获取的代理数
+PROXY_TTL = int(os.getenv("PROXY_TTL") or 180) # 代理有效期秒数
+PROXY_API_TIMEOUT = 10 # 请求代理api的超时秒数
+PROXY_CHECK_TIMEOUT = 5 # 检查代理的超时秒数
+PROXY_MAX_FAILED_ROUNDS = 3 # 连续多少轮获取不到可用代理后放弃等待
+PROXY_STICKY = (os.getenv("PROXY_STICKY") or "").lower() in ("true", "1") # 账号是否固定使用同一代理
+PROXY_STICKY_TTL = int(os.getenv("PROXY_STICKY_TTL") or 172800) # 账号固定代理的有效期秒数
+PROXY_DB = os.getenv("LY_PROXY_DB") or "ly_proxy_pool.db" # 账号代理记录数据库文件
+PROXY_EWMA_ALPHA = 0.3 # 延迟、失败率EWMA的平滑系数
+PROXY_MAX_FAILURES = 3 # 连续失败多少次后剔除代理
+PROXY_PATTERN = re.compile(r"[\w.-]+:\d+") # 代理 ip:端口
+PROXY_COUNT_PARAMS = ("num", "count", "qty", "number", "amount") # 代理api中表示提取数量的参数名
+
+
+@contextlib.contextmanager
+def background_logs():
+    """
+    后台线程不属于任何账号，其中记录的账号日志只输出到控制台，不进入按账号合并的推送内容
+    """
+    if current_account is None:
+        yield
+        return
+    token = current_account.set(AccountContext(0, None))
+    try:
+        yield
+    finally:
+        current_account.reset(token)
+
+
+class ProxyLease:
+    """
+    租用的代理
+    """
+    def __init__(self, proxy, fetched_at, ttl):
+        self.proxy = proxy # ip:端口
+        self.fetched_at = fetched_at # 从api获取的时间
+        self.expires_at = fetched_at + ttl # 到期时间
+        self.latency = None # 延迟EWMA，秒
+        self.error_rate = 0.0 # 失败率EWMA
+        self.failures = 0 # 连续失败次数
+        self.lock = threading.Lock()
+
+    @property
+    def expired(self):
+        return time.time() >= self.expires_at
+
+    @property
+    def dead(self):
+        return self.failures >= PROXY_MAX_FAILURES
+
+    def record(self, ok, latency=None):
+        """
+        记录一次请求结果
+        :param ok: 是否成功
+        :param latency: 耗时秒数，失败时可为None
+        """
+        with self.lock:
+            alpha = PROXY_EWMA_ALPHA
+            if latency is not None:
+                self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+            self.error_rate = alpha * (0 if ok else 1) + (1 - alpha) * self.error_rate
+            self.failures = 0 if ok else self.failures + 1
+
+    def score(self):
+        """
+        选择分数，越小越优先；没有测过延迟的排在最后
+        """
+        if self.latency is None:
+            return float("inf")
+        return self.latency * (1 + 4 * self.error_rate)
+
+    @property
+    def proxies(self):
+        """
+        requests使用的代理配置
+        """
+        return {"http": f"http://{self.proxy}", "https": f"http://{self.proxy}"}
+
+
+class ProxyPool:
+    """
+    代理池
+    用法: pool = ProxyPool(api_url, check=self.check_proxy, log=self.log)
+        pool.start()
+        proxy = pool.lease(account=wx_id) # 检查过的代理ip:端口，没有可用代理为None
+        pool.apply(session, proxy, hosts=[self.host]) # 只有目标站点走代理，统计延迟和流量
+        pool.release(proxy, ok=True) # 正常的代理回到池中，按分数继续分配
+        pool.close()
+    """
+    def __init__(self, api_url, check=None, check_url=None, batch=None, ttl=None, log=None,
+                 script=None, sticky=None, path=None, sticky_ttl=None):
+        """
+        :param api_url: 代理api
+        :param check: 检查函数 check(proxy, session) -> 是否可用，一般为脚本的check_proxy
+        :param check_url: 没有检查函数时用于检查的地址，有响应即可用
+        :param batch: 每次批量获取的代理数，默认取环境变量PROXY_BATCH
+        :param ttl: 代理有效期秒数，默认取环境变量PROXY_TTL
+        :param log: 日志函数 log(msg, level)
+        :param script: 脚本标识，固定代理时区分不同脚本，默认取脚本文件名
+        :param sticky: 账号是否固定使用同一代理，默认取环境变量PROXY_STICKY
+        :param path: 账号代理记录数据库文件，默认取环境变量LY_PROXY_DB
+        :param sticky_ttl: 账号固定代理的有效期秒数，默认取环境变量PROXY_STICKY_TTL
+        """
+        self.api_url = api_url
+        self.check = check
+        self.check_url = check_url
+        self.batch = max(1, int(batch or PROXY_BATCH))
+        self.ttl = int(ttl or PROXY_TTL)
+        self.log = log or (lambda msg, level="info": getattr(logging, level, logging.info)(msg))
+        self.idle = deque() # 检查过、等待分配的代理
+        self.leases = {} # 已分配的代理 ip:端口 -> ProxyLease
+        self.waiting = 0 # 等待代理的账号数
+        self.demand = 1 # 上次补充后租用的次数，没有账号租用时不再补充，避免浪费代理
+        self.failed_rounds = 0 # 连续获取不到可用代理的轮数
+        self.last_error = None # 最近一次获取不到可用代理的原因
+        self.closed = False
+        self.cond = threading.Condition()
+        self.thread = None
+        self.script = script or os.path.splitext(os.path.basename(sys.argv[0] or "proxy"))[0]
+        self.sticky = PROXY_STICKY if sticky is None else sticky
+        self.sticky_ttl = int(sticky_ttl or PROXY_STICKY_TTL)
+        self.path = path or PROXY_DB
+        self._local = threading.local() # sqlite连接不能跨线程使用，每个线程一个
+        self.traffic = {"proxy": [0, 0], "direct": [0, 0]} # 线路 -> [请求数, 字节数]
+        self.traffic_lock = threading.Lock()
+        if self.sticky:
+            self._init_db()
+
+    def start(self):
+        """
+        启动后台补充线程，立即预取一批代理
+        """
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._refill_loop, name="proxy_pool", daemon=True)
+            self.thread.start()
+        return self
+
+    def close(self):
+        """
+        停止后台补充，输出流量统计
+        """
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        proxy_count, proxy_bytes = self.traffic["proxy"]
+        direct_count, direct_bytes = self.traffic["direct"]
+        if proxy_count or direct_count:
+            self.log(f"[代理池] 代理请求{proxy_count}次 {proxy_bytes / 1024:.1f}KB，"
+                     f"直连请求{direct_count}次 {direct_bytes / 1024:.1f}KB（节省的代理流量）")
+
+    def batch_url(self):
+        """
+        把代理api的提取数量参数改为批量数，一次请求提取一批代理
+        api没有数量参数时原样返回，每次提取的个数由api决定
+        :return: 代理api
+        """
+        parts = urlsplit(self.api_url)
+        query = parse_qsl(parts.query, keep_blank_values=True)
+        if not any(key.lower() in PROXY_COUNT_PARAMS for key, _ in query):
+            return self.api_url
+        query = [(key, str(self.batch) if key.lower() in PROXY_COUNT_PARAMS else value) for key, value in query]
+        return urlunsplit(parts._replace(query=urlencode(query)))
+
+    def fetch(self):
+        """
+        请求一次代理api
+        :return: 代理列表
+        """
+        response = requests.get(self.batch_url(), timeout=PROXY_API_TIMEOUT)
+        response.raise_for_status()
+        # 代理api多不返回编码，按response.text猜测编码时短文本可能被误判，ip:端口按utf-8解码即可
+        return PROXY_PATTERN.findall(response.content.decode("utf-8", errors="ignore"))
+
+    def fetch_batch(self):
+        """
+        批量获取代理：只请求一次代理api，按次计费的api不会被重复扣费，不够时由补充线程下一轮再取
+        :return: 去重后的代理列表
+        """
+        try:
+            proxies = self.fetch()
+        except Exception as e:
+            self.last_error = f"获取代理失败: {str(e)}"
+            self.log(f"[代理池] {self.last_error}", level="warning")
+            return []
+        return list(dict.fromkeys(proxies))
+
+    def check_proxy(self, proxy):
+        """
+        检查代理是否可用
+        :param proxy: ip:端口
+        :return: 是否可用
+        """
+        session = requests.Session()
+        session.proxies.update({"http": f"http://{proxy}", "https": f"http://{proxy}"})
+        try:
+            if self.check:
+                return bool(self.check(proxy, session))
+            if self.check_url:
+                return session.get(self.check_url, timeout=PROXY_CHECK_TIMEOUT).status_code < 500
+            return True
+        except Exception:
+            return False
+        finally:
+            session.close()
+
+    def probe(self, proxy):
+        """
+        检查代理并计时
+        :param proxy: ip:端口
+        :return: (是否可用, 耗时秒数)
+        """
+        start = time.monotonic()
+        ok = self.check_proxy(proxy)
+        return ok, time.monotonic() - start
+
+    def refill(self):
+        """
+        获取一批代理并发检查，可用的加入池中
+        :return: 新增的可用代理数
+        """
+        fetched_at = time.time()
+        with self.cond:
+            known = set(self.leases) | {lease.proxy for lease in self.idle}
+        candidates = [proxy for proxy in self.fetch_batch() if proxy not in known]
+        if not candidates:
+            return 0
+        def probe(proxy):
+            # 检查线程中脚本check_proxy的日志不进入推送内容
+            with background_logs():
+                return self.probe(proxy)
+        with ThreadPoolExecutor(max_workers=len(candidates), thread_name_prefix="proxy_check") as pool:
+            results = list(pool.map(probe, candidates))
+        alive = []
+        for proxy, (ok, latency) in zip(candidates, results):
+            if ok:
+                lease = ProxyLease(proxy, fetched_at, self.ttl)
+                lease.record(True, latency)
+                alive.append(lease)
+        self.log(f"[代理池] 获取{len(candidates)}个代理，{len(alive)}个可用")
+        if not alive:
+            self.last_error = f"获取的{len(candidates)}个代理都不可用"
+        with self.cond:
+            self.idle.extend(alive)
+            self.cond.notify_all()
+        return len(alive)
+
+    def _evict_expired(self):
+        """
+        丢弃已过期的空闲代理，调用时需持有锁
+        """
+        if any(lease.expired for lease in self.idle):
+            self.idle = deque(lease for lease in self.idle if not lease.expired)
+
+    def _need_refill(self):
+        self._evict_expired()
+        # 有账号在等待，或还有账号在租用且池中余量不足半批时补充
+        return self.waiting > len(self.idle) or (self.demand > 0 and len(self.idle) < (self.batch + 1) // 2)
+
+    def _refill_loop(self):
+        while True:
+            with self.cond:
+                while not self.closed and not self._need_refill():
+                    self.cond.wait(timeout=max(1, self.ttl / 4))
+                if self.closed:
+                    return
+            try:
+                with background_logs():
+                    added = self.refill()
+            except Exception as e:
+                logging.error(f"[代理池] 补充代理发生错误: {str(e)}\n{traceback.format_exc()}")
+                self.last_error = f"补充代理发生错误: {str(e)}"
+                added = 0
+            with self.cond:
+                self.demand = 0
+                self.failed_rounds = 0 if added else self.failed_rounds + 1
+                if added:
+                    self.last_error = None
+                self.cond.notify_all()
+            if not added:
+                # 代理api异常时稍等再试
+                time.sleep(min(10, self.failed_rounds * 2))
+
+    def lease(self, timeout=30, account=None):
+        """
+        租用一个检查过的代理，优先分配延迟最低的
+        :param timeout: 最长等待秒数
+        :param account: 账号标识，固定代理时用于沿用上次的代理
+        :return: ip:端口，没有可用代理为None，原因记到当前账号的日志
+        """
+        if self.sticky and account:
+            proxy = self._lease_sticky(account)
+            if proxy:
+                return proxy
+        self.start()
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            if self.failed_rounds >= PROXY_MAX_FAILED_ROUNDS:
+                # 之前的账号已放弃等待，新的账号租用时重新补充，代理api恢复后不会一直直连
+                self.failed_rounds = 0
+            self.waiting += 1
+            self.cond.notify_all()
+            try:
+                while True:
+                    self._evict_expired()
+                    if self.idle:
+                        lease = min(self.idle, key=lambda item: item.score())
+                        self.idle.remove(lease)
+                        self.leases[lease.proxy] = lease
+                        self.demand += 1
+                        self.cond.notify_all()
+                        if self.sticky and account:
+                            self._save_sticky(account, lease)
+                        return lease.proxy
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self.closed or self.failed_rounds >= PROXY_MAX_FAILED_ROUNDS:
+                        reason = f"（{self.last_error}）" if self.last_error else ""
+                        self.log(f"[代理池] 没有可用代理{reason}，本账号不使用代理", level="warning")
+                        return None
+                    self.cond.wait(timeout=remaining)
+            finally:
+                self.waiting -= 1
+
+    def get_lease(self, proxy):
+        """
+        获取代理的租用信息
+        :param proxy: ip:端口
+        :return: ProxyLease，不是从池中租用的为None
+        """
+        with self.cond:
+            return self.leases.get(proxy)
+
+    def apply(self, session, proxy, hosts=None):
+        """
+        给session设置代理，只有目标站点的请求走代理，其他请求直连
+        :param session: session
+        :param proxy: ip:端口
+        :param hosts: 走代理的域名列表，为空则全部请求走代理
+        """
+        hosts = [host for host in hosts or [] if host]
+        proxy_url = f"http://{proxy}"
+        for key in ("http", "https", "all"):
+            session.proxies.pop(key, None)
+        if hosts:
+            # requests按 协议://域名 匹配代理，未匹配的直连
+            for host in hosts:
+                session.proxies.update({f"http://{host}": proxy_url, f"https://{host}": proxy_url})
+        else:
+            session.proxies.update({"http": proxy_url, "https": proxy_url})
+        self.track(session, proxy, hosts)
+
+    def track(self, session, proxy, hosts=None):
+        """
+        按session的实际请求统计代理延迟、失败率和流量
+        超时、连接失败等没有响应的请求在session.send中记为失败
+        :param session: 使用该代理的session
+        :param proxy: ip:端口
+        :param hosts: 走代理的域名列表，为空则全部请求走代理
+        """
+        hosts = [host for host in hosts or [] if host]
+        send = session.send
+
+        def tracked_send(request, **kwargs):
+            try:
+                return send(request, **kwargs)
+            except requests.RequestException:
+                if not hosts or urlsplit(request.url).hostname in hosts:
+                    self.record(proxy, False)
+                raise
+
+        def hook(response, *args, **kwargs):
+            proxied = not hosts or urlsplit(response.url).hostname in hosts
+            body = response.request.body
+            size = len(response.content or b"") + (len(body) if isinstance(body, (bytes, str)) else 0)
+            with self.traffic_lock:
+                stat = self.traffic["proxy" if proxied else "direct"]
+                stat[0] += 1
+                stat[1] += size
+            if proxied:
+                self.record(proxy, response.status_code < 500, response.elapsed.total_seconds())
+        session.hooks["response"].append(hook)
+        session.send = tracked_send
+
+    def record(self, proxy, ok, latency=None):
+        """
+        记录一次使用代理的结果，连续失败的代理不再分配
+        :param proxy: ip:端口
+        :param ok: 是否成功
+        :param latency: 耗时秒数
+        """
+        with self.cond:
+            lease = self.leases.get(proxy)
+        if lease:
+            lease.record(ok, latency)
+
+    def release(self, proxy, ok=True, account=None):
+        """
+        账号用完代理后归还，正常且未过期的代理回到池中，按分数分配给其他账号
+        :param proxy: ip:端口
+        :param ok: 代理是否正常
+        :param account: 账号标识，代理不可用时不再固定给该账号
+        """
+        with self.cond:
+            lease = self.leases.pop(proxy, None)
+            if lease and ok and not lease.dead and not lease.expired and not self.closed:
+                self.idle.append(lease)
+                self.cond.notify_all()
+        if not lease:
+            return
+        if not ok:
+            lease.record(False)
+        if lease.dead or not ok:
+            self.log(f"[代理池] {proxy} 不可用，已剔除", level="warning")
+            if self.sticky and account:
+                self._remove_sticky(account)
+
+    def _conn(self):
+        """
+        获取当前线程的数据库连接
+        """
+        conn = getattr(self._local, 'conn', None)
+        # 多进程执行时子进程不能沿用父进程的连接
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError as e:
+            logging.warning(f"[代理池] 开启WAL失败，使用默认模式: {str(e)}")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS proxy_sticky ("
+            "script TEXT NOT NULL, account TEXT NOT NULL, proxy TEXT NOT NULL, "
+            "expires_at REAL NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (script, account))"
+        )
+        # 顺便清理过期代理
+        conn.execute("DELETE FROM proxy_sticky WHERE script = ? AND expires_at < ?", (self.script, time.time()))
+
+    @staticmethod
+    def _account_key(account):
+        """
+        账号标识取摘要，不保存token等原文
+        """
+        return hashlib.sha1(str(account).encode("utf-8")).hexdigest()[:16]
+
+    def _save_sticky(self, account, lease):
+        """
+        记录账号使用的代理，有效期按sticky_ttl计算，与池中代理的分配有效期无关，下次运行仍可沿用
+        """
+        now = time.time()
+        self._conn().execute(
+            "INSERT OR REPLACE INTO proxy_sticky (script, account, proxy, expires_at, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (self.script, self._account_key(account), lease.proxy, now + self.sticky_ttl, now)
+        )
+
+    def _remove_sticky(self, account):
+        self._conn().execute(
+            "DELETE FROM proxy_sticky WHERE script = ? AND account = ?", (self.script, self._account_key(account))
+        )
+
+    def _lease_sticky(self, account):
+        """
+        沿用账号上次的代理，过期、被占用或检查不可用时返回None
+        :param account: 账号标识
+        :return: ip:端口
+        """
+        row = self._conn().execute(
+            "SELECT proxy, expires_at FROM proxy_sticky WHERE script = ? AND account = ?",
+            (self.script, self._account_key(account))
+        ).fetchone()
+        if not row or row[1] <= time.time():
+            return None
+        proxy = row[0]
+        with self.cond:
+            if proxy in self.leases:
+                return None
+            lease = next((item for item in self.idle if item.proxy == proxy), None)
+            if lease:
+                self.idle.remove(lease)
+            else:
+                # 上次运行的代理，检查可用后重新计算分配有效期
+                lease = ProxyLease(proxy, time.time(), self.ttl)
+            self.leases[proxy] = lease
+        ok, latency = self.probe(proxy)
+        if not ok:
+            with self.cond:
+                self.leases.pop(proxy, None)
+            self._remove_sticky(account)
+            self.log(f"[代理池] 上次的代理 {proxy} 不可用，重新分配", level="warning")
+            return None
+        lease.record(True, latency)
+        self._save_sticky(account, lease)
+        self.log(f"[代理池] 沿用上次的代理 {proxy}")
+        return proxy
@@ -0,0 +1,178 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 按域名限流
+变量: LY_HOST_RATE (每个域名每秒请求数上限，格式 域名=次数，多个用换行或逗号分割，*为其他域名，
+        如 api.cdfsunrise.com=5,*=10，覆盖脚本中的默认值)
+说明: 令牌桶限流，同一脚本所有账号的请求共用每个域名的令牌桶，
+        多账号并发时总请求速率也不会超过站点的承受能力；多进程执行时各进程平分限额
+        同步请求在发送的线程中等待令牌，等待期间占用该线程：TaskExecutor的LY_CONCURRENCY个线程
+        都在等同一个域名的令牌时，其他域名的账号也要排队，限额低的域名建议单独调低并发数；
+        AsyncTaskExecutor的异步请求在事件循环中等待，不占用线程
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    增加acquire_async，异步执行引擎等待令牌时不阻塞事件循环
+2026/10/18  V1.2    多进程执行时各进程平分每个域名的限额，总速率不变
+2026/10/18  V1.3    说明同步请求等待令牌时占用执行器线程
+"""
+
+import os
+import time
+import asyncio
+import logging
+import threading
+from urllib.parse import urlsplit
+
+HOST_RATE = os.getenv("LY_HOST_RATE") or "" # 每个域名每秒请求数上限
+
+
+class RateLimiter:
+    """
+    令牌桶限流
+    """
+    def __init__(self, rate, burst=None):
+        """
+        :param rate: 每秒令牌数
+        :param burst: 桶容量，默认等于rate
+        """
+        self.rate = rate
+        self.capacity = max(1, burst or rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _take(self):
+        """
+        尝试取一个令牌
+        :return: 还需等待的秒数，0为已取到
+        """
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        取一个令牌，没有则等待
+        :return: 等待的秒数
+        """
+        waited = 0
+        while True:
+            wait_seconds = self._take()
+            if not wait_seconds:
+                return waited
+            time.sleep(wait_seconds)
+            waited += wait_seconds
+
+    async def acquire_async(self):
+        """
+        异步取一个令牌，等待期间执行其他协程
+        :return: 等待的秒数
+        """
+        waited = 0
+        while True:
+            wait_seconds = self._take()
+            if not wait_seconds:
+                return waited
+            await asyncio.sleep(wait_seconds)
+            waited += wait_seconds
+
+
+def parse_host_rates(value):
+    """
+    解析域名限流配置
+    :param value: 如 api.cdfsunrise.com=5,*=10
+    :return: {域名: 每秒次数}
+    """
+    rates = {}
+    for item in value.replace("\n", ",").split(","):
+        host, sep, rate = item.strip().partition("=")
+        if not sep:
+            continue
+        try:
+            rates[host.strip().lower()] = float(rate)
+        except ValueError:
+            logging.warning(f"[限流] 忽略无效配置: {item}")
+    return rates
+
+
+class HostRateLimiter:
+    """
+    按域名限流，每个域名一个令牌桶
+    用法: limiter = HostRateLimiter({"api.cdfsunrise.com": 5})
+        limiter.install(session) # 该session的所有请求先取令牌
+    """
+    def __init__(self, rates=None):
+        """
+        :param rates: 脚本默认的 {域名: 每秒次数}，*为其他域名，环境变量LY_HOST_RATE覆盖
+        """
+        self.rates = {host.lower(): rate for host, rate in (rates or {}).items()}
+        self.rates.update(parse_host_rates(HOST_RATE))
+        self.limiters = {} # 域名 -> 令牌桶
+        self.lock = threading.Lock()
+        self.waited = 0 # 累计等待秒数
+        self.pid = os.getpid()
+
+    def get_limiter(self, host):
+        """
+        获取域名的令牌桶，不限流的域名为None
+        :param host: 域名
+        """
+        host = (host or "").lower()
+        with self.lock:
+            if self.pid != os.getpid():
+                # 多进程执行的子进程，令牌桶重新按分到的限额创建
+                self.pid = os.getpid()
+                self.limiters = {}
+            if host not in self.limiters:
+                rate = self.rates.get(host, self.rates.get("*"))
+                if rate and rate > 0:
+                    # 执行器分片时设置LY_SHARD_COUNT为进程数
+                    rate /= int(os.getenv("LY_SHARD_COUNT") or 1)
+                self.limiters[host] = RateLimiter(rate) if rate and rate > 0 else None
+            return self.limiters[host]
+
+    def acquire(self, host):
+        """
+        请求该域名前取一个令牌
+        :param host: 域名
+        """
+        limiter = self.get_limiter(host)
+        if limiter:
+            waited = limiter.acquire()
+            if waited:
+                with self.lock:
+                    self.waited += waited
+
+    async def acquire_async(self, host):
+        """
+        异步请求该域名前取一个令牌
+        :param host: 域名
+        """
+        limiter = self.get_limiter(host)
+        if limiter:
+            waited = await limiter.acquire_async()
+            if waited:
+                with self.lock:
+                    self.waited += waited
+
+    def install(self, session):
+        """
+        让session的每个请求（包括重定向）先按域名取令牌
+        在发送请求的线程中sleep等待，不会让出给TaskExecutor的调度：等待期间该线程不执行其他账号，
+        所有线程都在等待时执行器整体暂停，相当于按令牌速率串行执行
+        :param session: session
+        :return: session
+        """
+        send = session.send
+
+        def limited_send(request, **kwargs):
+            self.acquire(urlsplit(request.url).hostname)
+            return send(request, **kwargs)
+        session.send = limited_send
+        return session
@@ -0,0 +1,135 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 共用连接池
+变量: LY_CONCURRENCY (同时执行的账号数，连接池每个域名至少保留这么多连接)
+    LY_HTTP2 (填True则脚本指定的接口域名使用HTTP/2，需要安装httpx[http2])
+说明: 所有账号的session共用一个连接池，同一域名的连接在账号之间复用，不用每个账号重新建立连接和握手
+        cookie、请求头、代理仍然是每个账号各自一份，账号结束时关闭session释放该账号的代理连接
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    可选接口域名使用HTTP/2，多个账号的请求共用一个连接
+2026/10/18  V1.2    多进程执行时子进程不沿用父进程的连接
+2026/10/18  V1.3    兼容旧站点的适配器只挂载到指定域名，其他域名使用默认的适配器
+"""
+
+import os
+import weakref
+import threading
+
+import requests
+from requests.utils import prepend_scheme_if_needed
+
+# 导入HTTP/2连接适配器，没有则只使用HTTP/1.1
+try:
+    from http2Adapter import Http2Adapter, HTTP2, httpx # type: ignore
+except ImportError:
+    Http2Adapter = None
+    HTTP2 = False
+    httpx = None
+
+CONCURRENCY = int(os.getenv("LY_CONCURRENCY") or 1) # 同时执行的账号数
+POOL_HOSTS = 10 # 保留连接池的域名数
+POOL_MAXSIZE = max(10, CONCURRENCY) # 每个域名保留的连接数
+
+
+class SharedSession(requests.Session):
+    """
+    使用共用连接池的session
+    关闭时只释放自己的代理连接，不关闭共用的连接池
+    """
+    def __init__(self, transport):
+        super().__init__()
+        self.transport = transport
+        self.mount("https://", transport.default_adapter)
+        self.mount("http://", transport.default_adapter)
+        for host in transport.adapter_hosts:
+            self.mount(f"https://{host}", transport.adapter)
+        for host in transport.http2_hosts:
+            self.mount(f"https://{host}", transport.http2_adapter)
+
+    def close(self):
+        transport, self.transport = self.transport, None
+        if transport is None:
+            return
+        transport.release(self)
+        # 共用的连接池不随账号关闭
+        self.adapters.clear()
+        self.cookies.clear()
+
+
+class SharedTransport:
+    """
+    共用连接池
+    用法: transport = SharedTransport(LegacyTLSAdapter, adapter_hosts=[self.host])
+        session = transport.session() # 用法与requests.Session()相同
+        ...
+        session.close() # 账号结束时关闭
+        transport.close() # 全部账号结束后关闭连接池
+    """
+    def __init__(self, adapter_class=None, pool_maxsize=None, http2_hosts=None, ssl_context=None, adapter_hosts=None):
+        """
+        :param adapter_class: 连接适配器类，默认requests.adapters.HTTPAdapter，需要兼容旧站点时传入LegacyTLSAdapter
+        :param pool_maxsize: 每个域名保留的连接数，默认取并发数，至少10
+        :param http2_hosts: LY_HTTP2为True时使用HTTP/2的域名列表
+        :param ssl_context: HTTP/2连接创建SSL上下文的函数，兼容旧站点时传入new_legacy_ssl_context
+        :param adapter_hosts: 使用adapter_class的域名列表，其他域名使用默认的适配器，为空则全部域名使用
+        """
+        pool_maxsize = pool_maxsize or POOL_MAXSIZE
+        self.default_adapter = requests.adapters.HTTPAdapter(pool_connections=POOL_HOSTS, pool_maxsize=pool_maxsize)
+        self.adapter_hosts = list(adapter_hosts or [])
+        if adapter_class and self.adapter_hosts:
+            # 兼容旧站点的安全级别和重协商只用于指定域名
+            self.adapter = adapter_class(pool_connections=POOL_HOSTS, pool_maxsize=pool_maxsize)
+        else:
+            if adapter_class:
+                self.default_adapter = adapter_class(pool_connections=POOL_HOSTS, pool_maxsize=pool_maxsize)
+            self.adapter = self.default_adapter
+            self.adapter_hosts = []
+        self.http2_hosts = list(http2_hosts or []) if HTTP2 and httpx else []
+        self.http2_adapter = Http2Adapter(pool_maxsize, ssl_context) if self.http2_hosts else None
+        self.sessions = weakref.WeakSet() # 未关闭的session
+        self.lock = threading.Lock()
+        self.pid = os.getpid()
+
+    def session(self):
+        """
+        创建使用共用连接池的session
+        :return: SharedSession
+        """
+        with self.lock:
+            if self.pid != os.getpid():
+                # 多进程执行的子进程，父进程的连接不能共用，关闭后重新建立
+                self.pid = os.getpid()
+                self.close()
+            session = SharedSession(self)
+            self.sessions.add(session)
+        return session
+
+    def release(self, session):
+        """
+        释放账号的代理连接，其他账号还在用的代理保留
+        :param session: 要关闭的session
+        """
+        with self.lock:
+            self.sessions.discard(session)
+            in_use = {proxy for other in self.sessions for proxy in other.proxies.values()}
+            for proxy in set(session.proxies.values()) - in_use:
+                for adapter in {self.default_adapter, self.adapter}:
+                    for key in {proxy, prepend_scheme_if_needed(proxy, "http")}:
+                        manager = adapter.proxy_manager.pop(key, None)
+                        if manager is not None:
+                            manager.clear()
+                if self.http2_adapter:
+                    self.http2_adapter.release(proxy)
+
+    def close(self):
+        """
+        关闭连接池
+        """
+        self.default_adapter.close()
+        if self.adapter is not self.default_adapter:
+            self.adapter.close()
+        if self.http2_adapter:
+            self.http2_adapter.close()
@@ -0,0 +1,512 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 多账号并发执行器
+变量: LY_CONCURRENCY (同时执行请求的账号数，默认1即按顺序执行)
+    LY_MAX_ACTIVE (同时在途的账号数，包括正在等待间隔的账号，默认为并发数的10倍)
+    LY_RESUME_WINDOW (断点续跑窗口秒数，上次运行中断后在该时间内重新运行则跳过已完成的账号，默认3600，0为不续跑)
+    LY_PROCESSES (执行账号的进程数，账号轮流分给各进程，每个进程按LY_CONCURRENCY并发，默认1即单进程，仅支持Linux)
+        子进程中的修改不会带回主进程，账号结果只保存在内存或JSON文件中的脚本需传processes=1
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    增加协作式间隔调度，等待间隔期间执行其他账号的步骤
+2026/10/18  V1.2    增加断点续跑日志，运行中断后重新运行从未完成的账号继续
+2026/10/18  V1.3    增加多进程分片执行，账号多时解析、加解密不再挤在一个CPU核上
+2026/10/18  V1.4    增加setup，预取code等后台线程在各进程fork之后启动；已有后台线程时不再fork，改为单进程执行
+"""
+
+import os
+import sys
+import json
+import time
+import pickle
+import weakref
+import heapq
+import hashlib
+import inspect
+import itertools
+import logging
+import threading
+import traceback
+import contextvars
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+CONCURRENCY = int(os.getenv("LY_CONCURRENCY") or 1) # 同时执行请求的账号数
+MAX_ACTIVE = int(os.getenv("LY_MAX_ACTIVE") or 0) # 同时在途的账号数，0为自动
+RESUME_WINDOW = int(os.getenv("LY_RESUME_WINDOW") or 3600) # 断点续跑窗口秒数
+PROCESSES = int(os.getenv("LY_PROCESSES") or 1) # 执行账号的进程数
+
+current_account = contextvars.ContextVar("current_account", default=None) # 当前线程正在执行的账号
+
+
+class AccountContext:
+    """
+    单个账号的运行上下文
+    账号级状态（昵称、token、openid等）都放在这里，不同账号互不覆盖
+    """
+    def __init__(self, index, account):
+        self.index = index # 账号序号，从1开始
+        self.account = account # check_env产出的账号数据
+        self.state = {} # AccountState属性的实际存储
+        self.pending_logs = {} # 待合并的日志 id(AccountLogs) -> (AccountLogs, [msg])
+        self.vars = contextvars.copy_context() # 账号专属的上下文变量，各步骤在其中执行
+        self.steps = None # 生成器任务的剩余步骤
+        self.step_count = 0 # 已执行的步骤数
+        self.skipped = False # 上次运行已完成，本次跳过
+        self.result = None
+        self.error = None
+
+
+class AccountState:
+    """
+    账号级属性
+    在执行器中读写时落到当前账号上下文，执行器外退回实例属性，兼容原有的顺序执行
+    用法: 在AutoTask类上声明 nickname = AccountState("")
+    """
+    def __init__(self, default=None):
+        self.default = default
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        ctx = current_account.get()
+        if ctx is None:
+            return instance.__dict__.get(self.name, self.default)
+        return ctx.state.get(self.name, self.default)
+
+    def __set__(self, instance, value):
+        ctx = current_account.get()
+        if ctx is None:
+            instance.__dict__[self.name] = value
+        else:
+            ctx.state[self.name] = value
+
+
+class AccountLogs(list):
+    """
+    按账号归并的日志列表
+    并发执行时各账号的日志先暂存在各自上下文，账号完成后按账号顺序整段追加，推送内容不会交错
+    """
+    instances = weakref.WeakValueDictionary() # id -> 日志列表，多进程执行时子进程按id把日志发回主进程
+
+    def __init__(self, *args):
+        super().__init__(*args)
+        self._lock = threading.Lock()
+        AccountLogs.instances[id(self)] = self
+
+    def append(self, msg):
+        ctx = current_account.get()
+        if ctx is None:
+            with self._lock:
+                super().append(msg)
+        else:
+            ctx.pending_logs.setdefault(id(self), (self, []))[1].append(msg)
+
+    def flush(self, msgs):
+        """
+        追加一个账号的全部日志
+        :param msgs: 日志列表
+        """
+        with self._lock:
+            self.extend(msgs)
+
+
+class RunJournal:
+    """
+    断点续跑日志
+    每个账号完成后追加一行并落盘，运行正常结束时删除；
+    运行中断（OOM、容器重启等）后在窗口期内重新运行，跳过日志中已完成的账号
+    """
+    def __init__(self, name, window=None, path=None):
+        """
+        :param name: 日志名，一般为脚本名和任务函数名
+        :param window: 续跑窗口秒数，默认取环境变量LY_RESUME_WINDOW
+        :param path: 日志文件，默认当前目录下ly_journal_{name}.jsonl
+        """
+        self.path = path or f"ly_journal_{name}.jsonl"
+        self.window = RESUME_WINDOW if window is None else window
+        self.finished = set() # 上次运行已完成的账号摘要
+        self._file = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def account_key(account):
+        """
+        账号摘要，日志中不保存token等原文
+        :param account: 账号数据
+        """
+        raw = json.dumps(account, ensure_ascii=False, sort_keys=True, default=str)
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()[:16]
+
+    def _load(self):
+        """
+        读取窗口期内的上次日志，过期则丢弃
+        """
+        try:
+            if time.time() - os.path.getmtime(self.path) > self.window:
+                os.remove(self.path)
+                return
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # 中断时写了一半的行
+                        continue
+                    if record.get('event') == "done":
+                        self.finished.add(record['account'])
+        except FileNotFoundError:
+            pass
+
+    def open(self):
+        """
+        打开日志，返回上次运行已完成的账号数
+        """
+        if self.window > 0:
+            self._load()
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._write({"event": "start", "time": time.time(), "resumed": len(self.finished)})
+        return len(self.finished)
+
+    def _write(self, record):
+        with self._lock:
+            self._file.write(json.dumps(record) + "\n")
+            self._file.flush()
+            os.fsync(self._file.fileno())
+
+    def is_finished(self, account):
+        return self.account_key(account) in self.finished
+
+    def finish(self, ctx):
+        """
+        记录账号完成
+        :param ctx: 账号上下文
+        """
+        self._write({"event": "done", "index": ctx.index, "account": self.account_key(ctx.account),
+                     "steps": ctx.step_count, "time": time.time()})
+
+    def close(self, completed):
+        """
+        关闭日志
+        :param completed: 是否全部执行完成，完成则删除日志
+        """
+        if self._file:
+            self._file.close()
+            self._file = None
+        if completed:
+            try:
+                os.remove(self.path)
+            except FileNotFoundError:
+                pass
+
+
+def run_paced(steps):
+    """
+    顺序执行生成器任务，按原样阻塞等待每个间隔
+    :param steps: 生成器任务，yield等待秒数
+    :return: 任务返回值
+    """
+    if not inspect.isgenerator(steps):
+        return steps
+    try:
+        while True:
+            time.sleep(next(steps) or 0)
+    except StopIteration as e:
+        return e.value
+
+
+class TaskExecutor:
+    """
+    多账号并发执行器
+    以有界线程池执行每个账号的任务，同时执行请求的账号数不超过concurrency
+
+    任务函数可以是普通函数，也可以是生成器：把 time.sleep(random.randint(3, 5))
+    写成 yield random.randint(3, 5)，间隔随机数不变，等待期间线程去执行其他账号的步骤，
+    每个账号两步之间的实际间隔不小于yield的秒数
+    """
+    def __init__(self, worker, concurrency=None, max_active=None, resume=False, processes=None, setup=None):
+        """
+        :param worker: 单账号任务函数 worker(index, account)
+        :param concurrency: 并发数，默认取环境变量LY_CONCURRENCY
+        :param max_active: 在途账号数，默认取环境变量LY_MAX_ACTIVE
+        :param resume: 是否记录断点续跑日志，上次中断时跳过已完成的账号
+        :param processes: 进程数，默认取环境变量LY_PROCESSES
+        :param setup: 在执行账号的进程中、第一个账号开始前调用 setup(accounts)，用于启动预取code等后台线程，
+                      多进程时在fork之后调用，accounts只有该进程要执行的账号（不含上次已完成的）；
+                      返回值有close方法时全部账号结束后关闭
+        """
+        self.worker = worker
+        self.resume = resume
+        self.setup = setup
+        self.processes = max(1, int(processes or PROCESSES))
+        self._sharded = False # 是否为多进程执行的子进程
+        self._crashed = False # 是否有子进程异常退出
+        self.concurrency = max(1, int(concurrency or CONCURRENCY))
+        if self.concurrency == 1:
+            # 默认保持原来的逐个执行
+            self.max_active = max(1, int(max_active or MAX_ACTIVE or 1))
+        else:
+            self.max_active = max(self.concurrency, int(max_active or MAX_ACTIVE or self.concurrency * 10))
+        self._flush_lock = threading.Lock()
+        self._finished = {} # 已完成但前面还有账号未完成的上下文
+        self._next_flush = 1 # 下一个待合并日志的账号序号
+
+    def _flush_logs(self, ctx):
+        """
+        按账号顺序合并日志
+        :param ctx: 刚完成的账号上下文
+        """
+        if self._sharded:
+            # 子进程中日志随结果发回主进程合并
+            return
+        with self._flush_lock:
+            self._finished[ctx.index] = ctx
+            while self._next_flush in self._finished:
+                done = self._finished.pop(self._next_flush)
+                for logs, msgs in done.pending_logs.values():
+                    logs.flush(msgs)
+                done.pending_logs.clear()
+                self._next_flush += 1
+
+    def _step(self, ctx):
+        """
+        在账号上下文中执行账号的下一步
+        :param ctx: 账号上下文
+        :return: (是否完成, 下一步前的等待秒数)
+        """
+        current_account.set(ctx)
+        try:
+            ctx.step_count += 1
+            if ctx.steps is None:
+                result = self.worker(ctx.index, ctx.account)
+                if not inspect.isgenerator(result):
+                    ctx.result = result
+                    return True, 0
+                ctx.steps = result
+            return False, next(ctx.steps) or 0
+        except StopIteration as e:
+            ctx.result = e.value
+            return True, 0
+        except Exception as e:
+            ctx.error = e
+            logging.error(f"[账号{ctx.index}] 执行过程中发生错误: {str(e)}\n{traceback.format_exc()}")
+            return True, 0
+        finally:
+            current_account.set(None)
+
+    def journal_name(self):
+        """
+        断点续跑日志名：脚本名_任务函数名
+        """
+        script = os.path.splitext(os.path.basename(sys.argv[0] or ""))[0] or "task"
+        return f"{script}_{getattr(self.worker, '__name__', 'worker')}"
+
+    def run(self, accounts):
+        """
+        执行所有账号
+        :param accounts: 账号可迭代对象，一般为check_env()
+        :return: 按账号顺序排列的账号上下文列表
+        """
+        journal = RunJournal(self.journal_name()) if self.resume else None
+        if journal and journal.open():
+            logging.info(f"[断点续跑] 上次运行未完成，跳过已完成的{len(journal.finished)}个账号")
+        completed = False
+        try:
+            if self.processes > 1 and "fork" in multiprocessing.get_all_start_methods() and self._can_fork():
+                contexts = self._run_processes(list(enumerate(accounts, 1)), journal)
+            else:
+                contexts = self._execute(enumerate(accounts, 1), journal)
+            # 有子进程异常退出时保留断点续跑日志，重新运行只执行未完成的账号
+            completed = not self._crashed
+            return contexts
+        finally:
+            if journal:
+                journal.close(completed)
+
+    @staticmethod
+    def _can_fork():
+        """
+        是否可以fork：已有后台线程时子进程会继承它们持有的锁和未完成的状态，可能永久阻塞
+        """
+        threads = [thread.name for thread in threading.enumerate() if thread is not threading.current_thread()]
+        if threads:
+            logging.warning(f"[多进程] 已有后台线程 {', '.join(threads)}，改为单进程执行，"
+                            f"预取code、代理池等后台线程请放到TaskExecutor的setup中启动")
+            return False
+        return True
+
+    def _execute(self, accounts, journal):
+        """
+        在当前进程执行账号，先调用setup启动该进程用到的后台线程
+        :param accounts: (序号, 账号)可迭代对象
+        :param journal: 断点续跑日志，不续跑为None
+        :return: 按账号顺序排列的账号上下文列表
+        """
+        resource = None
+        if self.setup:
+            accounts = list(accounts)
+            resource = self.setup([account for _, account in accounts if not (journal and journal.is_finished(account))])
+        try:
+            return self._run(accounts, journal)
+        finally:
+            if hasattr(resource, "close"):
+                resource.close()
+
+    def _run(self, accounts, journal):
+        """
+        调度执行所有账号
+        :param accounts: (序号, 账号)可迭代对象
+        :param journal: 断点续跑日志，不续跑为None
+        :return: 按账号顺序排列的账号上下文列表
+        """
+        contexts = []
+        self._finished = {}
+        self._next_flush = 1
+        accounts = iter(accounts)
+        exhausted = False
+        active = 0
+        waiting = [] # 等待间隔的账号 (可执行时间, 序号, 上下文)
+        order = itertools.count()
+        running = {} # 执行中的步骤 future -> 上下文
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="account") as pool:
+            while True:
+                # 补充在途账号，避免一次性展开全部账号
+                while not exhausted and active < self.max_active:
+                    try:
+                        index, account = next(accounts)
+                    except StopIteration:
+                        exhausted = True
+                        break
+                    ctx = AccountContext(index, account)
+                    contexts.append(ctx)
+                    if journal and journal.is_finished(account):
+                        # 上次已完成，占位以保持日志顺序
+                        ctx.skipped = True
+                        self._flush_logs(ctx)
+                        continue
+                    active += 1
+                    heapq.heappush(waiting, (time.monotonic(), next(order), ctx))
+                # 到点的账号交给空闲线程
+                now = time.monotonic()
+                while waiting and waiting[0][0] <= now and len(running) < self.concurrency:
+                    _, _, ctx = heapq.heappop(waiting)
+                    running[pool.submit(ctx.vars.run, self._step, ctx)] = ctx
+                if not running and not waiting:
+                    if exhausted:
+                        break
+                    continue
+                timeout = None
+                if waiting and len(running) < self.concurrency:
+                    timeout = max(0, waiting[0][0] - now)
+                if not running:
+                    time.sleep(timeout)
+                    continue
+                done, _ = wait(running, timeout=timeout, return_when=FIRST_COMPLETED)
+                for future in done:
+                    ctx = running.pop(future)
+                    finished, delay = future.result()
+                    if finished:
+                        active -= 1
+                        if journal and ctx.error is None:
+                            journal.finish(ctx)
+                        self._flush_logs(ctx)
+                    else:
+                        heapq.heappush(waiting, (time.monotonic() + delay, next(order), ctx))
+        return contexts
+
+    def _run_processes(self, accounts, journal):
+        """
+        多进程分片执行：账号按序号轮流分给各进程，每个进程用自己的执行器并发执行，
+        结束后把结果和日志发回主进程，按账号顺序合并，推送内容与单进程相同
+        凭据、台账等SQLite存储由各进程直接写入同一个数据库
+        :param accounts: [(序号, 账号)]
+        :param journal: 断点续跑日志，不续跑为None
+        :return: 按账号顺序排列的账号上下文列表
+        """
+        self._crashed = False
+        processes = min(self.processes, len(accounts))
+        if processes <= 1:
+            return self._execute(accounts, journal)
+        logging.info(f"[多进程] {len(accounts)}个账号分给{processes}个进程执行")
+        # fork启动，子进程直接继承脚本实例，任务函数不需要能序列化
+        mp = multiprocessing.get_context("fork")
+        shards = []
+        for shard_index in range(processes):
+            shard = accounts[shard_index::processes]
+            reader, writer = mp.Pipe(duplex=False)
+            process = mp.Process(target=self._run_shard, args=(shard, journal, writer, processes),
+                                 name=f"shard_{shard_index + 1}")
+            process.start()
+            writer.close()
+            shards.append((process, reader, shard))
+        records = {}
+        for process, reader, shard in shards:
+            try:
+                for record in reader.recv():
+                    records[record['index']] = record
+            except EOFError:
+                pass
+            reader.close()
+            process.join()
+            if process.exitcode:
+                self._crashed = True
+                logging.error(f"[多进程] 进程{process.name}异常退出，退出码{process.exitcode}")
+        contexts = []
+        self._finished = {}
+        self._next_flush = 1
+        for index, account in accounts:
+            ctx = AccountContext(index, account)
+            record = records.get(index)
+            if record is None:
+                ctx.error = RuntimeError("执行该账号的进程异常退出")
+            else:
+                ctx.skipped = record['skipped']
+                ctx.step_count = record['step_count']
+                ctx.result = record['result']
+                ctx.error = record['error']
+                for logs_id, msgs in record['logs']:
+                    logs = AccountLogs.instances.get(logs_id)
+                    if logs is not None:
+                        ctx.pending_logs[logs_id] = (logs, msgs)
+            contexts.append(ctx)
+            self._flush_logs(ctx)
+        return contexts
+
+    def _run_shard(self, accounts, journal, writer, processes):
+        """
+        子进程：执行分到的账号，把结果和日志发回主进程
+        :param accounts: [(序号, 账号)]
+        :param journal: 断点续跑日志，完成的账号由子进程直接记录
+        :param writer: 发回结果的管道
+        :param processes: 进程数，按域名限流时各进程平分限额
+        """
+        self._sharded = True
+        os.environ["LY_SHARD_COUNT"] = str(processes)
+        records = []
+        for ctx in self._execute(accounts, journal):
+            records.append({
+                "index": ctx.index,
+                "skipped": ctx.skipped,
+                "step_count": ctx.step_count,
+                "result": _picklable(ctx.result),
+                "error": _picklable(ctx.error, RuntimeError(str(ctx.error))),
+                "logs": [(id(logs), msgs) for logs, msgs in ctx.pending_logs.values()],
+            })
+        writer.send(records)
+        writer.close()
+
+
+def _picklable(value, default=None):
+    """
+    能跨进程发送的值原样返回，否则返回default
+    """
+    try:
+        pickle.dumps(value)
+        return value
+    except Exception:
+        return default
@@ -0,0 +1,132 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 每日任务台账
+变量: LY_TASK_LEDGER_DB (任务台账数据库文件，默认当前目录下ly_task_ledger.db，所有脚本共用)
+        LY_FORCE_TASKS (填True则忽略台账，所有任务重新执行)
+说明: 按 (脚本, 账号, 日期, 步骤) 记录当天已完成的任务步骤，
+        一天多次定时运行时，后面的运行只做还没完成的步骤
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    多进程执行时子进程重新建立数据库连接
+"""
+
+import os
+import time
+import hashlib
+import sqlite3
+import logging
+import threading
+from datetime import datetime, timedelta
+
+LEDGER_DB = os.getenv("LY_TASK_LEDGER_DB") or "ly_task_ledger.db" # 任务台账数据库文件
+FORCE_TASKS = (os.getenv("LY_FORCE_TASKS") or "").lower() in ("true", "1") # 是否忽略台账
+KEEP_DAYS = 7 # 台账保留天数
+
+
+class TaskLedger:
+    """
+    每日任务台账
+    用法: ledger = TaskLedger("zmrs")
+        if not ledger.is_done(account, "signin"):
+            if self.signin(session):
+                ledger.mark_done(account, "signin")
+    """
+    def __init__(self, script, path=None, force=None):
+        """
+        :param script: 脚本标识
+        :param path: 数据库文件，默认取环境变量LY_TASK_LEDGER_DB
+        :param force: 是否忽略台账，默认取环境变量LY_FORCE_TASKS
+        """
+        self.script = script
+        self.path = path or LEDGER_DB
+        self.force = FORCE_TASKS if force is None else force
+        self._local = threading.local() # sqlite连接不能跨线程使用，每个线程一个
+        self._init_db()
+
+    def _conn(self):
+        """
+        获取当前线程的数据库连接
+        """
+        conn = getattr(self._local, 'conn', None)
+        # 多进程执行时子进程不能沿用父进程的连接
+        if conn is None or getattr(self._local, 'pid', None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def _init_db(self):
+        conn = self._conn()
+        try:
+            conn.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.DatabaseError as e:
+            logging.warning(f"[任务台账] 开启WAL失败，使用默认模式: {str(e)}")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS task_ledger ("
+            "script TEXT NOT NULL, account TEXT NOT NULL, day TEXT NOT NULL, step TEXT NOT NULL, "
+            "count INTEGER NOT NULL, updated_at REAL NOT NULL, "
+            "PRIMARY KEY (script, account, day, step))"
+        )
+        # 顺便清理过期台账
+        expired_day = (datetime.now() - timedelta(days=KEEP_DAYS)).strftime("%Y-%m-%d")
+        conn.execute("DELETE FROM task_ledger WHERE script = ? AND day < ?", (self.script, expired_day))
+
+    @staticmethod
+    def _today():
+        return datetime.now().strftime("%Y-%m-%d")
+
+    @staticmethod
+    def _account_key(account):
+        """
+        账号标识取摘要，台账中不保存token等原文
+        :param account: 账号标识（微信id、token等）
+        """
+        return hashlib.sha1(str(account).encode("utf-8")).hexdigest()[:16]
+
+    def count(self, account, step):
+        """
+        今天该步骤已完成的次数，忽略台账时为0
+        :param account: 账号标识
+        :param step: 步骤名
+        :return: 次数
+        """
+        if self.force:
+            return 0
+        row = self._conn().execute(
+            "SELECT count FROM task_ledger WHERE script = ? AND account = ? AND day = ? AND step = ?",
+            (self.script, self._account_key(account), self._today(), step)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def is_done(self, account, step):
+        """
+        今天该步骤是否已完成
+        :param account: 账号标识
+        :param step: 步骤名
+        """
+        return self.count(account, step) > 0
+
+    def all_done(self, account, steps):
+        """
+        今天这些步骤是否都已完成
+        :param account: 账号标识
+        :param steps: 步骤名列表
+        """
+        return all(self.is_done(account, step) for step in steps)
+
+    def mark_done(self, account, step, count=1):
+        """
+        记录步骤完成，可重复的步骤（如抽奖）累加次数
+        :param account: 账号标识
+        :param step: 步骤名
+        :param count: 本次完成的次数
+        """
+        self._conn().execute(
+            "INSERT INTO task_ledger (script, account, day, step, count, updated_at) VALUES (?, ?, ?, ?, ?, ?) "
+            "ON CONFLICT (script, account, day, step) DO UPDATE SET count = count + excluded.count, updated_at = excluded.updated_at",
+            (self.script, self._account_key(account), self._today(), step, count, time.time())
+        )
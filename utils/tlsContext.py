@@ -0,0 +1,136 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 共用TLS上下文
+说明: 兼容旧站点的SSL上下文（SECLEVEL=1、允许不安全的旧版重协商），整个进程共用一个，
+        并按线路和域名缓存TLS会话，后面的账号经同一线路连接同一域名时复用会话，省去完整握手；
+        线路直连时为服务器地址，走代理时为代理地址，不同代理的账号不共用会话票据，站点无法借此关联账号
+        LegacyTLSAdapter为使用该上下文的requests适配器，只挂载到需要兼容的站点上
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    增加new_legacy_ssl_context，HTTP/2连接握手时会修改ALPN，需要单独的上下文
+2026/10/18  V1.2    增加LegacyTLSAdapter，脚本不再各自复制TLSAdapter的改动
+2026/10/18  V1.3    TLS会话按(线路, 域名)缓存，走不同代理的连接不复用同一个会话
+"""
+
+import ssl
+import weakref
+import threading
+
+import requests
+
+OP_LEGACY_SERVER_CONNECT = getattr(ssl, "OP_LEGACY_SERVER_CONNECT", 0x4) # 解决unsafe legacy renegotiation disabled
+
+
+class ResumingSSLContext(ssl.SSLContext):
+    """
+    按线路和域名复用TLS会话的SSL上下文
+    TLS1.3的会话票据在握手后才下发，所以每次新建连接时从同一线路、同一域名的上一个连接取最新的会话
+    """
+    def __new__(cls, *args, **kwargs):
+        context = super().__new__(cls, *args, **kwargs)
+        context._tls_lock = threading.Lock()
+        context._tls_sessions = {} # (线路, 域名) -> 可复用的会话
+        context._tls_sockets = {} # (线路, 域名) -> 上一个连接（弱引用）
+        context._tls_loaded = set() # 已加载的证书，避免每个连接重复加载
+        context.resumed = 0 # 复用会话的握手次数
+        context.handshakes = 0 # 总握手次数
+        return context
+
+    @staticmethod
+    def _route(sock):
+        """
+        连接的线路：直连时为服务器地址，经代理隧道时为代理地址
+        :return: (ip, 端口)，取不到时为None
+        """
+        try:
+            return tuple(sock.getpeername()[:2])
+        except (OSError, AttributeError, TypeError):
+            return None
+
+    def _latest_session(self, key):
+        """
+        获取该线路、域名可复用的会话，调用时需持有锁
+        """
+        ref = self._tls_sockets.get(key)
+        sock = ref() if ref else None
+        if sock is not None:
+            try:
+                session = sock.session
+            except (OSError, ValueError):
+                session = None
+            if session is not None and session.has_ticket:
+                self._tls_sessions[key] = session
+        return self._tls_sessions.get(key)
+
+    def wrap_socket(self, sock, *args, server_hostname=None, session=None, **kwargs):
+        # 取不到线路时不复用，避免把一个代理上的会话票据带到另一个代理
+        route = self._route(sock) if server_hostname else None
+        key = (route, server_hostname) if route else None
+        if key and session is None:
+            with self._tls_lock:
+                session = self._latest_session(key)
+        # 服务端不接受会话时自动完整握手
+        ssock = super().wrap_socket(sock, *args, server_hostname=server_hostname, session=session, **kwargs)
+        if server_hostname:
+            with self._tls_lock:
+                self.handshakes += 1
+                if getattr(ssock, "session_reused", False):
+                    self.resumed += 1
+                if key:
+                    self._tls_sockets[key] = weakref.ref(ssock)
+        return ssock
+
+    def load_verify_locations(self, cafile=None, capath=None, cadata=None):
+        # requests每个连接都会传入证书路径，同一个证书只加载一次
+        key = (cafile, capath, cadata if isinstance(cadata, str) else None)
+        with self._tls_lock:
+            if cadata is None or isinstance(cadata, str):
+                if key in self._tls_loaded:
+                    return
+                self._tls_loaded.add(key)
+        super().load_verify_locations(cafile, capath, cadata)
+
+
+_legacy_context = None
+_legacy_context_lock = threading.Lock()
+
+
+def new_legacy_ssl_context():
+    """
+    创建一个兼容旧站点的SSL上下文
+    :return: ResumingSSLContext
+    """
+    ctx = ResumingSSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    ctx.load_default_certs()
+    ctx.set_ciphers("DEFAULT@SECLEVEL=1")
+    ctx.options |= OP_LEGACY_SERVER_CONNECT
+    return ctx
+
+
+def legacy_ssl_context():
+    """
+    获取共用的兼容旧站点的SSL上下文，第一次调用时创建
+    :return: ResumingSSLContext
+    """
+    global _legacy_context
+    with _legacy_context_lock:
+        if _legacy_context is None:
+            _legacy_context = new_legacy_ssl_context()
+        return _legacy_context
+
+
+class LegacyTLSAdapter(requests.adapters.HTTPAdapter):
+    """
+    兼容旧站点的适配器，直连和走代理的连接都使用共用的SSL上下文
+    解决unsafe legacy renegotiation disabled
+    用法: session.mount("https://xapi.weimob.com", LegacyTLSAdapter())
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        kwargs["ssl_context"] = legacy_ssl_context()
+        return super().init_poolmanager(*args, **kwargs)
+
+    def proxy_manager_for(self, proxy, **proxy_kwargs):
+        proxy_kwargs["ssl_context"] = legacy_ssl_context()
+        return super().proxy_manager_for(proxy, **proxy_kwargs)
@@ -4,36 +4,693 @@
 name: 微信协议适配器
 变量: soy_wxid_data (微信id) 多个账号用换行分割 
         soy_codetoken_data (微信授权token)
-        soy_codeurl_data (微信授权url)
+        soy_codeurl_data (微信授权url，可填多个用换行分割，token按行对应，只填一个token则共用)
+        WX_CODE_POOL_SIZE (每个协议地址保持的连接数，默认10)
+        WX_CODE_RETRIES (连接失败、协议服务502/503/504时的重试次数，默认2)
+        WX_CODE_MAX_IN_FLIGHT (批量获取code时同时请求的数量，默认等于连接数)
+        WX_CODE_PREFETCH (预取code时领先执行器的账号数，默认5)
+        WX_CODE_TTL (code有效期秒数，默认300)
+        WX_ACCOUNTS_CACHE_TTL (WeChatPadPro/iwechat账号列表缓存秒数，默认600，0为不缓存)
+        WX_ACCOUNTS_CACHE_FILE (账号列表缓存文件，默认与适配器同目录，所有脚本共用)
+        WX_CODE_BROKER (本地code代理服务地址，如 http://127.0.0.1:18688，见wechatCodeBroker.py，未运行时自动改为本进程获取)
 定时: 一天两次
 cron: 10 11,12 * * *
 ------------------------------------------------------------
 更新日志:
 2025/7/22   V1.0    初始化
 2025/7/27   V1.1    适配StarBot Pro
+2026/10/18  V1.2    日志按账号归并，适配多账号并发执行
+2026/10/18  V1.3    每个协议地址复用连接池，不再每次请求重新握手
+2026/10/18  V1.4    增加批量获取code
+2026/10/18  V1.5    增加code预取，临近过期的code丢弃重取
+2026/10/18  V1.6    账号列表缓存到本地文件，多个脚本共用，缺少wxid时自动刷新
+2026/10/18  V1.7    账号列表建立wxid索引，执行前检查没有授权码的wxid
+2026/10/18  V1.8    相同wxid、appid同时获取code时合并为一次请求
+2026/10/18  V1.9    支持通过本地code代理服务获取code
+2026/10/18  V1.10   支持多个协议地址，按延迟和错误率选择，失败自动切换
+2026/10/18  V1.11   协议改为注册类，初始化时确定协议，新增协议不用修改分发逻辑
+2026/10/18  V1.12   多进程执行时子进程不沿用父进程的连接和在途请求，等待合并的请求超时后单独请求
+2026/10/18  V1.13   预取code的日志暂存，账号取走code时记到该账号名下
+2026/10/18  V1.14   多个协议地址时忽略token中的空行，没有token时各地址沿用原值
+2026/10/18  V1.15   协议请求时才从适配器取连接池会话，子进程不沿用父进程的连接
 """
 
 import requests
 import os
+import json
+import time
+import hashlib
 import logging
+import threading
 import traceback
+import contextlib
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None # Windows下没有文件锁，只做进程内去重
+
+try:
+    from taskExecutor import AccountLogs, AccountContext, current_account # type: ignore
+except ImportError:
+    AccountLogs = list # 单独使用适配器时没有执行器
+    AccountContext = current_account = None
+
+POOL_SIZE = int(os.getenv("WX_CODE_POOL_SIZE") or 10) # 每个协议地址保持的连接数
+RETRIES = int(os.getenv("WX_CODE_RETRIES") or 2) # 重试次数
+MAX_IN_FLIGHT = int(os.getenv("WX_CODE_MAX_IN_FLIGHT") or 0) # 批量获取code时同时请求的数量，0为等于连接数
+PREFETCH_AHEAD = int(os.getenv("WX_CODE_PREFETCH") or 5) # 预取code时领先执行器的账号数
+CODE_TTL = int(os.getenv("WX_CODE_TTL") or 300) # code有效期秒数，小程序code一般5分钟过期
+CODE_REFRESH_MARGIN = 60 # code剩余有效期不足该秒数则丢弃重取
+ACCOUNTS_CACHE_TTL = int(os.getenv("WX_ACCOUNTS_CACHE_TTL") or 600) # 账号列表缓存秒数
+ACCOUNTS_CACHE_FILE = os.getenv("WX_ACCOUNTS_CACHE_FILE") or os.path.join(os.path.dirname(os.path.abspath(__file__)), "wx_accounts_cache.json")
+ACCOUNTS_MIN_REFRESH = 30 # 缺少wxid触发刷新的最小间隔秒数，避免多个缺失的wxid反复请求
+BROKER_URL = (os.getenv("WX_CODE_BROKER") or "").rstrip("/") # 本地code代理服务地址
+ENDPOINT_EWMA_ALPHA = 0.3 # 协议地址延迟、错误率的平滑系数
+ENDPOINT_MAX_FAILURES = 3 # 协议地址连续失败该次数后暂停使用
+ENDPOINT_COOLDOWN = 60 # 协议地址暂停使用的秒数
+FLIGHT_TIMEOUT = 60 # 等待合并的在途请求的最长秒数
+
+class CodeEndpoint:
+    """
+    一个协议地址
+    保存该地址的协议类型、账号列表，以及用于选择地址的延迟、错误率统计
+    """
+    def __init__(self, url, token):
+        self.url = url
+        self.token = token
+        self.protocol = None # 协议实例，初始化适配器时按url解析
+        self.accounts_list = [] # 账号列表
+        self.accounts_index = {} # 微信id -> 授权码
+        self.accounts_lock = threading.Lock() # 账号列表刷新锁
+        self.accounts_refreshed_at = 0 # 账号列表上次刷新时间
+        self.accounts_loaded_at = 0 # 当前使用的账号列表的获取时间
+        self.latency = None # 延迟EWMA，秒
+        self.error_rate = 0.0 # 错误率EWMA
+        self.failures = 0 # 连续失败次数
+        self.down_until = 0 # 暂停使用到该时间
+        self.lock = threading.Lock()
+
+    def record(self, ok, latency):
+        """
+        记录一次请求结果
+        :param ok: 是否成功
+        :param latency: 耗时秒数
+        """
+        with self.lock:
+            alpha = ENDPOINT_EWMA_ALPHA
+            self.latency = latency if self.latency is None else alpha * latency + (1 - alpha) * self.latency
+            self.error_rate = alpha * (0 if ok else 1) + (1 - alpha) * self.error_rate
+            if ok:
+                self.failures = 0
+                self.down_until = 0
+            else:
+                self.failures += 1
+                if self.failures >= ENDPOINT_MAX_FAILURES:
+                    self.down_until = time.monotonic() + ENDPOINT_COOLDOWN
+
+    def healthy(self):
+        return time.monotonic() >= self.down_until
+
+    @property
+    def protocol_type(self):
+        return self.protocol.type if self.protocol else 0
+
+    def score(self):
+        """
+        选择分数，越小越优先；没有测过的地址优先试一次
+        """
+        if self.latency is None:
+            return 0
+        return self.latency * (1 + 4 * self.error_rate)
+
+
+PROTOCOLS = {} # 协议url结尾 -> 协议类
+
+
+def register_protocol(cls):
+    """
+    注册协议，按协议url的结尾识别
+    用法: 在CodeProtocol子类上加 @register_protocol
+    """
+    PROTOCOLS[cls.url_suffix] = cls
+    return cls
+
+
+def dict_keys_to_lower(obj):
+    """
+    递归将字典的所有键名转为小写
+    """
+    if isinstance(obj, dict):
+        return {k.lower(): dict_keys_to_lower(v) for k, v in obj.items()}
+    elif isinstance(obj, list):
+        return [dict_keys_to_lower(i) for i in obj]
+    else:
+        return obj
+
+
+class CodeProtocolError(Exception):
+    """
+    协议返回了错误信息，只记录信息不记录堆栈
+    """
+
+
+class CodeProtocol:
+    """
+    微信授权协议
+    每个协议地址初始化时解析出一个协议实例，持有该地址的延迟、错误率统计，请求时从适配器取连接池会话，
+    之后取code直接调用，不再判断协议类型
+    子类实现build_request、parse，需要账号列表的再实现fetch_accounts
+    """
+    type = 0 # 协议类型
+    name = "未知协议"
+    url_suffix = None # 协议url的结尾
+    needs_accounts = False # 是否需要账号授权码列表
+
+    def __init__(self, adapter, endpoint):
+        """
+        :param adapter: 微信授权适配器
+        :param endpoint: 协议地址
+        """
+        self.adapter = adapter
+        self.endpoint = endpoint
+
+    @property
+    def session(self):
+        """
+        该地址的连接池会话，每次从适配器获取，fork出的子进程不沿用父进程的连接
+        """
+        return self.adapter.get_session(self.endpoint.url) if self.endpoint.url else None
+
+    def build_request(self, wx_id):
+        """
+        构造获取code的请求
+        :param wx_id: 微信id
+        :return: (请求地址, requests参数)
+        """
+        raise CodeProtocolError("发生错误: 未知协议类型")
+
+    def parse(self, response_json):
+        """
+        解析获取code的响应
+        :param response_json: 响应json
+        :return: (code, 错误信息)
+        """
+        return False, None
+
+    def request_code(self, wx_id):
+        """
+        请求code，失败抛出异常
+        :param wx_id: 微信id
+        :return: code
+        """
+        url, kwargs = self.build_request(wx_id)
+        response = self.session.post(url, timeout=5, **kwargs)
+        response.raise_for_status()
+        code, error = self.parse(response.json())
+        if not code:
+            raise CodeProtocolError(f"失败，错误信息: {error or '未获取到code'}")
+        return code
+
+    def get_code(self, wx_id):
+        """
+        获取code并记录到协议地址的统计
+        :param wx_id: 微信id
+        :return: code，失败为False
+        """
+        start = time.monotonic()
+        try:
+            with self.adapter.use_endpoint(self.endpoint):
+                code = self.request_code(wx_id)
+        except CodeProtocolError as e:
+            self.adapter.log(f"[获取code] {str(e)}", level="error")
+            code = False
+        except requests.RequestException as e:
+            self.adapter.log(f"[获取code] {self.name}发生网络错误: {str(e)}\n{traceback.format_exc()}", level="error")
+            code = False
+        except Exception as e:
+            self.adapter.log(f"[获取code] {self.name}发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
+            code = False
+        self.endpoint.record(bool(code), time.monotonic() - start)
+        return code
+
+    def fetch_accounts(self):
+        """
+        获取账号授权码列表
+        :return: 账号授权码列表
+        """
+        return []
+
+
+@register_protocol
+class YjcProtocol(CodeProtocol):
+    """
+    养鸡场
+    """
+    type = 1
+    name = "养鸡场"
+    url_suffix = "getMiniProgramCode"
+
+    def build_request(self, wx_id):
+        headers = {
+            "Authorization": self.endpoint.token,
+            "Content-Type": "application/json"
+        }
+        payload = {"wxid": wx_id, "appid": self.adapter.wx_appid}
+        return self.endpoint.url, {"headers": headers, "json": payload}
+
+    def parse(self, response_json):
+        # 将所有键名转为小写
+        response_json = dict_keys_to_lower(response_json)
+        if response_json['code'] == 200:
+            return response_json['data']['code'], None
+        return False, response_json.get('msg', '未知错误')
+
+
+@register_protocol
+class NiuziProtocol(CodeProtocol):
+    """
+    牛子
+    """
+    type = 2
+    name = "牛子"
+    url_suffix = "code"
+
+    def build_request(self, wx_id):
+        headers = {
+            "Content-Type": "application/json"
+        }
+        payload = {"wxid": wx_id, "appid": self.adapter.wx_appid}
+        return self.endpoint.url, {"headers": headers, "json": payload}
+
+    def parse(self, response_json):
+        # 将所有键名转为小写
+        response_json = dict_keys_to_lower(response_json)
+        # 直接取授权code，不判断返回码code
+        code = response_json.get('data', {}).get('code', '')
+        if code:
+            return code, None
+        return False, response_json.get('message')
+
+
+class JsLoginProtocol(CodeProtocol):
+    """
+    通过 /applet/JsLogin 获取code的协议，需要先按wxid取到授权码
+    """
+    needs_accounts = True
+
+    def __init__(self, adapter, endpoint):
+        super().__init__(adapter, endpoint)
+        self.code_url = (endpoint.url or "").split("/admin")[0] + "/applet/JsLogin"
+
+    def build_request(self, wx_id):
+        target_key = self.adapter.get_account_key(wx_id)
+        if not self.endpoint.accounts_list:
+            raise CodeProtocolError("账号列表为空，未能获取到")
+        params = {
+            "key": target_key
+        }
+        payload = {
+            "AppId": self.adapter.wx_appid,
+            "Data": "",
+            "Opt": 1,
+            "PackageName": "",
+            "SdkName": ""
+        }
+        return self.code_url, {"params": params, "json": payload}
+
+    def parse(self, response_json):
+        if response_json.get('Code') == 200:
+            return response_json.get('Data', {}).get('Code', ''), None
+        return False, response_json.get('Text')
+
+
+@register_protocol
+class WeChatPadProProtocol(JsLoginProtocol):
+    """
+    WeChatPadPro
+    """
+    type = 3
+    name = "WeChatPadPro"
+    url_suffix = "GetAllDevices"
+
+    def fetch_accounts(self):
+        try:
+            params = {
+                "key": self.endpoint.token
+            }
+            response = self.session.get(self.endpoint.url, params=params, timeout=15)
+            response.raise_for_status()
+            response_json = response.json()
+            if response_json.get('Code') == 200:
+                all_devices = response_json.get('Data', {}).get('devices', [])
+                if all_devices:
+                    return all_devices
+                else:
+                    self.adapter.log(f"[获取账号授权码列表] 返回信息: {response_json['Text']}", level="error")
+                    return []
+            else:
+                self.adapter.log(f"[获取账号授权码列表] 失败，错误信息: {response_json['Text']}", level="error")
+                return []
+        except Exception as e:
+            self.adapter.log(f"[获取账号授权码列表] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
+            return []
+
+
+@register_protocol
+class IwechatProtocol(JsLoginProtocol):
+    """
+    iwechat
+    """
+    type = 4
+    name = "iwechat"
+    url_suffix = "GetAuthKey"
+
+    def fetch_accounts(self):
+        try:
+            params = {
+                "key": self.endpoint.token
+            }
+            response = self.session.get(self.endpoint.url, params=params, timeout=15)
+            response.raise_for_status()
+            return response.json()
+        except Exception as e:
+            self.adapter.log(f"[获取账号授权码列表] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
+            return []
+
+
+@register_protocol
+class StarBotProProtocol(CodeProtocol):
+    """
+    StarBot Pro
+    """
+    type = 5
+    name = "StarBot Pro"
+    url_suffix = "processor"
+
+    def build_request(self, wx_id):
+        headers = {
+            "Authorization": self.endpoint.token,
+            "Content-Type": "application/json"
+        }
+        payload = {
+            "type": "querySmallProgramCode",
+            "params": {
+                "robotId": wx_id,
+                "appid": self.adapter.wx_appid
+            }
+        }
+        return self.endpoint.url, {"headers": headers, "json": payload}
+
+    def parse(self, response_json):
+        if response_json.get('code') == 200:
+            return response_json.get('data', {}).get('code', ''), None
+        return False, response_json.get('description')
+
+
+class CodeFlight:
+    """
+    一次在途的code请求，相同请求的调用方等待同一个结果
+    """
+    def __init__(self):
+        self.event = threading.Event()
+        self.code = False
+        self.error = None
+
+
+class CodePrefetcher:
+    """
+    code预取器
+    后台始终领先执行器ahead个账号获取code，记录获取时间，临近过期的code丢弃重取；
+    code只能使用一次，取出后即从缓存删除；
+    预取时的日志先暂存，账号取走code时再记到该账号名下，推送内容仍按账号顺序
+    """
+    def __init__(self, adapter, wx_ids, ahead=None, ttl=None, margin=None):
+        """
+        :param adapter: 微信协议适配器
+        :param wx_ids: 按执行顺序排列的微信id
+        :param ahead: 领先的账号数，默认取WX_CODE_PREFETCH
+        :param ttl: code有效期秒数，默认取WX_CODE_TTL
+        :param margin: 剩余有效期不足该秒数则重取
+        """
+        self.adapter = adapter
+        self.wx_ids = list(dict.fromkeys(wx_ids))
+        self.ahead = max(1, int(ahead or PREFETCH_AHEAD))
+        self.ttl = ttl or CODE_TTL
+        self.margin = CODE_REFRESH_MARGIN if margin is None else margin
+        self.codes = {} # wx_id -> (code, 获取时间)
+        self.logs = {} # wx_id -> 预取时暂存的日志 [(日志列表, [msg])]
+        self.taken = set() # 已被执行器取走的微信id
+        self.pending = set() # 正在获取的微信id
+        self.head = 0 # wx_ids中第一个未取走的位置
+        self.closed = False
+        self.cond = threading.Condition()
+        self.threads = []
+
+    def start(self):
+        """
+        启动后台预取线程
+        :return: self
+        """
+        workers = min(self.ahead, self.adapter.max_in_flight, len(self.wx_ids))
+        for i in range(workers):
+            thread = threading.Thread(target=self._worker, name=f"wx_code_prefetch_{i}", daemon=True)
+            thread.start()
+            self.threads.append(thread)
+        return self
+
+    def close(self):
+        """
+        停止预取，未使用的code直接丢弃
+        """
+        with self.cond:
+            self.closed = True
+            self.codes.clear()
+            self.logs.clear()
+            self.cond.notify_all()
+
+    def _is_fresh(self, acquired_at):
+        return time.monotonic() - acquired_at < self.ttl - self.margin
+
+    def _next_target(self):
+        """
+        找出预取窗口内需要获取或重取的微信id，调用方需持有锁
+        :return: (微信id或None, 最早需要重取的等待秒数或None)
+        """
+        while self.head < len(self.wx_ids) and self.wx_ids[self.head] in self.taken:
+            self.head += 1
+        wait_seconds = None
+        count = 0
+        for wx_id in self.wx_ids[self.head:]:
+            if count >= self.ahead:
+                break
+            if wx_id in self.taken:
+                continue
+            count += 1
+            if wx_id in self.pending:
+                continue
+            cached = self.codes.get(wx_id)
+            if cached is None:
+                return wx_id, None
+            remain = self.ttl - self.margin - (time.monotonic() - cached[1])
+            if remain <= 0:
+                # 临近过期，丢弃重取
+                del self.codes[wx_id]
+                return wx_id, None
+            wait_seconds = remain if wait_seconds is None else min(wait_seconds, remain)
+        return None, wait_seconds
+
+    def _worker(self):
+        """
+        后台预取线程
+        """
+        while True:
+            with self.cond:
+                while not self.closed:
+                    wx_id, wait_seconds = self._next_target()
+                    if wx_id:
+                        break
+                    self.cond.wait(wait_seconds)
+                if self.closed:
+                    return
+                self.pending.add(wx_id)
+            code, logs = self._fetch(wx_id)
+            with self.cond:
+                self.pending.discard(wx_id)
+                if not self.closed:
+                    if code:
+                        self.codes[wx_id] = (code, time.monotonic())
+                    if logs:
+                        self.logs.setdefault(wx_id, []).extend(logs)
+                self.cond.notify_all()
+
+    def _fetch(self, wx_id):
+        """
+        在暂存上下文中获取code，预取线程不属于任何账号，日志不能直接写入推送内容
+        :param wx_id: 微信id
+        :return: (code, 暂存的日志)
+        """
+        if current_account is None:
+            return self.adapter.get_code(wx_id), []
+        ctx = AccountContext(0, wx_id)
+        token = current_account.set(ctx)
+        try:
+            return self.adapter.get_code(wx_id), list(ctx.pending_logs.values())
+        finally:
+            current_account.reset(token)
+
+    def get(self, wx_id, timeout=30):
+        """
+        取出指定微信id的code，缓存中没有可用code时等待在途请求或直接获取
+        :param wx_id: 微信id
+        :param timeout: 等待在途请求的最长秒数
+        :return: code
+        """
+        with self.cond:
+            self.taken.add(wx_id)
+            self.cond.notify_all()
+            deadline = time.monotonic() + timeout
+            while wx_id in self.pending and not self.closed:
+                remain = deadline - time.monotonic()
+                if remain <= 0:
+                    break
+                self.cond.wait(remain)
+            cached = self.codes.pop(wx_id, None)
+            buffered = self.logs.pop(wx_id, [])
+        # 在取code的账号上下文中补记预取日志
+        for logs, msgs in buffered:
+            for msg in msgs:
+                logs.append(msg)
+        if cached and self._is_fresh(cached[1]):
+            return cached[0]
+        return self.adapter.get_code(wx_id)
+
 
 class WechatCodeAdapter:
-    def __init__(self, wx_appid):
+    _flights = {} # (协议地址, 微信id, 小程序id) -> 在途请求，同一进程内所有适配器共用
+    _flights_lock = threading.Lock()
+
+    def __init__(self, wx_appid, use_broker=True):
         """
         初始化微信授权适配器
+        :param wx_appid: 微信小程序id
+        :param use_broker: 是否使用本地code代理服务（代理服务自身为False）
         """
-        self.wx_code_url = os.getenv("soy_codeurl_data")
-        self.wx_code_token = os.getenv("soy_codetoken_data")
+        self._current = threading.local() # 当前线程正在使用的协议地址
+        self.endpoints = self._parse_endpoints(os.getenv("soy_codeurl_data"), os.getenv("soy_codetoken_data"))
         self.wx_appid = wx_appid # 微信小程序id
-        self.wx_protocol_type = 0 # 微信协议类型
-        self.wx_accounts_list = [] # 微信账号列表
-        self.log_msgs = []  # 日志收集
+        self.log_msgs = AccountLogs()  # 日志收集
+        self.pool_size = POOL_SIZE # 每个协议地址保持的连接数
+        self.retries = RETRIES # 重试次数
+        self.max_in_flight = MAX_IN_FLIGHT or POOL_SIZE # 批量获取code时同时请求的数量
+        self._last_error = threading.local() # 当前线程最近一次错误日志
+        self.broker_url = "" # 可用的本地code代理服务地址
+        self._broker_lock = threading.Lock()
+        self._sessions = {} # 协议地址 -> 连接池会话
+        self._sessions_lock = threading.Lock()
+        self._sessions_pid = os.getpid() # 创建连接池的进程
         self._init_protocol_type()
-        self._init_all_accounts()
+        if use_broker:
+            self._init_broker()
+        if not self.broker_url:
+            self._init_all_accounts()
+            if len(self.endpoints) > 1:
+                self.probe_endpoints()
         self.setup_logging()
 
+    @staticmethod
+    def _parse_endpoints(urls, tokens):
+        """
+        解析协议地址，多个地址用换行分割，token按行对应，只有一个token时共用
+        :param urls: soy_codeurl_data
+        :param tokens: soy_codetoken_data
+        :return: 协议地址列表
+        """
+        url_list = [url.strip() for url in (urls or "").split("\n") if url.strip()]
+        if len(url_list) <= 1:
+            return [CodeEndpoint(url_list[0] if url_list else urls, tokens)]
+        token_list = [token.strip() for token in (tokens or "").split("\n") if token.strip()]
+        if not token_list:
+            return [CodeEndpoint(url, tokens) for url in url_list]
+        return [CodeEndpoint(url, token_list[min(i, len(token_list) - 1)]) for i, url in enumerate(url_list)]
+
+    def _endpoint(self):
+        """
+        当前线程正在使用的协议地址，默认第一个
+        """
+        return getattr(self._current, 'endpoint', None) or self.endpoints[0]
+
+    @contextlib.contextmanager
+    def use_endpoint(self, endpoint):
+        """
+        在当前线程中切换协议地址，wx_code_url等属性随之切换
+        :param endpoint: 协议地址
+        """
+        previous = getattr(self._current, 'endpoint', None)
+        self._current.endpoint = endpoint
+        try:
+            yield endpoint
+        finally:
+            self._current.endpoint = previous
+
+    @property
+    def wx_code_url(self):
+        return self._endpoint().url
+
+    @wx_code_url.setter
+    def wx_code_url(self, value):
+        self._endpoint().url = value
+
+    @property
+    def wx_code_token(self):
+        return self._endpoint().token
+
+    @wx_code_token.setter
+    def wx_code_token(self, value):
+        self._endpoint().token = value
+
+    @property
+    def wx_protocol_type(self):
+        return self._endpoint().protocol_type
+
+    @property
+    def wx_accounts_list(self):
+        return self._endpoint().accounts_list
+
+    @property
+    def wx_accounts_index(self):
+        return self._endpoint().accounts_index
+
+    def probe_endpoints(self):
+        """
+        探测所有协议地址的连通性和延迟，顺便建立连接
+        """
+        def probe(endpoint):
+            parts = urlsplit(endpoint.url or "")
+            base_url = f"{parts.scheme}://{parts.netloc}/"
+            start = time.monotonic()
+            try:
+                # 任何HTTP响应都说明地址可达
+                self.get_session(base_url).get(base_url, timeout=3)
+                endpoint.record(True, time.monotonic() - start)
+            except Exception as e:
+                endpoint.record(False, time.monotonic() - start)
+                self.log(f"[协议探测] {endpoint.url} 不可用: {str(e)}", level="warning")
+        with ThreadPoolExecutor(max_workers=len(self.endpoints), thread_name_prefix="wx_code_probe") as pool:
+            list(pool.map(probe, self.endpoints))
+
+    def select_endpoints(self):
+        """
+        按优先级排列协议地址：健康的按延迟和错误率排序，暂停中的放最后兜底
+        :return: 协议地址列表
+        """
+        return sorted(self.endpoints, key=lambda endpoint: (not endpoint.healthy(), endpoint.score()))
+
     def setup_logging(self):
         """
         配置日志系统
@@ -53,150 +710,278 @@ class WechatCodeAdapter:
             logging.info(msg)
         elif level == "error":
             logging.error(msg)
+            self._last_error.msg = msg
         elif level == "warning":
             logging.warning(msg)
         self.log_msgs.append(msg)
 
-    def get_protocol_type(self):
+    def get_session(self, url):
         """
-        获取协议类型
-        :return: 协议类型
+        获取协议地址对应的连接池会话，同一地址的请求复用keep-alive连接
+        :param url: 请求地址
+        :return: 会话
         """
-        if self.wx_code_url:
-            end_url = self.wx_code_url.split("/")[-1]
-        else:
-            end_url = ""
-        if end_url == "getMiniProgramCode":
-            # 养鸡场
-            return 1
-        elif end_url == "code":
-            # 牛子
-            return 2
-        elif end_url == "GetAllDevices":
-            # WeChatPadPro
-            return 3
-        elif end_url == "GetAuthKey":
-            # iwechat
-            return 4
-        elif end_url == "processor":
-            # StarBot Pro
-            return 5
-        else:
-            # 其他不知道的协议
-            return 0
+        parts = urlsplit(url)
+        endpoint = f"{parts.scheme}://{parts.netloc}"
+        with self._sessions_lock:
+            if self._sessions_pid != os.getpid():
+                # 多进程执行的子进程，父进程的连接不能共用，直接丢弃重新建立
+                self._sessions_pid = os.getpid()
+                self._sessions = {}
+            session = self._sessions.get(endpoint)
+            if session is None:
+                # 只重试连接失败和网关错误，这些情况请求没有到达协议，不会浪费code
+                retry = Retry(
+                    total=self.retries,
+                    connect=self.retries,
+                    read=0,
+                    status=self.retries,
+                    status_forcelist=(502, 503, 504),
+                    allowed_methods=frozenset(["GET", "POST"]),
+                    backoff_factor=0.3,
+                    raise_on_status=False
+                )
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+                session = requests.Session()
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[endpoint] = session
+            return session
 
-    def _init_protocol_type(self):
+    def close(self):
         """
-        初始化微信协议类型
-        """
-        self.wx_protocol_type = self.get_protocol_type()
-        
-    def dict_keys_to_lower(self, obj):
+        关闭所有连接池会话
         """
-        递归将字典的所有键名转为小写
+        with self._sessions_lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+    def _init_broker(self):
         """
-        if isinstance(obj, dict):
-            return {k.lower(): self.dict_keys_to_lower(v) for k, v in obj.items()}
-        elif isinstance(obj, list):
-            return [self.dict_keys_to_lower(i) for i in obj]
-        else:
-            return obj
-        
-    def get_code_1(self, wx_id):
-        """
-        养鸡场 获取code
-        :param wx_id: 微信id
-        :return: code
+        检查本地code代理服务是否可用，可用则code、账号列表都交给代理服务
         """
+        if not BROKER_URL:
+            return
         try:
-            url = self.wx_code_url
-            headers = {
-                "Authorization": self.wx_code_token,
-                "Content-Type": "application/json"
-            }
-            payload = {"wxid": wx_id, "appid": self.wx_appid}
-            response = requests.post(url, headers=headers, json=payload, timeout=5)
+            response = self.get_session(BROKER_URL).get(f"{BROKER_URL}/health", timeout=2)
             response.raise_for_status()
-            # 将所有键名转为小写
-            response_json = self.dict_keys_to_lower(response.json())
-            if response_json['code'] == 200:
-                return response_json['data']['code']
-            else:
-                self.log(f"[微信授权] 失败，错误信息: {response_json.get('msg', '未知错误')}", level="error")
-                return False
-        except requests.RequestException as e:
-            self.log(f"[微信授权]发生网络错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return False
+            self.broker_url = BROKER_URL
         except Exception as e:
-            self.log(f"[微信授权]发生未知错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return False
-    
-    def get_code_2(self, wx_id):
+            self.log(f"[code代理] {BROKER_URL} 未运行，改为本进程获取code: {str(e)}", level="warning")
+
+    def _broker_fallback(self, e):
+        """
+        代理服务中途不可用，改为本进程获取
+        :param e: 异常
+        """
+        with self._broker_lock:
+            if not self.broker_url:
+                return
+            self.log(f"[code代理] 请求失败，改为本进程获取code: {str(e)}", level="warning")
+            self.broker_url = ""
+        self._init_all_accounts()
+
+    def get_code_from_broker(self, wx_id):
         """
-        牛子 获取code
+        通过本地code代理服务获取code
         :param wx_id: 微信id
-        :return: code
+        :return: code，代理服务不可用时返回None
         """
         try:
-            url = self.wx_code_url
-            headers = {
-                "Content-Type": "application/json"
-            }
+            url = f"{self.broker_url}/code"
             payload = {"wxid": wx_id, "appid": self.wx_appid}
-            response = requests.post(url, headers=headers, json=payload, timeout=5)
+            response = self.get_session(url).post(url, json=payload, timeout=30)
             response.raise_for_status()
-            # 将所有键名转为小写
-            response_json = self.dict_keys_to_lower(response.json())
-            # 直接取授权code，不判断返回码code
-            code_value = response_json.get('data', {}).get('code', '')
-            if code_value:
-                code = code_value
-                return code
-            else:
-                self.log(f"[微信授权] 失败，错误信息: {response_json['message']}", level="error")
-                return False
-        except requests.RequestException as e:
-            self.log(f"[微信授权]发生网络错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return False
+            response_json = response.json()
         except Exception as e:
-            self.log(f"[微信授权]发生未知错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return False
+            self._broker_fallback(e)
+            return None
+        if response_json.get('code'):
+            return response_json['code']
+        self.log(f"[code代理] 获取code失败: {response_json.get('error', '未知错误')}", level="error")
+        return False
+
+    def get_protocol_type(self):
+        """
+        获取协议类型
+        :return: 协议类型
+        """
+        return self.resolve_protocol(self.wx_code_url).type
+
+    @staticmethod
+    def resolve_protocol(url):
+        """
+        按协议url的结尾查找协议类
+        :param url: 协议url
+        :return: 协议类，不认识的协议为CodeProtocol
+        """
+        end_url = url.split("/")[-1] if url else ""
+        return PROTOCOLS.get(end_url, CodeProtocol)
+
+    def _init_protocol_type(self):
+        """
+        初始化每个协议地址的协议实例
+        """
+        for endpoint in self.endpoints:
+            endpoint.protocol = self.resolve_protocol(endpoint.url)(self, endpoint)
 
     def _init_all_accounts(self):
         """
         初始化微信账号列表
         """
-        if self.wx_protocol_type == 3:
-            self.wx_accounts_list = self.get_all_devices()
-        elif self.wx_protocol_type == 4:
-            self.wx_accounts_list = self.get_auth_keys()
-        
-    def get_all_devices(self):
+        for endpoint in self.endpoints:
+            with self.use_endpoint(endpoint):
+                if endpoint.protocol.needs_accounts:
+                    self.set_accounts_list(self.load_accounts_list())
+
+    def set_accounts_list(self, accounts):
+        """
+        设置账号列表并建立 微信id -> 授权码 索引
+        WeChatPadPro为deviceId/authKey，iwechat为wx_id/license，只在加载时判断一次
+        :param accounts: 账号授权码列表
+        """
+        if isinstance(accounts, dict):
+            accounts = accounts.get('Data') or accounts.get('data') or []
+        index = {}
+        for account in accounts or []:
+            if not isinstance(account, dict):
+                continue
+            _wx_id = account.get('deviceId') or account.get('wx_id')
+            if _wx_id and _wx_id not in index:
+                index[_wx_id] = account.get('authKey') or account.get('license')
+        endpoint = self._endpoint()
+        endpoint.accounts_list = accounts or []
+        endpoint.accounts_index = index
+
+    def fetch_accounts_list(self):
+        """
+        从协议获取账号授权码列表
+        :return: 账号授权码列表
+        """
+        return self._endpoint().protocol.fetch_accounts()
+
+    def _read_accounts_cache(self):
+        """
+        读取账号列表缓存文件
+        :return: 缓存内容
+        """
+        try:
+            with open(ACCOUNTS_CACHE_FILE, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _write_accounts_cache(self, cache):
+        """
+        写入账号列表缓存文件，先写临时文件再替换，其他脚本不会读到半个文件
+        :param cache: 缓存内容
+        """
+        tmp_path = f"{ACCOUNTS_CACHE_FILE}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(cache, f, ensure_ascii=False)
+        os.replace(tmp_path, ACCOUNTS_CACHE_FILE)
+
+    def load_accounts_list(self, force=False):
         """
-        WeChatPadPro 获取账号授权码列表
+        获取账号授权码列表，优先使用未过期的本地缓存
+        多个脚本同时启动时通过文件锁排队，只有第一个请求协议，其余直接读缓存
+        :param force: 是否强制刷新（缺少wxid时），其他脚本在本次读取之后已刷新过则直接用缓存
         :return: 账号授权码列表
         """
+        if ACCOUNTS_CACHE_TTL <= 0:
+            return self.fetch_accounts_list()
+        cache_key = hashlib.sha1(f"{self.wx_code_url}|{self.wx_code_token}".encode("utf-8")).hexdigest()
+        lock_file = None
         try:
-            url = self.wx_code_url
-            params = {
-                "key": self.wx_code_token
-            }
-            response = requests.get(url, params=params, timeout=15)
-            response.raise_for_status()
-            response_json = response.json()
-            if response_json.get('Code') == 200:
-                all_devices = response_json.get('Data', {}).get('devices', [])
-                if all_devices:
-                    return all_devices
+            if fcntl:
+                lock_file = open(f"{ACCOUNTS_CACHE_FILE}.lock", "a")
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            entry = self._read_accounts_cache().get(cache_key)
+            if entry:
+                if force:
+                    # 其他脚本已经在我们之后刷新过，直接用
+                    fresh = entry['time'] > self._endpoint().accounts_loaded_at
                 else:
-                    self.log(f"[获取账号授权码列表] 返回信息: {response_json['Text']}", level="error")
-                    return []
-            else:
-                self.log(f"[获取账号授权码列表] 失败，错误信息: {response_json['Text']}", level="error")
-                return []
-        except Exception as e:
-            self.log(f"[获取账号授权码列表] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
+                    fresh = time.time() - entry['time'] < ACCOUNTS_CACHE_TTL
+                if fresh:
+                    self._endpoint().accounts_loaded_at = entry['time']
+                    return entry['accounts']
+            accounts = self.fetch_accounts_list()
+            if accounts:
+                cache = self._read_accounts_cache()
+                # 顺便清理过期条目
+                cache = {k: v for k, v in cache.items() if time.time() - v.get('time', 0) < ACCOUNTS_CACHE_TTL}
+                self._endpoint().accounts_loaded_at = time.time()
+                cache[cache_key] = {"time": self._endpoint().accounts_loaded_at, "accounts": accounts}
+                self._write_accounts_cache(cache)
+            elif entry:
+                # 协议异常时沿用旧缓存
+                self.log(f"[获取账号授权码列表] 刷新失败，使用缓存", level="warning")
+                return entry['accounts']
+            return accounts
+        except OSError as e:
+            self.log(f"[获取账号授权码列表] 缓存文件读写失败: {str(e)}", level="warning")
+            return self.fetch_accounts_list()
+        finally:
+            if lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+                lock_file.close()
+
+    def refresh_accounts_list(self):
+        """
+        缺少wxid时刷新账号列表
+        """
+        endpoint = self._endpoint()
+        with endpoint.accounts_lock:
+            if time.monotonic() - endpoint.accounts_refreshed_at < ACCOUNTS_MIN_REFRESH:
+                return
+            endpoint.accounts_refreshed_at = time.monotonic()
+            accounts = self.load_accounts_list(force=True)
+            if accounts:
+                self.set_accounts_list(accounts)
+
+    def get_account_key(self, wx_id):
+        """
+        获取指定微信id的授权码，列表中没有则刷新一次再找
+        :param wx_id: 微信id
+        :return: 授权码
+        """
+        if wx_id not in self.wx_accounts_index:
+            self.refresh_accounts_list()
+        return self.wx_accounts_index.get(wx_id)
+
+    def check_wx_ids(self, wx_ids):
+        """
+        执行前检查哪些微信id在协议中没有授权码，有缺失时先刷新一次账号列表
+        只对需要账号列表的协议（WeChatPadPro、iwechat）有效
+        :param wx_ids: 微信id列表
+        :return: 没有授权码的微信id列表
+        """
+        # 有不需要账号列表的协议地址时，任何wxid都可能取到code
+        if not all(endpoint.protocol.needs_accounts for endpoint in self.endpoints):
             return []
+        if self.broker_url:
+            try:
+                url = f"{self.broker_url}/check"
+                response = self.get_session(url).post(url, json={"wxids": list(wx_ids), "appid": self.wx_appid}, timeout=30)
+                response.raise_for_status()
+                missing = response.json().get('missing', [])
+                for wx_id in missing:
+                    self.log(f"[检查授权] {wx_id} 在协议中没有授权码，请先登录该微信", level="warning")
+                return missing
+            except Exception as e:
+                self._broker_fallback(e)
+        missing = list(wx_ids)
+        for endpoint in self.endpoints:
+            with self.use_endpoint(endpoint):
+                missing = [wx_id for wx_id in missing if not self.wx_accounts_index.get(wx_id)]
+                if missing:
+                    self.refresh_accounts_list()
+                    missing = [wx_id for wx_id in missing if not self.wx_accounts_index.get(wx_id)]
+        for wx_id in missing:
+            self.log(f"[检查授权] {wx_id} 在协议中没有授权码，请先登录该微信", level="warning")
+        return missing
         
     def get_target_key_by_wxid(self, all_keys, wx_id):
         """
@@ -205,150 +990,118 @@ class WechatCodeAdapter:
         :param wx_id: 微信id
         :return: 指定微信id的授权码
         """
+        if all_keys is self.wx_accounts_list:
+            # 当前账号列表直接查索引
+            return self.wx_accounts_index.get(wx_id)
         for key in all_keys:
             _wx_id = key.get('deviceId') or key.get('wx_id')
             if _wx_id == wx_id:
                 return key.get('authKey') or key.get('license')
         return None
     
-    def get_code_3(self, wx_id):
+    def get_code(self, wx_id):
         """
-        WeChatPadPro 获取code
+        获取code
+        相同wxid、appid已有在途请求时不再请求协议，等待并共用该请求的结果，
+        避免重复请求浪费一次性code、触发协议限流
         :param wx_id: 微信id
-        :return: code
+        :return: 指定wxid的code
         """
+        key = (self.wx_code_url, wx_id, self.wx_appid)
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = CodeFlight()
+                self._flights[key] = flight
+        if not leader:
+            if flight.event.wait(timeout=FLIGHT_TIMEOUT):
+                if flight.error:
+                    self._last_error.msg = flight.error
+                return flight.code
+            self.log(f"[获取code] {wx_id} 等待合并的请求超时，单独请求", level="warning")
+            return self._request_code(wx_id)
+        self._last_error.msg = None
         try:
-            all_devices = self.wx_accounts_list
-            if not all_devices:
-                self.log(f"[获取code] 账号列表为空，未能获取到", level="error")
-                return False
-            target_key = self.get_target_key_by_wxid(all_devices, wx_id)
-            url = self.wx_code_url.split("/admin")[0] + "/applet/JsLogin"
-            params = {
-                "key": target_key
-            }
-            payload = {
-                "AppId": self.wx_appid,
-                "Data": "",
-                "Opt": 1,
-                "PackageName": "",
-                "SdkName": ""
-            }
-            response = requests.post(url, params=params, json=payload, timeout=5)
-            response.raise_for_status()
-            response_json = response.json()
-            if response_json.get('Code') == 200:
-                # self.log(f"[获取code] 成功，code: {response_json.get('Data', {}).get('Code', '')}")
-                return response_json.get('Data', {}).get('Code', '')
-            else:
-                self.log(f"[获取code] 失败，错误信息: {response_json['Text']}", level="error")
-                return False
-        except Exception as e:
-            self.log(f"[获取code] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return False
-        
-    def get_auth_keys(self):
+            flight.code = self._request_code(wx_id)
+            if not flight.code:
+                flight.error = self._last_error.msg
+            return flight.code
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.event.set()
+
+    def _request_code(self, wx_id):
         """
-        iwechat 获取账号授权码列表
-        :return: 账号授权码列表
+        请求code，多个协议地址时按优先级依次尝试，失败自动切换
+        :param wx_id: 微信id
+        :return: 指定wxid的code
         """
-        try:
-            url = self.wx_code_url
-            params = {
-                "key": self.wx_code_token
-            }
-            response = requests.get(url, params=params, timeout=15)
-            response.raise_for_status()
-            response_json = response.json()
-            return response_json
-        except Exception as e:
-            self.log(f"[获取code] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return False
-        
-    def get_code_4(self, wx_id):
+        if self.broker_url:
+            code = self.get_code_from_broker(wx_id)
+            if code is not None:
+                return code
+        if len(self.endpoints) == 1:
+            return self.endpoints[0].protocol.get_code(wx_id)
+        endpoints = self.select_endpoints()
+        for i, endpoint in enumerate(endpoints):
+            code = endpoint.protocol.get_code(wx_id)
+            if code:
+                return code
+            if i + 1 < len(endpoints):
+                self.log(f"[获取code] {endpoint.url} 获取失败，切换到 {endpoints[i + 1].url}", level="warning")
+        return False
+
+    def _get_code_result(self, wx_id):
         """
-        iwechat 获取code
+        获取code并记录耗时和错误信息
         :param wx_id: 微信id
-        :return: code
+        :return: {"code": code或False, "error": 错误信息或None, "latency": 耗时秒数}
         """
+        self._last_error.msg = None
+        start = time.monotonic()
         try:
-            auth_keys = self.wx_accounts_list
-            if not auth_keys:
-                self.log(f"[获取code] 账号列表为空，未能获取到", level="error")
-                return False
-            target_key = self.get_target_key_by_wxid(auth_keys, wx_id)
-            url = self.wx_code_url.split("/admin")[0] + "/applet/JsLogin"
-            params = {
-                "key": target_key
-            }
-            payload = {
-                "AppId": self.wx_appid,
-                "Data": "",
-                "Opt": 1,
-                "PackageName": "",
-                "SdkName": ""
-            }
-            response = requests.post(url, params=params, json=payload, timeout=5)
-            response.raise_for_status()
-            response_json = response.json()
-            if response_json.get('Code') == 200:
-                self.log(f"[获取code] 成功，code: {response_json.get('Data', {}).get('Code', '')}")
-                return response_json.get('Data', {}).get('Code', '')
-            else:
-                self.log(f"[获取code] 失败，错误信息: {response_json['Text']}", level="error")
-                return False
+            code = self.get_code(wx_id)
         except Exception as e:
             self.log(f"[获取code] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return False
-        
-    def get_code_5(self, wx_id):
+            code = False
+        latency = time.monotonic() - start
+        error = None if code else (self._last_error.msg or "未获取到code")
+        return {"code": code, "error": error, "latency": latency}
+
+    def get_codes(self, wx_ids, max_in_flight=None):
         """
-        StarBot Pro 获取code
-        :param wx_id: 微信id
-        :return: code
+        批量获取code，同时请求的数量不超过max_in_flight
+        :param wx_ids: 微信id可迭代对象
+        :param max_in_flight: 同时请求的数量，默认取WX_CODE_MAX_IN_FLIGHT
+        :return: {wx_id: {"code": code或False, "error": 错误信息或None, "latency": 耗时秒数}}，顺序与传入一致
         """
-        try:
-            url = self.wx_code_url
-            headers = {
-                "Authorization": self.wx_code_token,
-                "Content-Type": "application/json"
-            }
-            payload =  {
-                "type": "querySmallProgramCode",
-                "params": {
-                    "robotId": wx_id,
-                    "appid": self.wx_appid
-                }
-            }
-            response = requests.post(url, headers=headers, json=payload, timeout=5)
-            response.raise_for_status()
-            response_json = response.json()
-            if response_json.get('code') == 200:
-                return response_json.get('data', {}).get('code', '')
-            else:
-                self.log(f"[获取code] 失败，错误信息: {response_json['description']}", level="error")
-                return False
-        except Exception as e:
-            self.log(f"[获取code] 发生错误: {str(e)}\n{traceback.format_exc()}", level="error")
-            return False
-        
-    def get_code(self, wx_id):
+        wx_ids = list(dict.fromkeys(wx_ids)) # 去重并保持顺序
+        if not wx_ids:
+            return {}
+        max_in_flight = max(1, min(int(max_in_flight or self.max_in_flight), len(wx_ids)))
+        with ThreadPoolExecutor(max_workers=max_in_flight, thread_name_prefix="wx_code") as pool:
+            results = pool.map(self._get_code_result, wx_ids)
+            return dict(zip(wx_ids, results))
+
+    def prefetch(self, wx_ids, ahead=None):
         """
-        获取code
-        :param wx_id: 微信id
-        :return: 指定wxid的code
+        启动code预取，执行时用返回的预取器的get(wx_id)取code
+        :param wx_ids: 按执行顺序排列的微信id
+        :param ahead: 领先执行器的账号数，默认取WX_CODE_PREFETCH
+        :return: 已启动的code预取器
         """
-        protocol_type = self.get_protocol_type()
-        if protocol_type == 1:
-            return self.get_code_1(wx_id)
-        elif protocol_type == 2:
-            return self.get_code_2(wx_id)
-        elif protocol_type == 3:
-            return self.get_code_3(wx_id)
-        elif protocol_type == 4:
-            return self.get_code_4(wx_id)
-        elif protocol_type == 5:
-            return self.get_code_5(wx_id)
-        else:
-            self.log(f"[获取code] 发生错误: 未知协议类型", level="error")
-            return False
\ No newline at end of file
+        return CodePrefetcher(self, wx_ids, ahead).start()
+
+
+def _reset_flights():
+    """
+    fork出的子进程没有父进程的在途请求，清空合并表并重建锁
+    """
+    WechatCodeAdapter._flights = {}
+    WechatCodeAdapter._flights_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_reset_flights)
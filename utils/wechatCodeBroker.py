@@ -0,0 +1,164 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 微信code代理服务
+变量: soy_codetoken_data (微信授权token)
+        soy_codeurl_data (微信授权url)
+        WX_CODE_BROKER_HOST (监听地址，默认127.0.0.1)
+        WX_CODE_BROKER_PORT (监听端口，默认18688)
+        WX_CODE_BROKER_RATE (每秒请求协议的次数上限，默认5)
+用法: 常驻运行 python3 wechatCodeBroker.py
+        code版脚本设置环境变量 WX_CODE_BROKER=http://127.0.0.1:18688 即可通过本服务取code，
+        服务未运行时脚本自动改为本进程获取
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+2026/10/18  V1.1    令牌桶移到rateLimiter.py，与脚本共用
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+import traceback
+from collections import deque
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+from wechatCodeAdapter import WechatCodeAdapter, ACCOUNTS_CACHE_TTL
+from rateLimiter import RateLimiter
+
+BROKER_HOST = os.getenv("WX_CODE_BROKER_HOST") or "127.0.0.1" # 监听地址
+BROKER_PORT = int(os.getenv("WX_CODE_BROKER_PORT") or 18688) # 监听端口
+BROKER_RATE = float(os.getenv("WX_CODE_BROKER_RATE") or 5) # 每秒请求协议的次数上限
+
+
+class CodeBroker:
+    """
+    code代理服务
+    每个小程序id一个常驻适配器，连接、账号列表常驻内存，所有脚本共用
+    """
+    def __init__(self, rate=None):
+        self.adapters = {} # 小程序id -> 适配器
+        self.adapters_lock = threading.Lock()
+        self.limiter = RateLimiter(rate or BROKER_RATE)
+
+    def get_adapter(self, wx_appid):
+        """
+        获取小程序id对应的适配器
+        :param wx_appid: 小程序id
+        :return: 适配器
+        """
+        with self.adapters_lock:
+            adapter = self.adapters.get(wx_appid)
+            if adapter is None:
+                adapter = WechatCodeAdapter(wx_appid, use_broker=False)
+                adapter.log_msgs = deque(maxlen=200) # 常驻运行，只保留最近的日志
+                self.adapters[wx_appid] = adapter
+            return adapter
+
+    def get_code(self, wx_id, wx_appid):
+        """
+        获取code
+        :param wx_id: 微信id
+        :param wx_appid: 小程序id
+        :return: {"code": code或False, "error": 错误信息或None}
+        """
+        adapter = self.get_adapter(wx_appid)
+        self.limiter.acquire()
+        adapter._last_error.msg = None
+        code = adapter.get_code(wx_id)
+        error = None if code else (adapter._last_error.msg or "未获取到code")
+        return {"code": code, "error": error}
+
+    def check_wx_ids(self, wx_ids, wx_appid):
+        """
+        检查没有授权码的微信id
+        :param wx_ids: 微信id列表
+        :param wx_appid: 小程序id
+        :return: {"missing": [微信id]}
+        """
+        return {"missing": self.get_adapter(wx_appid).check_wx_ids(wx_ids)}
+
+    def refresh_loop(self):
+        """
+        定时刷新账号列表，保持与协议一致
+        """
+        while True:
+            time.sleep(max(60, ACCOUNTS_CACHE_TTL))
+            with self.adapters_lock:
+                adapters = list(self.adapters.values())
+            for adapter in adapters:
+                try:
+                    adapter._init_all_accounts()
+                except Exception as e:
+                    logging.error(f"[code代理] 刷新账号列表发生错误: {str(e)}\n{traceback.format_exc()}")
+
+
+class BrokerHandler(BaseHTTPRequestHandler):
+    """
+    code代理服务请求处理
+    GET  /health
+    POST /code   {"wxid": 微信id, "appid": 小程序id}
+    POST /check  {"wxids": [微信id], "appid": 小程序id}
+    """
+    protocol_version = "HTTP/1.1"
+    broker = None
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        try:
+            length = int(self.headers.get("Content-Length") or 0)
+            payload = json.loads(self.rfile.read(length) or b"{}")
+            if self.path == "/code":
+                self.send_json(200, self.broker.get_code(payload['wxid'], payload['appid']))
+            elif self.path == "/check":
+                self.send_json(200, self.broker.check_wx_ids(payload['wxids'], payload['appid']))
+            else:
+                self.send_json(404, {"error": "not found"})
+        except Exception as e:
+            logging.error(f"[code代理] 处理请求发生错误: {str(e)}\n{traceback.format_exc()}")
+            self.send_json(500, {"error": str(e)})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host=None, port=None):
+    """
+    启动code代理服务
+    :param host: 监听地址
+    :param port: 监听端口
+    """
+    broker = CodeBroker()
+    BrokerHandler.broker = broker
+    threading.Thread(target=broker.refresh_loop, name="wx_code_broker_refresh", daemon=True).start()
+    server = ThreadingHTTPServer((host or BROKER_HOST, port or BROKER_PORT), BrokerHandler)
+    server.daemon_threads = True
+    logging.info(f"[code代理] 监听 http://{server.server_address[0]}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s\t- %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    serve()
@@ -0,0 +1,305 @@
+"""
+作者: 临渊
+日期: 2026/10/18
+name: 微信授权协议模拟服务
+变量: WX_MOCK_HOST (监听地址，默认127.0.0.1)
+        WX_MOCK_PORT (监听端口，默认18699)
+        WX_MOCK_TOKEN (授权token，为空则不校验)
+        WX_MOCK_WXIDS (WeChatPadPro/iwechat账号列表中的微信id，多个用换行或逗号分割，默认wxid_mock_1~WX_MOCK_ACCOUNTS)
+        WX_MOCK_ACCOUNTS (默认生成的微信id数量，默认100)
+        WX_MOCK_LATENCY (每次请求的延迟秒数，可填范围如 0.05-0.2，默认0)
+        WX_MOCK_ERROR_RATE (请求失败的概率，0~1，默认0)
+        WX_MOCK_CODE_TTL (code有效期秒数，默认300)
+用法: python3 wechatCodeMockServer.py 后把 soy_codeurl_data 设置为下列任意一个地址，即可离线测试适配器的并发、切换等
+        养鸡场        http://127.0.0.1:18699/prod-api/wechat/api/getMiniProgramCode
+        牛子          http://127.0.0.1:18699/wx/app/code
+        WeChatPadPro  http://127.0.0.1:18699/admin/GetAllDevices
+        iwechat       http://127.0.0.1:18699/admin/GetAuthKey
+        StarBot Pro   http://127.0.0.1:18699/api/processor
+        POST /mock/verify {"code": code} 核销code，返回是否有效（未过期且未使用）
+        GET  /mock/stats 查看各接口请求数、失败数和code核销情况
+------------------------------------------------------------
+更新日志:
+2026/10/18  V1.0    初始化
+"""
+
+import os
+import json
+import time
+import uuid
+import random
+import logging
+import threading
+from urllib.parse import urlsplit, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+MOCK_HOST = os.getenv("WX_MOCK_HOST") or "127.0.0.1" # 监听地址
+MOCK_PORT = int(os.getenv("WX_MOCK_PORT") or 18699) # 监听端口
+MOCK_TOKEN = os.getenv("WX_MOCK_TOKEN") or "" # 授权token
+MOCK_WXIDS = os.getenv("WX_MOCK_WXIDS") or "" # 账号列表中的微信id
+MOCK_ACCOUNTS = int(os.getenv("WX_MOCK_ACCOUNTS") or 100) # 默认生成的微信id数量
+MOCK_LATENCY = os.getenv("WX_MOCK_LATENCY") or "0" # 请求延迟秒数
+MOCK_ERROR_RATE = float(os.getenv("WX_MOCK_ERROR_RATE") or 0) # 请求失败的概率
+MOCK_CODE_TTL = int(os.getenv("WX_MOCK_CODE_TTL") or 300) # code有效期秒数
+
+
+def parse_latency(value):
+    """
+    解析延迟配置
+    :param value: 秒数或范围，如 0.1 或 0.05-0.2
+    :return: (最小延迟, 最大延迟)
+    """
+    parts = str(value).split("-", 1)
+    low = float(parts[0] or 0)
+    high = float(parts[1]) if len(parts) > 1 else low
+    return low, max(low, high)
+
+
+class MockProtocol:
+    """
+    模拟协议的状态：账号列表、已发放的code和请求统计
+    """
+    def __init__(self, wx_ids=None, token=None, latency=None, error_rate=None, code_ttl=None):
+        """
+        :param wx_ids: 账号列表中的微信id
+        :param token: 授权token，为空则不校验
+        :param latency: 请求延迟秒数或范围
+        :param error_rate: 请求失败的概率
+        :param code_ttl: code有效期秒数
+        """
+        if wx_ids is None:
+            wx_ids = [wx_id.strip() for wx_id in MOCK_WXIDS.replace(",", "\n").split("\n") if wx_id.strip()]
+            wx_ids = wx_ids or [f"wxid_mock_{i}" for i in range(1, MOCK_ACCOUNTS + 1)]
+        self.auth_keys = {wx_id: uuid.uuid4().hex for wx_id in wx_ids} # 微信id -> 授权码
+        self.wx_ids_by_key = {key: wx_id for wx_id, key in self.auth_keys.items()}
+        self.token = MOCK_TOKEN if token is None else token
+        self.latency = parse_latency(MOCK_LATENCY if latency is None else latency)
+        self.error_rate = MOCK_ERROR_RATE if error_rate is None else error_rate
+        self.code_ttl = MOCK_CODE_TTL if code_ttl is None else code_ttl
+        self.codes = {} # code -> (微信id, 小程序id, 过期时间)
+        self.stats = {} # 接口 -> {"requests": 请求数, "errors": 失败数}
+        self.verified = {"valid": 0, "expired": 0, "unknown": 0}
+        self.lock = threading.Lock()
+
+    def begin(self, name):
+        """
+        模拟一次请求的延迟和随机失败
+        :param name: 接口名
+        :return: 是否模拟失败
+        """
+        low, high = self.latency
+        if high > 0:
+            time.sleep(random.uniform(low, high))
+        failed = random.random() < self.error_rate
+        with self.lock:
+            stat = self.stats.setdefault(name, {"requests": 0, "errors": 0})
+            stat["requests"] += 1
+            if failed:
+                stat["errors"] += 1
+        return failed
+
+    def check_token(self, token):
+        return not self.token or token == self.token
+
+    def issue_code(self, wx_id, wx_appid):
+        """
+        发放code
+        :param wx_id: 微信id
+        :param wx_appid: 小程序id
+        :return: code
+        """
+        code = uuid.uuid4().hex[:32]
+        with self.lock:
+            now = time.time()
+            # 顺便清理过期的code
+            if len(self.codes) > 10000:
+                self.codes = {k: v for k, v in self.codes.items() if v[2] > now}
+            self.codes[code] = (wx_id, wx_appid, now + self.code_ttl)
+        return code
+
+    def verify_code(self, code):
+        """
+        核销code，每个code只能使用一次
+        :param code: code
+        :return: 核销结果
+        """
+        with self.lock:
+            entry = self.codes.pop(code, None)
+            if entry is None:
+                result = "unknown"
+            elif entry[2] < time.time():
+                result = "expired"
+            else:
+                result = "valid"
+            self.verified[result] += 1
+        return {"valid": result == "valid", "result": result, "wxid": entry[0] if entry else None}
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "stats": {name: dict(stat) for name, stat in self.stats.items()},
+                "verified": dict(self.verified),
+                "outstanding_codes": len(self.codes)
+            }
+
+
+class MockHandler(BaseHTTPRequestHandler):
+    """
+    模拟协议请求处理
+    按请求路径的结尾区分协议，与适配器按soy_codeurl_data结尾识别协议的方式一致
+    """
+    protocol_version = "HTTP/1.1"
+    mock = None
+
+    def send_json(self, status, data):
+        body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            return json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return {}
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        end_path = parts.path.rstrip("/").split("/")[-1]
+        if parts.path == "/mock/stats":
+            self.send_json(200, self.mock.snapshot())
+        elif end_path == "GetAllDevices":
+            self.get_all_devices(query)
+        elif end_path == "GetAuthKey":
+            self.get_auth_key(query)
+        elif parts.path == "/":
+            # 适配器探测连通性
+            self.send_json(200, {"status": "ok"})
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def do_POST(self):
+        parts = urlsplit(self.path)
+        query = {k: v[0] for k, v in parse_qs(parts.query).items()}
+        payload = self.read_json()
+        end_path = parts.path.rstrip("/").split("/")[-1]
+        if parts.path == "/mock/verify":
+            self.send_json(200, self.mock.verify_code(payload.get("code")))
+        elif end_path == "getMiniProgramCode":
+            self.yjc_code(payload)
+        elif end_path == "code":
+            self.niuzi_code(payload)
+        elif end_path == "JsLogin":
+            self.js_login(query, payload)
+        elif end_path == "processor":
+            self.starbot_code(payload)
+        else:
+            self.send_json(404, {"error": "not found"})
+
+    def yjc_code(self, payload):
+        """
+        养鸡场
+        """
+        if self.mock.begin("getMiniProgramCode"):
+            self.send_json(500, {"code": 500, "msg": "模拟错误"})
+        elif not self.mock.check_token(self.headers.get("Authorization")):
+            self.send_json(200, {"code": 401, "msg": "token无效"})
+        else:
+            code = self.mock.issue_code(payload.get("wxid"), payload.get("appid"))
+            self.send_json(200, {"code": 200, "msg": "操作成功", "data": {"code": code}})
+
+    def niuzi_code(self, payload):
+        """
+        牛子
+        """
+        if self.mock.begin("code"):
+            self.send_json(200, {"code": 500, "message": "模拟错误", "data": {}})
+        else:
+            code = self.mock.issue_code(payload.get("wxid"), payload.get("appid"))
+            self.send_json(200, {"code": 0, "message": "success", "data": {"code": code}})
+
+    def get_all_devices(self, query):
+        """
+        WeChatPadPro 账号列表
+        """
+        if self.mock.begin("GetAllDevices"):
+            self.send_json(200, {"Code": 500, "Text": "模拟错误", "Data": None})
+        elif not self.mock.check_token(query.get("key")):
+            self.send_json(200, {"Code": -1, "Text": "key无效", "Data": None})
+        else:
+            devices = [{"deviceId": wx_id, "authKey": key} for wx_id, key in self.mock.auth_keys.items()]
+            self.send_json(200, {"Code": 200, "Text": "", "Data": {"devices": devices}})
+
+    def get_auth_key(self, query):
+        """
+        iwechat 账号列表
+        """
+        if self.mock.begin("GetAuthKey"):
+            self.send_json(500, {"Code": 500, "Text": "模拟错误"})
+        elif not self.mock.check_token(query.get("key")):
+            self.send_json(401, {"Code": -1, "Text": "key无效"})
+        else:
+            self.send_json(200, {
+                "Code": 200,
+                "Data": [{"wx_id": wx_id, "license": key} for wx_id, key in self.mock.auth_keys.items()]
+            })
+
+    def js_login(self, query, payload):
+        """
+        WeChatPadPro / iwechat 获取code
+        """
+        wx_id = self.mock.wx_ids_by_key.get(query.get("key"))
+        if self.mock.begin("JsLogin"):
+            self.send_json(200, {"Code": 500, "Text": "模拟错误", "Data": None})
+        elif wx_id is None:
+            self.send_json(200, {"Code": 300, "Text": "该链接不存在", "Data": None})
+        else:
+            code = self.mock.issue_code(wx_id, payload.get("AppId"))
+            self.send_json(200, {"Code": 200, "Text": "", "Data": {"Code": code}})
+
+    def starbot_code(self, payload):
+        """
+        StarBot Pro
+        """
+        params = payload.get("params") or {}
+        if self.mock.begin("processor"):
+            self.send_json(200, {"code": 500, "description": "模拟错误"})
+        elif not self.mock.check_token(self.headers.get("Authorization")):
+            self.send_json(200, {"code": 401, "description": "token无效"})
+        else:
+            code = self.mock.issue_code(params.get("robotId"), params.get("appid"))
+            self.send_json(200, {"code": 200, "description": "", "data": {"code": code}})
+
+    def log_message(self, format, *args):
+        pass
+
+
+def serve(host=None, port=None, mock=None):
+    """
+    启动模拟服务
+    :param host: 监听地址
+    :param port: 监听端口
+    :param mock: 模拟协议状态，默认按环境变量创建
+    """
+    MockHandler.mock = mock or MockProtocol()
+    server = ThreadingHTTPServer((host or MOCK_HOST, port or MOCK_PORT), MockHandler)
+    server.daemon_threads = True
+    logging.info(f"[协议模拟] 监听 http://{server.server_address[0]}:{server.server_address[1]}，"
+                 f"账号数 {len(MockHandler.mock.auth_keys)}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    logging.basicConfig(
+        level=logging.INFO,
+        format='%(asctime)s - %(levelname)s\t- %(message)s',
+        datefmt='%Y-%m-%d %H:%M:%S'
+    )
+    serve()
@@ -14,10 +14,12 @@ cron: 10 9,10 * * *
 2025/6/17   V1.0    初始化，完成签到功能
 2025/7/28   V1.1    修改头部注释，以便拉库
 2025/8/27   V1.2    增加尝试获取最新域名
+2026/10/18  V1.3    所有账号共用连接池，Cookie失效、登录失败的账号及时释放连接
 """
 
 import requests
 import os
+import sys
 import re
 import urllib.parse
 import logging
@@ -33,6 +35,13 @@ DDDD_OCR_URL = os.getenv("DDDD_OCR_URL") or "" # dddd_ocr地址
 DEFAULT_GUIDE_URL = "https://47447.net/" # 默认发布地址
 DEFAULT_HOST = "sjs47.com" # 默认域名
 
+# 导入共用连接池，没有则每个账号单独建立连接
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../utils')))
+try:
+    from sharedTransport import SharedTransport # type: ignore
+except ImportError:
+    SharedTransport = None
+
 class AutoTask:
     def __init__(self, site_name, default_host):
         """
@@ -43,6 +52,7 @@ class AutoTask:
         self.site_name = site_name
         self.default_host = default_host
         self.cookie_file = f"{site_name}_cookie.json"
+        self.transport = SharedTransport() if SharedTransport else None # 所有账号共用连接池
         self.setup_logging()
 
     def setup_logging(self):
@@ -471,7 +481,7 @@ class AutoTask:
             if accounts:
                 logging.info("[Cookie文件]检测到cookie文件，将尝试使用")
                 for email, account_data in accounts.items():
-                    session = requests.Session()
+                    session = self.transport.session() if self.transport else requests.Session()
                     for cookie_item in account_data['cookies'].split(';'):
                         key, value = cookie_item.split('=', 1)
                         session.cookies.set(key.strip(), value.strip())
@@ -486,6 +496,7 @@ class AutoTask:
                         return session
                     else:
                         logging.warning(f"[Cookie文件]账号 {email} 的Cookie已失效")
+                        session.close()
 
                 logging.info("[Cookie文件]所有账号的Cookie都已失效，尝试使用邮箱密码登录")
                 # 检查环境变量中是否有邮箱密码
@@ -504,7 +515,7 @@ class AutoTask:
                 logging.info("")
                 logging.info(f"------【账号{index}】开始执行任务------")
 
-                session = requests.Session()
+                session = self.transport.session() if self.transport else requests.Session()
 
                 if cookie:
                     logging.info(f"[检查环境变量]检测到cookie，将直接使用并保存到文件")
@@ -523,12 +534,14 @@ class AutoTask:
                         return session
                     else:
                         logging.warning(f"[Cookie]账号 {email} 的Cookie已失效")
+                        session.close()
                         continue
                 else:
                     logging.info(f"[检查环境变量]检测到邮箱密码，将进行登录")
                     formhash, seccodehash, loginhash = self.get_param(self.default_host, session)
                     if not all([formhash, seccodehash, loginhash]):
                         logging.error("获取参数失败，跳过当前账号")
+                        session.close()
                         continue
 
                     max_retries = 3
@@ -549,6 +562,7 @@ class AutoTask:
 
                     if not self.login_in(self.default_host, email, password, formhash, login_in_captcha_text, session, loginhash, seccodehash):
                         logging.error("登录失败，跳过当前账号")
+                        session.close()
                         continue
 
                     # 登录成功后保存cookie到文件
@@ -574,3 +588,6 @@ if __name__ == "__main__":
 
     auto_task = AutoTask(site_name, DEFAULT_HOST)
     session = auto_task.run(ocr_url)
+    # 释放连接
+    if session:
+        session.close()
@@ -15,10 +15,14 @@ cron: 10 9,10 * * *
 2025/7/23   V1.3    更新域名
 2025/7/28   V1.4    修改头部注释，以便拉库
 2025/8/27   V1.5    增加尝试获取最新域名
+2026/10/18  V1.6    支持多账号并发执行，评论间隔改为协作式调度，环境变量LY_CONCURRENCY设置并发数
+2026/10/18  V1.7    运行中断后重新运行跳过已完成的账号
+2026/10/18  V1.8    请求站点按每秒3次限流，所有账号共用，LY_HOST_RATE可修改
 """
 
 import requests
 import os
+import sys
 import re
 import urllib.parse
 import time
@@ -31,6 +35,19 @@ from bs4 import BeautifulSoup
 DDDD_OCR_URL = os.getenv("DDDD_OCR_URL") or "" # dddd_ocr地址
 DEFAULT_GUIDE_URL = "https://yyg.autos/" # 默认发布地址
 DEFAULT_HOST = "yyg.app" # 默认域名
+HOST_RATE_LIMITS = {"*": 3} # 每个域名每秒请求数上限，所有账号共用，环境变量LY_HOST_RATE可覆盖
+
+# 导入多账号并发执行器，没有则按顺序执行
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../utils')))
+try:
+    from taskExecutor import TaskExecutor # type: ignore
+except ImportError:
+    TaskExecutor = None
+# 导入按域名限流，没有则不限流
+try:
+    from rateLimiter import HostRateLimiter # type: ignore
+except ImportError:
+    HostRateLimiter = None
 
 class AutoTask:
     def __init__(self, site_name):
@@ -39,6 +56,8 @@ class AutoTask:
         :param site_name: 站点名称，用于日志显示
         """
         self.site_name = site_name
+        self.host_limiter = HostRateLimiter(HOST_RATE_LIMITS) if HostRateLimiter else None # 按域名限流，所有账号共用
+        self.host = DEFAULT_HOST
         self.setup_logging()
 
     def setup_logging(self):
@@ -358,7 +377,7 @@ class AutoTask:
 
     def do_task(self, host, session):
         """
-        执行任务
+        执行任务，yield评论间的等待秒数
         :param host: 域名
         :param session: 会话对象
         """
@@ -377,43 +396,59 @@ class AutoTask:
                 continue
             # 提交评论
             self.submit_comment(host, session, text, post_id)
-            time.sleep(random.randint(16, 30))
+            yield random.randint(16, 30)
         # 获取用户积分
         balance = self.get_user_balance(host, session)
         logging.info(f"[账号]当前积分: {balance}")
 
+    def run_account(self, index, account):
+        """
+        执行单个账号任务，yield步骤间的等待秒数
+        :param index: 账号序号
+        :param account: (账号, 密码)
+        """
+        username, password = account
+        host = self.host
+        logging.info("")
+        logging.info(f"------【账号{index}】开始执行任务------")
+
+        # 创建会话
+        session = requests.Session()
+        if self.host_limiter:
+            self.host_limiter.install(session)
+
+        # 获取登录验证码图片
+        login_in_img = self.get_captcha_img(host, session, "img_yz_signin")
+        while not login_in_img:
+            login_in_img = self.get_captcha_img(host, session, "img_yz_signin")
+        # 获取登录验证码文字
+        login_in_text = self.get_captcha_text(login_in_img)
+        if not login_in_text:
+            logging.error(f"[{self.site_name}]获取登录验证码文字失败")
+            return
+
+        # 登录
+        if self.login_in(host, username, password, login_in_text, session):
+            # 执行任务
+            yield from self.do_task(host, session)
+
+        logging.info(f"------【账号{index}】执行任务完成------")
+        logging.info("")
+
     def run(self):
         """
         运行任务
         """
         try:
             logging.info(f"【{self.site_name}】开始执行任务")
-            host = self.get_host()
-
-            for index, (username, password) in enumerate(self.check_cookie(), 1):
-                logging.info("")
-                logging.info(f"------【账号{index}】开始执行任务------")
-
-                # 创建会话
-                session = requests.Session()
-
-                # 获取登录验证码图片
-                login_in_img = self.get_captcha_img(host, session, "img_yz_signin")
-                while not login_in_img:
-                    login_in_img = self.get_captcha_img(host, session, "img_yz_signin")
-                # 获取登录验证码文字
-                login_in_text = self.get_captcha_text(login_in_img)
-                if not login_in_text:
-                    logging.error(f"[{self.site_name}]获取登录验证码文字失败")
-                    continue
-
-                # 登录
-                if self.login_in(host, username, password, login_in_text, session):
-                    # 执行任务
-                    self.do_task(host, session)
+            self.host = self.get_host()
 
-                logging.info(f"------【账号{index}】执行任务完成------")
-                logging.info("")
+            if TaskExecutor:
+                TaskExecutor(self.run_account, resume=True).run(self.check_cookie())
+            else:
+                for index, account in enumerate(self.check_cookie(), 1):
+                    for delay in self.run_account(index, account):
+                        time.sleep(delay)
 
         except Exception as e:
             logging.error(f"【{self.site_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}")
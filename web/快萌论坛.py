@@ -13,6 +13,11 @@ cron: 10 9,10 * * *
 ------------更新日志------------
 2025/6/8    V1.0    初始化，完成签到功能
 2025/7/28   V1.1    修改头部注释，以便拉库
+2026/10/18  V1.2    支持多账号并发执行，环境变量LY_CONCURRENCY设置并发数
+2026/10/18  V1.3    运行中断后重新运行跳过已完成的账号
+2026/10/18  V1.4    请求站点按每秒3次限流，所有账号共用，LY_HOST_RATE可修改
+2026/10/18  V1.5    Cookie账号改用异步执行引擎，检测Cookie的请求不占用线程，没有安装httpx时按原方式执行
+2026/10/18  V1.6    邮箱密码账号写cookie文件，只用单进程执行
 """
 
 DEFAULT_HOST = "kmacg20.com" # 默认域名
@@ -20,6 +25,7 @@ DEFAULT_HOST = "kmacg20.com" # 默认域名
 from bs4 import BeautifulSoup
 import requests
 import os
+import sys
 import re
 import urllib.parse
 import logging
@@ -28,9 +34,28 @@ import base64
 import random
 import time
 import json
+import threading
 from datetime import datetime
 
 DDDD_OCR_URL = os.getenv("DDDD_OCR_URL") or "" # dddd_ocr地址
+HOST_RATE_LIMITS = {DEFAULT_HOST: 3} # 每个域名每秒请求数上限，所有账号共用，环境变量LY_HOST_RATE可覆盖
+
+# 导入多账号并发执行器，没有则按顺序执行
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../utils')))
+try:
+    from taskExecutor import TaskExecutor # type: ignore
+except ImportError:
+    TaskExecutor = None
+# 导入按域名限流，没有则不限流
+try:
+    from rateLimiter import HostRateLimiter # type: ignore
+except ImportError:
+    HostRateLimiter = None
+# 导入异步执行引擎，没有安装httpx则使用TaskExecutor
+try:
+    from asyncExecutor import AsyncTaskExecutor, AsyncTransport, run_sync # type: ignore
+except ImportError:
+    AsyncTaskExecutor = None
 
 class AutoTask:
     def __init__(self, site_name):
@@ -39,7 +64,10 @@ class AutoTask:
         :param site_name: 站点名称，用于日志显示
         """
         self.site_name = site_name
+        self.host_limiter = HostRateLimiter(HOST_RATE_LIMITS) if HostRateLimiter else None # 按域名限流，所有账号共用
+        self.async_transport = AsyncTransport(host_limiter=self.host_limiter) if AsyncTaskExecutor else None # 异步请求共用连接池
         self.cookie_file = f"{site_name}_cookie.json"
+        self.cookie_lock = threading.Lock() # cookie文件读写锁
         self.setup_logging()
 
     def setup_logging(self):
@@ -373,35 +401,36 @@ class AutoTask:
         :param email: 账号邮箱，用于标识不同账号
         """
         try:
-            # 读取现有cookie文件
-            existing_data = {}
-            if os.path.exists(self.cookie_file):
-                with open(self.cookie_file, 'r', encoding='utf-8') as f:
-                    existing_data = json.load(f)
-
-            # 准备新的cookie数据
-            cookie_data = {
-                'site_name': self.site_name,
-                'host': DEFAULT_HOST,
-                'accounts': existing_data.get('accounts', {}),
-                'update_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-
-            # 更新或添加账号cookie
-            if email:
-                cookie_data['accounts'][email] = {
-                    'cookies': cookies,
-                    'update_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-                }
-            else:
-                # 如果没有提供email，使用默认键
-                cookie_data['accounts']['default'] = {
-                    'cookies': cookies,
+            with self.cookie_lock:
+                # 读取现有cookie文件
+                existing_data = {}
+                if os.path.exists(self.cookie_file):
+                    with open(self.cookie_file, 'r', encoding='utf-8') as f:
+                        existing_data = json.load(f)
+
+                # 准备新的cookie数据
+                cookie_data = {
+                    'site_name': self.site_name,
+                    'host': DEFAULT_HOST,
+                    'accounts': existing_data.get('accounts', {}),
                     'update_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
                 }
 
-            with open(self.cookie_file, 'w', encoding='utf-8') as f:
-                json.dump(cookie_data, f, ensure_ascii=False, indent=2)
+                # 更新或添加账号cookie
+                if email:
+                    cookie_data['accounts'][email] = {
+                        'cookies': cookies,
+                        'update_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    }
+                else:
+                    # 如果没有提供email，使用默认键
+                    cookie_data['accounts']['default'] = {
+                        'cookies': cookies,
+                        'update_time': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+                    }
+
+                with open(self.cookie_file, 'w', encoding='utf-8') as f:
+                    json.dump(cookie_data, f, ensure_ascii=False, indent=2)
             logging.info(f"[写入Cookie文件]成功写入{self.cookie_file}")
         except Exception as e:
             logging.error(f"[写入Cookie文件]发生错误: {str(e)}\n{traceback.format_exc()}")
@@ -444,6 +473,164 @@ class AutoTask:
             logging.error(f"[Cookie检测]发生错误: {str(e)}\n{traceback.format_exc()}")
             return False
 
+    def run_cookie_account(self, index, item):
+        """
+        使用cookie文件中的账号执行任务
+        :param index: 账号序号
+        :param item: (邮箱, 账号数据)
+        :return: cookie是否有效
+        """
+        email, account_data = item
+        session = requests.Session()
+        if self.host_limiter:
+            self.host_limiter.install(session)
+        for cookie_item in account_data['cookies'].split(';'):
+            key, value = cookie_item.split('=', 1)
+            session.cookies.set(key.strip(), value.strip())
+
+        # 检查cookie是否有效
+        if self.check_cookie_valid(DEFAULT_HOST, session):
+            logging.info("")
+            logging.info(f"[Cookie检测]账号 {email} 的Cookie有效")
+            # 执行签到任务
+            self.do_task(DEFAULT_HOST, session)
+            logging.info("")
+            return True
+        else:
+            logging.warning(f"[Cookie文件]账号 {email} 的Cookie已失效")
+            return False
+
+    async def check_cookie_valid_async(self, host, session):
+        """
+        检查cookie是否有效，异步版本
+        :param host: 域名
+        :param session: 异步会话对象
+        :return: 是否有效
+        """
+        try:
+            url = f"https://{host}/home.php?mod=space"
+            headers = {
+                'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/137.0.0.0 Safari/537.36 Edg/137.0.0.0',
+                'Host': host
+            }
+            response = await session.get(url, headers=headers)
+            response.raise_for_status()
+
+            if "请先登录" in response.text:
+                return False
+            return True
+        except Exception as e:
+            logging.error(f"[Cookie检测]发生错误: {str(e)}\n{traceback.format_exc()}")
+            return False
+
+    async def run_cookie_account_async(self, index, item):
+        """
+        使用cookie文件中的账号执行任务，异步版本
+        检测Cookie已改为异步请求，签到仍是同步步骤，在线程池中执行
+        :param index: 账号序号
+        :param item: (邮箱, 账号数据)
+        :return: cookie是否有效
+        """
+        email, account_data = item
+        cookies = {}
+        for cookie_item in account_data['cookies'].split(';'):
+            key, value = cookie_item.split('=', 1)
+            cookies[key.strip()] = value.strip()
+
+        async with self.async_transport.session() as session:
+            for key, value in cookies.items():
+                session.cookies.set(key, value)
+            # 检查cookie是否有效
+            if not await self.check_cookie_valid_async(DEFAULT_HOST, session):
+                logging.warning(f"[Cookie文件]账号 {email} 的Cookie已失效")
+                return False
+
+        logging.info("")
+        logging.info(f"[Cookie检测]账号 {email} 的Cookie有效")
+        # 执行签到任务，还没改成异步的步骤用requests在线程池中执行
+        sync_session = requests.Session()
+        if self.host_limiter:
+            self.host_limiter.install(sync_session)
+        sync_session.cookies.update(cookies)
+        try:
+            await run_sync(self.do_task, DEFAULT_HOST, sync_session)
+        finally:
+            sync_session.close()
+        logging.info("")
+        return True
+
+    def run_env_account(self, index, env_account):
+        """
+        使用环境变量中的账号执行任务
+        :param index: 账号序号
+        :param env_account: (邮箱, 密码, cookie)
+        """
+        email, password, cookie = env_account
+        host = DEFAULT_HOST
+        logging.info("")
+        logging.info(f"------【账号{index}】开始执行任务------")
+
+        # 创建会话
+        session = requests.Session()
+        if self.host_limiter:
+            self.host_limiter.install(session)
+
+        if cookie:
+            # 直接使用cookie
+            logging.info(f"[检查环境变量]检测到cookie，将直接使用并保存到文件")
+            for cookie_item in cookie.split(';'):
+                key, value = cookie_item.split('=', 1)
+                session.cookies.set(key.strip(), value.strip())
+            self.write_cookie_file(cookie, email)
+
+            # 检查cookie是否有效
+            if self.check_cookie_valid(host, session):
+                logging.info(f"[Cookie]账号 {email} 的Cookie有效")
+                # 执行签到任务
+                self.do_task(host, session)
+            else:
+                logging.warning(f"[Cookie]账号 {email} 的Cookie已失效")
+            return
+        else:
+            logging.info(f"[检查环境变量]检测到邮箱密码，将进行登录")
+            # 获取参数
+            formhash, seccodehash, loginhash = self.get_param(host, session)
+            if not all([formhash, seccodehash, loginhash]):
+                logging.error("获取参数失败，跳过当前账号")
+                return
+
+            # 验证码重试逻辑
+            max_retries = 3
+            retry_count = 0
+            while retry_count < max_retries:
+                login_in_captcha = self.get_captcha_img(host, seccodehash, session)
+                login_in_captcha_text = self.get_captcha_text(login_in_captcha)
+                if self.check_captcha(host, login_in_captcha_text, session, seccodehash):
+                    break
+
+                retry_count += 1
+                if retry_count < max_retries:
+                    logging.warning(f"[验证码]验证失败，第{retry_count}次重试")
+                    time.sleep(5)
+                else:
+                    logging.error("[验证码]验证失败，已达到最大重试次数")
+                    continue
+
+            if not self.login_in(host, email, password, formhash, login_in_captcha_text, session, loginhash, seccodehash):
+                logging.error("登录失败，跳过当前账号")
+                return
+
+            # 登录成功后保存cookie到文件
+            cookies = self.get_session_cookies(session)
+            if cookies:
+                self.write_cookie_file(cookies, email)
+
+            # 登录成功后执行签到任务
+            self.do_task(host, session)
+
+        logging.info(f"------【账号{index}】执行任务完成------")
+        logging.info("")
+
     def run(self):
         """
         执行签到任务的主函数
@@ -455,24 +642,15 @@ class AutoTask:
             accounts = self.read_cookie_file()
             if accounts:
                 logging.info("[Cookie文件]检测到cookie文件，将尝试使用")
-                for email, account_data in accounts.items():
-                    session = requests.Session()
-                    for cookie_item in account_data['cookies'].split(';'):
-                        key, value = cookie_item.split('=', 1)
-                        session.cookies.set(key.strip(), value.strip())
-
-                    # 检查cookie是否有效
-                    if self.check_cookie_valid(DEFAULT_HOST, session):
-                        logging.info("")
-                        logging.info(f"[Cookie检测]账号 {email} 的Cookie有效")
-                        # 执行签到任务
-                        self.do_task(DEFAULT_HOST, session)
-                        logging.info("")
-                        # 如果是最后一个账号，执行return
-                        if email == list(accounts.keys())[-1]:
-                            return
-                    else:
-                        logging.warning(f"[Cookie文件]账号 {email} 的Cookie已失效")
+                if AsyncTaskExecutor:
+                    cookie_valid = [ctx.result for ctx in AsyncTaskExecutor(self.run_cookie_account_async).run(accounts.items())]
+                elif TaskExecutor:
+                    cookie_valid = [ctx.result for ctx in TaskExecutor(self.run_cookie_account).run(accounts.items())]
+                else:
+                    cookie_valid = [self.run_cookie_account(index, item) for index, item in enumerate(accounts.items(), 1)]
+                # 最后一个账号的Cookie有效则结束
+                if cookie_valid and cookie_valid[-1]:
+                    return
 
                 logging.info("[Cookie文件]所有账号的Cookie都已失效，尝试使用邮箱密码登录")
                 # 检查环境变量中是否有邮箱密码
@@ -487,70 +665,12 @@ class AutoTask:
                 except Exception as e:
                     logging.error(f"[Cookie文件]删除失效cookie文件失败: {str(e)}")
 
-            host = DEFAULT_HOST
-            for index, (email, password, cookie) in enumerate(self.check_env(), 1):
-                logging.info("")
-                logging.info(f"------【账号{index}】开始执行任务------")
-
-                # 创建会话
-                session = requests.Session()
-
-                if cookie:
-                    # 直接使用cookie
-                    logging.info(f"[检查环境变量]检测到cookie，将直接使用并保存到文件")
-                    for cookie_item in cookie.split(';'):
-                        key, value = cookie_item.split('=', 1)
-                        session.cookies.set(key.strip(), value.strip())
-                    self.write_cookie_file(cookie, email)
-
-                    # 检查cookie是否有效
-                    if self.check_cookie_valid(host, session):
-                        logging.info(f"[Cookie]账号 {email} 的Cookie有效")
-                        # 执行签到任务
-                        self.do_task(host, session)
-                        return
-                    else:
-                        logging.warning(f"[Cookie]账号 {email} 的Cookie已失效")
-                        continue
-                else:
-                    logging.info(f"[检查环境变量]检测到邮箱密码，将进行登录")
-                    # 获取参数
-                    formhash, seccodehash, loginhash = self.get_param(host, session)
-                    if not all([formhash, seccodehash, loginhash]):
-                        logging.error("获取参数失败，跳过当前账号")
-                        continue
-
-                    # 验证码重试逻辑
-                    max_retries = 3
-                    retry_count = 0
-                    while retry_count < max_retries:
-                        login_in_captcha = self.get_captcha_img(host, seccodehash, session)
-                        login_in_captcha_text = self.get_captcha_text(login_in_captcha)
-                        if self.check_captcha(host, login_in_captcha_text, session, seccodehash):
-                            break
-
-                        retry_count += 1
-                        if retry_count < max_retries:
-                            logging.warning(f"[验证码]验证失败，第{retry_count}次重试")
-                            time.sleep(5)
-                        else:
-                            logging.error("[验证码]验证失败，已达到最大重试次数")
-                            continue
-
-                    if not self.login_in(host, email, password, formhash, login_in_captcha_text, session, loginhash, seccodehash):
-                        logging.error("登录失败，跳过当前账号")
-                        continue
-
-                    # 登录成功后保存cookie到文件
-                    cookies = self.get_session_cookies(session)
-                    if cookies:
-                        self.write_cookie_file(cookies, email)
-
-                    # 登录成功后执行签到任务
-                    self.do_task(host, session)
-
-                logging.info(f"------【账号{index}】执行任务完成------")
-                logging.info("")
+            if TaskExecutor:
+                # cookie文件只有进程内的锁，多个进程同时写会互相覆盖，只用单进程
+                TaskExecutor(self.run_env_account, resume=True, processes=1).run(self.check_env())
+            else:
+                for index, env_account in enumerate(self.check_env(), 1):
+                    self.run_env_account(index, env_account)
         except Exception as e:
             logging.error(f"【{self.site_name}】执行过程中发生错误: {str(e)}\n{traceback.format_exc()}")
 